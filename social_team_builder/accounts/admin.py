@@ -1,6 +1,34 @@
-from django.contrib import admin
-from .models import User, UserApplication, Skill
+from django.contrib import admin, messages
+from .models import DigestRun, User, UserApplication, Skill
+# noinspection PyUnresolvedReferences
+from projects.deletion import delete_user
 
-admin.site.register(User)
+
+class UserAdmin(admin.ModelAdmin):
+    """User admin
+    :methods: - delete_in_background() as an action
+    """
+    actions = ['delete_in_background']
+
+    def delete_in_background(self, request, queryset):
+        for user in queryset:
+            delete_user(user)
+        messages.success(request, '{} users deactivated, their rows are '
+                                  'deleted in the background.'.format(
+                                      len(queryset)))
+    delete_in_background.short_description = \
+        'Delete selected users in the background'
+
+
+class DigestRunAdmin(admin.ModelAdmin):
+    """Digest run admin - checkpoints and metrics of the digest runs"""
+    list_display = ('frequency', 'started_at', 'finished_at', 'projects',
+                    'users', 'emails', 'failures', 'batches', 'seconds')
+    list_filter = ('frequency',)
+    readonly_fields = [field.name for field in DigestRun._meta.fields]
+
+
+admin.site.register(DigestRun, DigestRunAdmin)
+admin.site.register(User, UserAdmin)
 admin.site.register(UserApplication)
 admin.site.register(Skill)
@@ -0,0 +1,239 @@
+"""Non-destructive avatar editing.
+
+The uploaded avatar is never rewritten. Rotations, flips and crops are
+appended to User.avatar_ops, an ordered list where consecutive rotations
+and flips are composed into one transform (four right rotations cancel out)
+and consecutive crops into one box. The list reduces to a single crop of
+the original followed by a single transpose, so the derivative costs one
+decode and one encode whatever the number of edits. It is rendered on its
+first request and saved to the (content-addressed) media storage under
+AVATAR_CACHE_DIR, User.avatar_derivative_key tells which edits it shows.
+
+Rotations and flips are the 2x2 matrices they apply to pixel coordinates
+taken from the image centre, composing two of them is a matrix product.
+
+Uploads are checked by ingest() from their header before any pixel is
+decoded: size in bytes, format and pixel count (decompression bombs).
+Larger JPEGs are decoded at a reduced scale (Pillow's draft mode) and
+stored at AVATAR_MAX_SIDE. Width, height and format are kept on the User,
+the edit views never open the image for its size.
+
+Pillow is imported by ingest() and render() only, the transpose methods are
+Pillow's (stable) integer values.
+"""
+import hashlib
+import io
+import json
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+# noinspection PyUnresolvedReferences
+from social_team_builder.metrics import timed
+
+# PIL.Image transpose methods
+FLIP_LEFT_RIGHT, FLIP_TOP_BOTTOM, ROTATE_90, ROTATE_180, ROTATE_270, \
+    TRANSPOSE, TRANSVERSE = range(7)
+IDENTITY = ((1, 0), (0, 1))
+# transpose method -> matrix, y pointing down
+TRANSFORMS = {
+    FLIP_LEFT_RIGHT: ((-1, 0), (0, 1)),
+    FLIP_TOP_BOTTOM: ((1, 0), (0, -1)),
+    ROTATE_90: ((0, 1), (-1, 0)),
+    ROTATE_180: ((-1, 0), (0, -1)),
+    ROTATE_270: ((0, -1), (1, 0)),
+    TRANSPOSE: ((0, 1), (1, 0)),
+    TRANSVERSE: ((0, -1), (-1, 0)),
+}
+METHODS = {matrix: method for method, matrix in TRANSFORMS.items()}
+# view action -> transpose method
+ACTIONS = {
+    'left': ROTATE_90,
+    'right': ROTATE_270,
+    'up': FLIP_TOP_BOTTOM,
+    'side': FLIP_LEFT_RIGHT,
+}
+HASH_CHUNK = 64 * 1024
+
+
+def multiply(a, b):
+    """multiply function - the matrix of `b` followed by `a`"""
+    return tuple(tuple(sum(a[row][k] * b[k][column] for k in range(2))
+                       for column in range(2)) for row in range(2))
+
+
+def transpose(matrix):
+    return tuple(zip(*matrix))
+
+
+def swaps(matrix):
+    return matrix[0][0] == 0
+
+
+def load_ops(text):
+    return json.loads(text or '[]')
+
+
+def dump_ops(ops):
+    return json.dumps(ops, separators=(',', ':'))
+
+
+def append(ops, op):
+    """append function - the op list with `op` appended, composed with the
+    last op when they are of the same kind
+    :param: - op - {'transpose': PIL method} or {'crop': [l, t, r, b]}"""
+    ops = list(ops)
+    last = ops[-1] if ops else {}
+    if 'transpose' in op and 'transpose' in last:
+        matrix = multiply(TRANSFORMS[op['transpose']],
+                          TRANSFORMS[last['transpose']])
+        ops.pop()
+        if matrix != IDENTITY:
+            ops.append({'transpose': METHODS[matrix]})
+    elif 'crop' in op and 'crop' in last:
+        left, top = last['crop'][:2]
+        box = op['crop']
+        ops[-1] = {'crop': [left + box[0], top + box[1],
+                            left + box[2], top + box[3]]}
+    else:
+        ops.append(op)
+    return ops
+
+
+def reduce(ops, size):
+    """reduce function - the op list as one crop of the original followed by
+    one transform
+    :param: - size - (width, height) of the original
+    :return: - (crop box in original pixels, matrix, (width, height) of
+               the result)"""
+    box = [0, 0, size[0], size[1]]
+    matrix = IDENTITY
+    for op in ops:
+        if 'transpose' in op:
+            matrix = multiply(TRANSFORMS[op['transpose']], matrix)
+            continue
+        width, height = box[2] - box[0], box[3] - box[1]
+        shown = (height, width) if swaps(matrix) else (width, height)
+        inverse = transpose(matrix)
+        corners = []
+        for x, y in ((op['crop'][0], op['crop'][1]),
+                     (op['crop'][2], op['crop'][3])):
+            # twice the coordinates, the image centre may be a half pixel
+            dx, dy = 2 * x - shown[0], 2 * y - shown[1]
+            corners.append(
+                ((inverse[0][0] * dx + inverse[0][1] * dy + width) // 2,
+                 (inverse[1][0] * dx + inverse[1][1] * dy + height) // 2))
+        (x1, y1), (x2, y2) = corners
+        box = [box[0] + min(x1, x2), box[1] + min(y1, y2),
+               box[0] + max(x1, x2), box[1] + max(y1, y2)]
+    width, height = box[2] - box[0], box[3] - box[1]
+    return box, matrix, (height, width) if swaps(matrix) else (width, height)
+
+
+def file_hash(field_file):
+    """file_hash function - sha256 of an uploaded or stored file"""
+    digest = hashlib.sha256()
+    field_file.open('rb')
+    field_file.seek(0)
+    for chunk in field_file.chunks(HASH_CHUNK):
+        digest.update(chunk)
+    field_file.seek(0)
+    return digest.hexdigest()
+
+
+def original_size(user):
+    return user.avatar_width, user.avatar_height
+
+
+@timed('avatar_ingest')
+def ingest(upload):
+    """ingest function - checks an uploaded avatar from its header and
+    scales it down to AVATAR_MAX_SIDE
+    :return: - (file to store, width, height, format)
+    :raise: - ValidationError"""
+    from PIL import Image
+
+    if upload.size > settings.AVATAR_MAX_BYTES:
+        raise ValidationError('The avatar can be at most {} MB.'.format(
+            settings.AVATAR_MAX_BYTES // (1024 * 1024)))
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+    except (OSError, Image.DecompressionBombError):
+        raise ValidationError('Upload a valid image.')
+    with image:
+        image_format = image.format
+        width, height = image.size
+        if image_format not in settings.AVATAR_FORMATS:
+            raise ValidationError('Upload a {} image.'.format(
+                ', '.join(settings.AVATAR_FORMATS)))
+        if width * height > settings.AVATAR_MAX_PIXELS:
+            raise ValidationError('The avatar can be at most {} '
+                                  'megapixels.'.format(
+                                      settings.AVATAR_MAX_PIXELS // 10 ** 6))
+        side = settings.AVATAR_MAX_SIDE
+        if max(width, height) <= side:
+            upload.seek(0)
+            return upload, width, height, image_format
+        scale = side / max(width, height)
+        bound = (max(1, round(width * scale)), max(1, round(height * scale)))
+        if image_format == 'JPEG':
+            # decodes at 1/2, 1/4 or 1/8 of the size, still >= bound
+            image.draft('RGB', bound)
+        try:
+            image.thumbnail(bound)
+        except (OSError, Image.DecompressionBombError):
+            raise ValidationError('Upload a valid image.')
+        buffer = io.BytesIO()
+        options = {'quality': 90} if image_format == 'JPEG' else {}
+        image.save(buffer, format=image_format, **options)
+        width, height = image.size
+    return (ContentFile(buffer.getvalue(), name=upload.name), width, height,
+            image_format)
+
+
+def current_size(user):
+    """current_size function - (width, height) of the edited avatar"""
+    return reduce(load_ops(user.avatar_ops), original_size(user))[2]
+
+
+def derivative_key(user):
+    """derivative_key function - identifies the original and its edits,
+    None without edits. Depends on the stored (composed) op list only,
+    building it reads no file"""
+    ops = load_ops(user.avatar_ops)
+    if not user.avatar or not ops:
+        return None
+    return '{}-{}'.format(user.avatar_hash[:16], hashlib.sha256(
+        dump_ops(ops).encode()).hexdigest()[:16])
+
+
+@timed('avatar_render')
+def render(user):
+    """render function - saves the edited avatar to the storage and points
+    the user at it, unless the edits changed meanwhile
+    :return: - storage name of the derivative"""
+    from PIL import Image
+
+    ops_text, key = user.avatar_ops, derivative_key(user)
+    box, matrix, _ = reduce(load_ops(ops_text), original_size(user))
+    with user.avatar.open('rb') as original, Image.open(original) as image:
+        image_format = image.format
+        edited = image.crop(box) if box != [0, 0] + list(image.size) \
+            else image.copy()
+    if matrix != IDENTITY:
+        edited = edited.transpose(METHODS[matrix])
+    options = {'quality': 90} if image_format == 'JPEG' else {}
+    buffer = io.BytesIO()
+    edited.save(buffer, format=image_format, **options)
+    extension = os.path.splitext(user.avatar.name)[1].lower()
+    name = default_storage.save(
+        '{}/avatar{}'.format(settings.AVATAR_CACHE_DIR, extension),
+        ContentFile(buffer.getvalue()))
+    type(user).objects.filter(pk=user.pk, avatar_ops=ops_text).update(
+        avatar_derivative=name, avatar_derivative_key=key)
+    user.avatar_derivative, user.avatar_derivative_key = name, key
+    return name
@@ -0,0 +1,204 @@
+"""Digest emails.
+
+Users opt in to a daily or weekly email listing the new projects with an
+open position asking for one of their skills. A run covers the projects
+created since the previous run of the same frequency (by primary key, see
+DigestRun) and works through the subscribers in primary key order, a batch
+at a time:
+
+- the new projects' positions are indexed once per run, canonical skill
+  name -> project pk -> position names
+- the skills of a batch of users are loaded in one query and looked up in
+  the index
+- the template is compiled once per run, the messages of a batch go out
+  over one mail connection
+
+The run saves its checkpoint (the last user pk) and its metrics after every
+batch, an interrupted run resumes from there on the next invocation.
+"""
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Max, Q
+from django.template.loader import get_template
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import DigestRun, Skill, User
+# noinspection PyUnresolvedReferences
+from projects.feed import alias_groups
+# noinspection PyUnresolvedReferences
+from projects.models import Position, Project
+# noinspection PyUnresolvedReferences
+from social_team_builder.metrics import timed
+
+PERIODS = {'daily': timedelta(days=1), 'weekly': timedelta(days=7)}
+# a scheduler firing a little early still starts the next run
+SLACK = timedelta(hours=1)
+
+
+class DigestRunner:
+    """Digest runner - sends the digests of one frequency
+    :argument: - frequency - 'daily' or 'weekly'
+               - batch_size - users per batch
+    :methods: - due()
+              - start() - resumes the unfinished run, if any
+              - index()
+              - matches()
+              - message()
+              - send_batch()
+              - run()
+    """
+    template_name = 'accounts/digest_email.txt'
+
+    def __init__(self, frequency, batch_size=None):
+        self.frequency = frequency
+        self.batch_size = batch_size or settings.DIGEST_BATCH_SIZE
+        self.template = None
+        self.aliases = {}
+
+    def runs(self):
+        # noinspection PyUnresolvedReferences
+        return DigestRun.objects.filter(frequency=self.frequency)
+
+    def due(self, now=None):
+        """due method - whether a period has passed since the last run"""
+        now = now or timezone.now()
+        last = self.runs().filter(finished_at__isnull=False).order_by(
+            '-started_at').values_list('started_at', flat=True).first()
+        return last is None or \
+            now - last >= PERIODS[self.frequency] - SLACK
+
+    def start(self):
+        run = self.runs().filter(finished_at__isnull=True).order_by(
+            'pk').first()
+        if run is not None:
+            return run
+        after = self.runs().filter(finished_at__isnull=False).aggregate(
+            after=Max('last_project_id'))['after']
+        # noinspection PyUnresolvedReferences
+        last = Project.all_objects.aggregate(last=Max('pk'))['last'] or 0
+        if after is None:
+            # the first run only looks one period back, projects without a
+            # created_at are older than the field
+            # noinspection PyUnresolvedReferences
+            after = Project.all_objects.filter(
+                Q(created_at__isnull=True) |
+                Q(created_at__lt=timezone.now() - PERIODS[self.frequency])
+            ).aggregate(after=Max('pk'))['after'] or 0
+        # noinspection PyUnresolvedReferences
+        return DigestRun.objects.create(
+            frequency=self.frequency, after_project_id=after,
+            last_project_id=last)
+
+    def index(self, run):
+        """index method - open positions of the run's new projects
+        :return: - (projects by pk, {canonical skill: {project pk:
+                   {position names}}})"""
+        # noinspection PyUnresolvedReferences
+        projects = Project.objects.filter(
+            pk__gt=run.after_project_id, pk__lte=run.last_project_id)
+        projects = {project.pk: project for project in projects}
+        index = defaultdict(lambda: defaultdict(set))
+        # noinspection PyUnresolvedReferences
+        for project_id, position, normalised in Position.objects.filter(
+                project_id__in=projects).open().values_list(
+                'project_id', 'name', 'skill__normalized_name'):
+            if normalised is None:
+                continue
+            index[self.aliases.get(normalised, normalised)][project_id].add(
+                position)
+        return projects, index
+
+    def matches(self, user_id, skills, projects, index):
+        """matches method - [(project, sorted position names)] of the new
+        projects asking for one of the skills, newest first"""
+        found = defaultdict(set)
+        for normalised in skills:
+            canonical = self.aliases.get(normalised, normalised)
+            for project_id, positions in index.get(canonical, {}).items():
+                if projects[project_id].user_id != user_id:
+                    found[project_id].update(positions)
+        return [(projects[pk], sorted(found[pk]))
+                for pk in sorted(found, reverse=True)]
+
+    def message(self, user, matches):
+        site = settings.DIGEST_SITE_URL
+        body = self.template.render({
+            'user': user, 'frequency': self.frequency,
+            'matches': [{'project': project, 'positions': positions,
+                         'url': site + reverse('projects:detail',
+                                               kwargs={'pk': project.pk})}
+                        for project, positions in matches],
+            'settings_url': site + reverse('accounts:profile_edit')})
+        return EmailMessage(
+            'New projects for your skills ({} {})'.format(
+                len(matches), 'project' if len(matches) == 1 else 'projects'),
+            body, to=[user.email])
+
+    @timed('digest_batch')
+    def send_batch(self, users, projects, index):
+        """send_batch method - the digests of one batch of users over one
+        mail connection
+        :return: - (emails sent, failures)"""
+        skills = defaultdict(set)
+        for user_id, normalised in Skill.objects.filter(
+                user__in=users).values_list('user_id', 'normalized_name'):
+            skills[user_id].add(normalised)
+        messages = []
+        for user in users:
+            matches = self.matches(user.pk, skills[user.pk], projects, index)
+            if matches:
+                messages.append(self.message(user, matches))
+        sent = failures = 0
+        if not messages:
+            return sent, failures
+        connection = get_connection()
+        connection.open()
+        try:
+            for message in messages:
+                message.connection = connection
+                try:
+                    sent += message.send()
+                except Exception:
+                    failures += 1
+        finally:
+            connection.close()
+        return sent, failures
+
+    def run(self, max_batches=None):
+        """run method - sends the digests of the current run from its
+        checkpoint on
+        :return: - the DigestRun, finished_at is None when it stopped after
+                   max_batches"""
+        run = self.start()
+        self.template = get_template(self.template_name)
+        self.aliases, _ = alias_groups()
+        projects, index = self.index(run)
+        run.projects = len(projects)
+        batches = 0
+        while index:
+            if max_batches is not None and batches >= max_batches:
+                run.save()
+                return run
+            started = time.perf_counter()
+            users = list(User.objects.filter(
+                digest=self.frequency, is_active=True,
+                pk__gt=run.last_user_id).order_by('pk')[:self.batch_size])
+            if not users:
+                break
+            sent, failures = self.send_batch(users, projects, index)
+            run.last_user_id = users[-1].pk
+            run.users += len(users)
+            run.emails += sent
+            run.failures += failures
+            run.batches += 1
+            run.seconds += time.perf_counter() - started
+            run.save()
+            batches += 1
+        run.finished_at = timezone.now()
+        run.save()
+        return run
@@ -3,8 +3,7 @@ from django.contrib import messages
 from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import UserCreationForm
 
-from PIL import Image
-
+from . import avatars
 from . import models
 
 
@@ -23,9 +22,29 @@ class UserCreateForm(UserCreationForm):
         self.fields['password2'].help_text = None
 
 
-class UserProfileForm(forms.ModelForm):
+class AvatarCleanMixin:
+    """Avatar clean mixin - for the forms with the avatar field, see
+    avatars.ingest()
+    :methods: - clean_avatar()
+    """
+    def clean_avatar(self):
+        # noinspection PyUnresolvedReferences
+        avatar = self.cleaned_data.get('avatar')
+        # a new upload, not the current (committed) avatar
+        if not avatar or getattr(avatar, '_committed', False):
+            return avatar
+        avatar, width, height, image_format = avatars.ingest(avatar)
+        # noinspection PyUnresolvedReferences
+        instance = self.instance
+        instance.avatar_width, instance.avatar_height = width, height
+        instance.avatar_format = image_format
+        return avatar
+
+
+class UserProfileForm(AvatarCleanMixin, forms.ModelForm):
     """User Profile form
-    :inherit: - forms.ModelForm class
+    :inherit: - AvatarCleanMixin
+              - forms.ModelForm class
     :fields: - bio - forms.TextArea()
     """
     bio = forms.Textarea(attrs={"cols": 28, "rows": 8})
@@ -37,16 +56,19 @@ class UserProfileForm(forms.ModelForm):
                   'last_name',
                   'email',
                   'bio',
-                  'avatar']
+                  'avatar',
+                  'digest']
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields['bio'].label = 'Short bio'
+        self.fields['digest'].label = 'Email me new matching projects'
 
 
-class AvatarForm(forms.ModelForm):
+class AvatarForm(AvatarCleanMixin, forms.ModelForm):
     """Avatar Form
-    :inherit: - forms.ModelForm class"""
+    :inherit: - AvatarCleanMixin
+              - forms.ModelForm class"""
     class Meta:
         model = get_user_model()
         fields = ['avatar', ]
@@ -72,22 +94,22 @@ class AvatarCropForm(forms.Form):
 
     def clean(self):
         cleaned_data = super().clean()
-        with Image.open(self.request.user.avatar.path) as avatar:
-            width, height = avatar.size
-
-            left = int(cleaned_data.get('left'))
-            top = int(cleaned_data.get('top'))
-            right = int(cleaned_data.get('right'))
-            bottom = int(cleaned_data.get('bottom'))
-
-            max_left = width - right
-            max_top = height - bottom
-
-            if left >= max_left or top >= max_top or left >= width or top >= height \
-                    or right > width or bottom > height or left < 0 \
-                    or top < 0 or right <= 0 or bottom <= 0:
-                messages.error(self.request, "Unable to crop!")
-                raise forms.ValidationError("")
+        # the size of the avatar with its edits, see avatars.py
+        width, height = avatars.current_size(self.request.user)
+
+        left = int(cleaned_data.get('left'))
+        top = int(cleaned_data.get('top'))
+        right = int(cleaned_data.get('right'))
+        bottom = int(cleaned_data.get('bottom'))
+
+        max_left = width - right
+        max_top = height - bottom
+
+        if left >= max_left or top >= max_top or left >= width or top >= height \
+                or right > width or bottom > height or left < 0 \
+                or top < 0 or right <= left or bottom <= top:
+            messages.error(self.request, "Unable to crop!")
+            raise forms.ValidationError("")
         return cleaned_data
 
 
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from accounts.retention import POLICIES, RetentionRunner
+
+
+class Command(BaseCommand):
+    """Apply retention command
+    - python manage.py apply_retention --policy=purge_notifications
+    :methods: - add_arguments()
+              - handle()
+    """
+    help = 'Archives old decided applications, purges old read ' \
+           'notifications and deletes never activated accounts in ' \
+           'resumable batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--policy', action='append',
+                            choices=sorted(POLICIES),
+                            help='Defaults to every policy.')
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument('--budget', type=float,
+                            help='Seconds per batch.')
+        parser.add_argument('--max-seconds', type=float,
+                            help='Per policy, the next run resumes.')
+        parser.add_argument('--pause', type=float, default=0)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count the rows past retention.')
+
+    def handle(self, *args, **options):
+        runner = RetentionRunner(options['batch_size'], options['budget'],
+                                 options['max_seconds'], options['pause'])
+        for name in options['policy'] or sorted(POLICIES):
+            policy = POLICIES[name]()
+            if options['dry_run']:
+                self.stdout.write('{}: {} rows past retention'.format(
+                    name, policy.candidates().count()))
+                continue
+            rows, batches, finished = runner.run(policy)
+            self.stdout.write(self.style.SUCCESS(
+                '{}: {} rows in {} batches{}'.format(
+                    name, rows, batches,
+                    '' if finished else ', resumes next run')))
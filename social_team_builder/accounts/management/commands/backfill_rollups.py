@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from accounts import rollups
+from accounts.models import (ApplicationArchive, ApplicationRollup,
+                             UserApplication)
+# noinspection PyUnresolvedReferences
+from projects.models import Position
+
+
+class Command(BaseCommand):
+    """Backfill rollups command
+    - python manage.py backfill_rollups --chunk-size=1000
+    :methods: - add_arguments()
+              - handle()
+              - lock() - holds the live updates back until the commit
+              - count() - one table in primary key chunks
+    """
+    help = 'Rebuilds the application rollups from the applications and ' \
+           'the archived applications tables in primary key chunks, in ' \
+           'one transaction: the dashboard shows the old rollups until ' \
+           'the new ones replace them, and the live updates wait for the ' \
+           'rebuild, so run it off-peak.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        fields = ('pk', 'project_id', 'position_id', 'status', 'created_at',
+                  'decided_at')
+        # noinspection PyUnresolvedReferences
+        applications = UserApplication.objects.order_by('pk').only(*fields)
+        # the retention command archives applications without taking them
+        # out of the rollups, the buckets of deleted positions are gone
+        # noinspection PyUnresolvedReferences
+        archived = ApplicationArchive.objects.filter(
+            position_id__in=Position.objects.values('pk')).order_by(
+            'pk').only(*fields)
+
+        buckets, done = {}, 0
+        with transaction.atomic():
+            self.lock()
+            # noinspection PyUnresolvedReferences
+            ApplicationRollup.objects.all().delete()
+            for queryset, label in ((applications, 'applications'),
+                                    (archived, 'archived applications')):
+                done += self.count(queryset, buckets, chunk_size, label)
+            # noinspection PyUnresolvedReferences
+            ApplicationRollup.objects.bulk_create([
+                ApplicationRollup(
+                    project_id=project_id, position_id=position_id, day=day,
+                    status=status, count=count, decision_seconds=seconds)
+                for (project_id, position_id, day, status), (count, seconds)
+                in buckets.items()], batch_size=chunk_size)
+        if not done:
+            self.stdout.write(self.style.SUCCESS('No applications.'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            'Rollups rebuilt from {} applications.'.format(done)))
+
+    @staticmethod
+    def lock():
+        """lock method - a live update made while the tables are read would
+        be counted twice or lost, it waits for the commit instead and
+        applies on top of the rebuilt rollups. Reads go on. SQLite has one
+        write lock, the delete takes it"""
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                # noinspection PyProtectedMember
+                cursor.execute('LOCK TABLE {} IN EXCLUSIVE MODE'.format(
+                    connection.ops.quote_name(
+                        ApplicationRollup._meta.db_table)))
+
+    def count(self, queryset, buckets, chunk_size, label):
+        done, cursor = 0, 0
+        while True:
+            chunk = list(queryset.filter(pk__gt=cursor)[:chunk_size])
+            if not chunk:
+                break
+            rollups.count_applications(chunk, buckets)
+            cursor = chunk[-1].pk
+            done += len(chunk)
+            self.stdout.write('{} {} counted'.format(done, label))
+        return done
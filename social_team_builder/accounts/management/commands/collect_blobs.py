@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+# noinspection PyUnresolvedReferences
+from social_team_builder.storage import collect_garbage
+
+
+class Command(BaseCommand):
+    """Collect blobs command
+    - python manage.py collect_blobs --grace-hours=24
+    :methods: - add_arguments()
+              - handle()
+    """
+    help = 'Deletes the content-addressed media files (replaced avatars, ' \
+           'stale avatar edits) that no row references any more.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=1,
+                            help='Keeps younger files, their upload may '
+                                 'not be committed yet.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count the files.')
+
+    def handle(self, *args, **options):
+        if not hasattr(default_storage, 'blobs'):
+            raise CommandError('The media storage is not content-addressed.')
+        deleted, freed = collect_garbage(
+            default_storage, timedelta(hours=options['grace_hours']),
+            options['dry_run'])
+        self.stdout.write(self.style.SUCCESS('{} {} files ({} KB)'.format(
+            'Would delete' if options['dry_run'] else 'Deleted', deleted,
+            freed // 1024)))
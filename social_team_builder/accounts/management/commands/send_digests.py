@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from accounts.digest import PERIODS, DigestRunner
+
+
+class Command(BaseCommand):
+    """Send digests command
+    - python manage.py send_digests --frequency=daily
+    - meant to run from cron, an interrupted run resumes on the next call
+    :methods: - add_arguments()
+              - handle()
+    """
+    help = 'Emails the new projects matching their skills to the users ' \
+           'who asked for a daily or weekly digest.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--frequency', action='append',
+                            choices=sorted(PERIODS),
+                            help='Defaults to every frequency.')
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument('--max-batches', type=int,
+                            help='The next call resumes the run.')
+        parser.add_argument('--force', action='store_true',
+                            help='Start a run even if the last one is '
+                                 'less than a period ago.')
+
+    def handle(self, *args, **options):
+        for frequency in options['frequency'] or sorted(PERIODS):
+            runner = DigestRunner(frequency, options['batch_size'])
+            if not options['force'] and not runner.due() and \
+                    not runner.runs().filter(
+                        finished_at__isnull=True).exists():
+                self.stdout.write('{}: not due'.format(frequency))
+                continue
+            run = runner.run(options['max_batches'])
+            self.stdout.write(self.style.SUCCESS(
+                '{}: {} new projects, {} users, {} emails, {} failures in '
+                '{} batches ({:.2f}s){}'.format(
+                    frequency, run.projects, run.users, run.emails,
+                    run.failures, run.batches, run.seconds,
+                    '' if run.finished_at else ', resumes next run')))
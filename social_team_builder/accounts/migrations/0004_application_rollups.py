@@ -0,0 +1,46 @@
+# Generated by Django 2.2.10 on 2026-10-19 12:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0003_position_filled'),
+        ('accounts', '0003_user_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userapplication',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='userapplication',
+            name='decided_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='ApplicationRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('received', 'Received'), ('accepted', 'Accepted'), ('rejected', 'Rejected')], max_length=10)),
+                ('count', models.IntegerField(default=0)),
+                ('decision_seconds', models.BigIntegerField(default=0)),
+                ('position', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='projects.Position')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='projects.Project')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='applicationrollup',
+            index=models.Index(fields=['project', 'day'], name='accounts_ap_project_87ecc8_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='applicationrollup',
+            unique_together={('position', 'day', 'status')},
+        ),
+    ]
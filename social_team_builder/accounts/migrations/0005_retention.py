@@ -0,0 +1,41 @@
+# Generated by Django 2.2.10 on 2026-10-19 12:06
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_application_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApplicationArchive',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('application_id', models.IntegerField(unique=True)),
+                ('applicant_id', models.IntegerField(db_index=True)),
+                ('project_id', models.IntegerField(db_index=True)),
+                ('position_id', models.IntegerField()),
+                ('project_title', models.CharField(max_length=50)),
+                ('position_name', models.CharField(max_length=50)),
+                ('status', models.BooleanField()),
+                ('created_at', models.DateTimeField()),
+                ('decided_at', models.DateTimeField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RetentionCursor',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('policy', models.CharField(max_length=50, unique=True)),
+                ('last_pk', models.IntegerField(default=0)),
+                ('rows', models.PositiveIntegerField(default=0)),
+                ('passes', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.10 on 2026-10-19 12:10
+
+from django.db import migrations, models
+
+from projects.names import normalise_name
+
+
+def normalise_skills(apps, schema_editor):
+    Skill = apps.get_model('accounts', 'Skill')
+    for pk, name in Skill.objects.values_list('pk', 'name').iterator():
+        Skill.objects.filter(pk=pk).update(
+            normalized_name=normalise_name(name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_retention'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='skill',
+            name='normalized_name',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=50),
+        ),
+        migrations.RunPython(normalise_skills, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 2.2.10 on 2026-10-19 12:18
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_skill_normalized_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='digest',
+            field=models.CharField(blank=True, choices=[('', 'Never'), ('daily', 'Daily'), ('weekly', 'Weekly')], db_index=True, default='', max_length=6),
+        ),
+        migrations.CreateModel(
+            name='DigestRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('frequency', models.CharField(choices=[('daily', 'Daily'), ('weekly', 'Weekly')], max_length=6)),
+                ('after_project_id', models.IntegerField(default=0)),
+                ('last_project_id', models.IntegerField(default=0)),
+                ('last_user_id', models.IntegerField(default=0)),
+                ('projects', models.PositiveIntegerField(default=0)),
+                ('users', models.PositiveIntegerField(default=0)),
+                ('emails', models.PositiveIntegerField(default=0)),
+                ('failures', models.PositiveIntegerField(default=0)),
+                ('batches', models.PositiveIntegerField(default=0)),
+                ('seconds', models.FloatField(default=0)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'index_together': {('frequency', 'finished_at')},
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 2.2.10 on 2026-10-19 12:22
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def hash_avatars(apps, schema_editor):
+    """hash_avatars function - sha256 of the avatars uploaded so far, the
+    edited avatars are named after it"""
+    User = apps.get_model('accounts', 'User')
+    for user in User.objects.exclude(avatar='').only('pk', 'avatar'):
+        digest = hashlib.sha256()
+        try:
+            with user.avatar.open('rb') as avatar:
+                for chunk in avatar.chunks():
+                    digest.update(chunk)
+        except (IOError, OSError):
+            continue
+        User.objects.filter(pk=user.pk).update(
+            avatar_hash=digest.hexdigest())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_digest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='avatar_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='avatar_ops',
+            field=models.TextField(default='[]', editable=False),
+        ),
+        migrations.RunPython(hash_avatars, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 2.2.10 on 2026-10-19 12:26
+
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+
+def read_avatars(apps, schema_editor):
+    """read_avatars function - size and format of the avatars uploaded so
+    far, from their headers"""
+    # runserver loads every migration on start
+    from PIL import Image
+
+    User = apps.get_model('accounts', 'User')
+    for pk, name in User.objects.exclude(avatar='').values_list(
+            'pk', 'avatar'):
+        try:
+            with default_storage.open(name) as avatar, \
+                    Image.open(avatar) as image:
+                (width, height), image_format = image.size, image.format
+        except (IOError, OSError):
+            continue
+        User.objects.filter(pk=pk).update(
+            avatar_width=width, avatar_height=height,
+            avatar_format=image_format)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_avatar_ops'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='avatar_format',
+            field=models.CharField(blank=True, default='', editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='avatar_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='avatar_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='avatar',
+            field=models.ImageField(blank=True, height_field='avatar_height', upload_to='./user_avatar', width_field='avatar_width'),
+        ),
+        migrations.RunPython(read_avatars, migrations.RunPython.noop),
+    ]
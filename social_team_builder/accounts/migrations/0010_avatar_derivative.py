@@ -0,0 +1,23 @@
+# Generated by Django 2.2.10 on 2026-10-19 12:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_avatar_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='avatar_derivative',
+            field=models.FileField(blank=True, editable=False, upload_to=''),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='avatar_derivative_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=33),
+        ),
+    ]
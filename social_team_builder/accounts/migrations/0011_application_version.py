@@ -0,0 +1,18 @@
+# Generated by Django 2.2.10 on 2026-10-19 13:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_avatar_derivative'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userapplication',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.10 on 2026-10-19 13:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_application_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='avatar',
+            field=models.ImageField(blank=True, upload_to='./user_avatar'),
+        ),
+    ]
@@ -1,5 +1,12 @@
 # NOTE: # noinspection - prefixed comments are for pycharm editor only
 # for ignoring PEP 8 style highlights
+import hashlib
+
+from django.conf import settings
+from django.contrib import messages
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
 
 
 class PageTitleMixin:
@@ -19,3 +26,101 @@ class PageTitleMixin:
         context = super().get_context_data(**kwargs)
         context['page_title'] = self.get_page_title()
         return context
+
+
+class ApplicationFilterMixin:
+    """Application filter mixin class
+    - shared by the application list and the csv export
+    :methods: - choice() - staticmethod
+              - status_label() - staticmethod
+              - filter_applications()
+    """
+    status_labels = {None: 'New application',
+                     True: 'Accepted',
+                     False: 'Rejected'}
+
+    @staticmethod
+    def choice(arg):
+        if arg == "New application":
+            arg = None
+        if arg == "Accepted":
+            arg = True
+        if arg == "Rejected":
+            arg = False
+        return arg
+
+    @classmethod
+    def status_label(cls, status):
+        return cls.status_labels.get(status, '')
+
+    def filter_applications(self, queryset):
+        """filter_applications method - applies the app/pro/skill GET filters
+        :param: - queryset - UserApplication queryset"""
+        # noinspection PyUnresolvedReferences
+        request = self.request
+        app_term = request.GET.get('app_filter')
+        pro_term = request.GET.get('pro_filter')
+        skill_term = request.GET.get('skill_filter')
+        # applications of deleted projects wait for their DeletionJob
+        queryset = queryset.filter(project__is_deleted=False)
+        if app_term:
+            queryset = queryset.filter(status=self.choice(app_term))
+
+        if pro_term:
+            queryset = queryset.filter(project__title=pro_term)
+
+        if skill_term:
+            queryset = queryset.filter(position__name=skill_term)
+
+        return queryset
+
+
+class ConditionalGetMixin:
+    """Conditional get mixin class
+    - answers If-None-Match/If-Modified-Since with a 304 before the view
+      runs its queries or renders the template
+    :argument: - public_max_age - shared cache lifetime of anonymous pages
+    :methods: - get_validators() - (parts, last_modified) or None
+              - get_etag()
+              - dispatch()
+    """
+    public_max_age = settings.CONDITIONAL_PUBLIC_MAX_AGE
+
+    def get_validators(self):
+        """get_validators method - cheap values that change whenever the
+        rendered page would, without loading the page objects"""
+        raise NotImplementedError
+
+    def get_etag(self, parts):
+        # noinspection PyUnresolvedReferences
+        user = self.request.user
+        parts = [user.pk if user.is_authenticated else 0] + list(parts)
+        digest = hashlib.md5(repr(parts).encode()).hexdigest()
+        return quote_etag(digest)
+
+    def dispatch(self, request, *args, **kwargs):
+        # flash messages are part of the page, they must not be skipped
+        if request.method not in ('GET', 'HEAD') or \
+                len(messages.get_messages(request)):
+            return super().dispatch(request, *args, **kwargs)
+        validators = self.get_validators()
+        if validators is None:
+            return super().dispatch(request, *args, **kwargs)
+        parts, last_modified = validators
+        etag = self.get_etag(parts)
+        last_modified = int(last_modified.timestamp())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(response, public=True,
+                                max_age=self.public_max_age)
+        patch_vary_headers(response, ('Cookie',))
+        return response
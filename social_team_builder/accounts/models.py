@@ -9,6 +9,10 @@ from django.urls import reverse
 from django.db import models
 from django.utils import timezone
 
+from . import avatars
+# noinspection PyUnresolvedReferences
+from projects.names import normalise_name
+
 
 class UserManager(BaseUserManager):
     """User Manager class for creating user and superuser
@@ -42,13 +46,32 @@ class UserManager(BaseUserManager):
         return user
 
 
+DIGEST_CHOICES = (
+    ('', 'Never'),
+    ('daily', 'Daily'),
+    ('weekly', 'Weekly'),
+)
+
+
 class User(AbstractBaseUser, PermissionsMixin):
     """User model
     :inherit: - models.AbstractBaseUser
               - models.PermissionsMixin
     :fields: - base fields: - username, email, date_joined, is_active, is_staff
              - project related fields: - first_name, last_name, bio, avatar
-    :methods: - full_name() as a property
+             - updated_at - profile version, also bumped by skill and
+                            project changes (see signals)
+             - digest - opt-in digest email frequency, see digest.py
+             - avatar_width, avatar_height, avatar_format, avatar_hash -
+               read once when the avatar is uploaded (see
+               AvatarCleanMixin)
+             - avatar_ops - the edits made on top of the untouched
+               original, see avatars.py
+             - avatar_derivative, avatar_derivative_key - the rendered
+               edits and the edits it shows
+    :methods: - save()
+              - avatar_url() as a property
+              - full_name() as a property
               - __str__()
               - get_absolute_url()
               - get_short_name()
@@ -59,11 +82,28 @@ class User(AbstractBaseUser, PermissionsMixin):
     first_name = models.CharField(max_length=50)
     last_name = models.CharField(max_length=50)
     bio = models.TextField(default='')
+    # no width_field/height_field, ImageField would open the file on every
+    # load of a user whose sizes are unknown; ingest() reads them once
     avatar = models.ImageField(upload_to='./user_avatar', blank=True)
+    avatar_width = models.PositiveIntegerField(null=True, blank=True,
+                                               editable=False)
+    avatar_height = models.PositiveIntegerField(null=True, blank=True,
+                                                editable=False)
+    avatar_format = models.CharField(max_length=10, blank=True, default='',
+                                     editable=False)
+    avatar_hash = models.CharField(max_length=64, blank=True, default='',
+                                   editable=False)
+    avatar_ops = models.TextField(default='[]', editable=False)
+    avatar_derivative = models.FileField(blank=True, editable=False)
+    avatar_derivative_key = models.CharField(max_length=33, blank=True,
+                                             default='', editable=False)
 
     date_joined = models.DateTimeField(default=timezone.now)
     is_active = models.BooleanField(default=False)
     is_staff = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    digest = models.CharField(max_length=6, choices=DIGEST_CHOICES,
+                              blank=True, default='', db_index=True)
 
     # objects which use the UserManager class
     objects = UserManager()
@@ -72,6 +112,34 @@ class User(AbstractBaseUser, PermissionsMixin):
     # Required field for login
     REQUIRED_FIELDS = ['username']
 
+    def save(self, *args, **kwargs):
+        # a new upload (not yet committed to the storage) starts unedited
+        # noinspection PyProtectedMember
+        if self.avatar and not self.avatar._committed:
+            self.avatar_hash = avatars.file_hash(self.avatar)
+            self.avatar_ops = '[]'
+        elif not self.avatar:
+            self.avatar_hash, self.avatar_ops = '', '[]'
+            self.avatar_format = ''
+            self.avatar_width = self.avatar_height = None
+        if not self.avatar or self.avatar_ops == '[]':
+            self.avatar_derivative, self.avatar_derivative_key = '', ''
+        super().save(*args, **kwargs)
+
+    @property
+    def avatar_url(self):
+        """avatar_url property - the edited avatar when there are edits,
+        rendered by AvatarFileView on its first request"""
+        if not self.avatar:
+            return ''
+        key = avatars.derivative_key(self)
+        if key is None:
+            return self.avatar.url
+        if self.avatar_derivative and self.avatar_derivative_key == key:
+            return self.avatar_derivative.url
+        return reverse('accounts:avatar_file', kwargs={'pk': self.pk,
+                                                       'key': key})
+
     @property
     def full_name(self):
         return '{} {}'.format(self.first_name, self.last_name)
@@ -94,10 +162,18 @@ class Skill(models.Model):
     """Skill model
     :inherit: - models.Model
     :fields: - user, name
-    :methods: - __str__()
+             - normalized_name - set on save, see projects/names.py
+    :methods: - save()
+              - __str__()
     """
     user = models.ForeignKey(User, default='', related_name="profile_skills", on_delete=models.CASCADE)
     name = models.CharField(max_length=50)
+    normalized_name = models.CharField(max_length=50, default='',
+                                       db_index=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        self.normalized_name = normalise_name(self.name)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
@@ -119,14 +195,151 @@ class MyProject(models.Model):
         return self.name
 
 
+class UserApplicationQuerySet(models.QuerySet):
+    """User application queryset
+    :inherit: - models.QuerySet
+    :methods: - transition()
+    """
+    def transition(self, application, status):
+        """transition method - moves the application to status with one
+        conditional UPDATE, matching only while the row still has the
+        version the application was read with. No row is locked before
+        the UPDATE, concurrent transitions of the same version all but
+        one match nothing
+        :return: - whether the transition won"""
+        if status not in UserApplication.TRANSITIONS[application.status]:
+            return False
+        now = timezone.now()
+        won = self.filter(pk=application.pk,
+                          version=application.version).update(
+            status=status, decided_at=now, version=models.F('version') + 1)
+        if won:
+            application.status, application.decided_at = status, now
+            application.version += 1
+        return bool(won)
+
+
 class UserApplication(models.Model):
     """User Application model
     :inherit: - models.Model
     :fields: - applicant, position, project, status
+             - created_at, decided_at
+             - version - bumped by every transition
     """
+    NEW = None
+    ACCEPTED = True
+    REJECTED = False
+    # new -> accepted/rejected, a decision can be reversed
+    TRANSITIONS = {NEW: (ACCEPTED, REJECTED),
+                   ACCEPTED: (REJECTED,),
+                   REJECTED: (ACCEPTED,)}
+
     applicant = models.ForeignKey(settings.AUTH_USER_MODEL,
                                   on_delete=models.CASCADE,
                                   related_name='application')
     position = models.ForeignKey('projects.Position', related_name='apply', on_delete=models.CASCADE)
     project = models.ForeignKey('projects.Project', related_name='user_projects', on_delete=models.CASCADE)
     status = models.NullBooleanField(default=None)
+    created_at = models.DateTimeField(default=timezone.now)
+    decided_at = models.DateTimeField(null=True, blank=True)
+    version = models.PositiveIntegerField(default=0)
+
+    objects = UserApplicationQuerySet.as_manager()
+
+
+class ApplicationRollup(models.Model):
+    """Application rollup model - daily application counts per position,
+    kept up to date incrementally (see rollups.py)
+    :inherit: - models.Model
+    :fields: - project, position, day, status, count
+             - decision_seconds - summed time to decision of the
+                                  accepted/rejected buckets
+    """
+    RECEIVED = 'received'
+    ACCEPTED = 'accepted'
+    REJECTED = 'rejected'
+    STATUS_CHOICES = ((RECEIVED, 'Received'),
+                      (ACCEPTED, 'Accepted'),
+                      (REJECTED, 'Rejected'))
+
+    project = models.ForeignKey('projects.Project', related_name='rollups',
+                                on_delete=models.CASCADE)
+    position = models.ForeignKey('projects.Position', related_name='rollups',
+                                 on_delete=models.CASCADE)
+    day = models.DateField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES)
+    count = models.IntegerField(default=0)
+    decision_seconds = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('position', 'day', 'status')
+        indexes = [models.Index(fields=['project', 'day'])]
+
+
+class ApplicationArchive(models.Model):
+    """Application archive model - decided applications moved out of
+    UserApplication by the retention command. Plain ids and copied names,
+    so archived rows outlive their users and projects
+    :inherit: - models.Model
+    :fields: - application_id, applicant_id, project_id, position_id
+             - project_title, position_name
+             - status, created_at, decided_at, archived_at
+    """
+    application_id = models.IntegerField(unique=True)
+    applicant_id = models.IntegerField(db_index=True)
+    project_id = models.IntegerField(db_index=True)
+    position_id = models.IntegerField()
+    project_title = models.CharField(max_length=50)
+    position_name = models.CharField(max_length=50)
+    status = models.BooleanField()
+    created_at = models.DateTimeField()
+    decided_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+
+class RetentionCursor(models.Model):
+    """Retention cursor model - where a retention policy resumes
+    :inherit: - models.Model
+    :fields: - policy, last_pk - 0 once a pass is complete
+             - rows - handled in total, passes - completed
+             - updated_at
+    """
+    policy = models.CharField(max_length=50, unique=True)
+    last_pk = models.IntegerField(default=0)
+    rows = models.PositiveIntegerField(default=0)
+    passes = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return '{} at {}'.format(self.policy, self.last_pk)
+
+
+class DigestRun(models.Model):
+    """Digest run model - one digest email run and its checkpoint
+    :inherit: - models.Model
+    :fields: - frequency
+             - after_project_id, last_project_id - the new projects are the
+               ones with a pk in (after_project_id, last_project_id]
+             - last_user_id - checkpoint, the run resumes after it
+             - metrics: projects, users, emails, failures, batches, seconds
+             - started_at, updated_at, finished_at - null while running
+    """
+    frequency = models.CharField(max_length=6, choices=DIGEST_CHOICES[1:])
+    after_project_id = models.IntegerField(default=0)
+    last_project_id = models.IntegerField(default=0)
+    last_user_id = models.IntegerField(default=0)
+    projects = models.PositiveIntegerField(default=0)
+    users = models.PositiveIntegerField(default=0)
+    emails = models.PositiveIntegerField(default=0)
+    failures = models.PositiveIntegerField(default=0)
+    batches = models.PositiveIntegerField(default=0)
+    seconds = models.FloatField(default=0)
+    started_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        index_together = ('frequency', 'finished_at')
+
+    def __str__(self):
+        return '{} digest of {}'.format(self.frequency, self.started_at)
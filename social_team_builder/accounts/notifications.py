@@ -0,0 +1,80 @@
+"""Notification change markers.
+
+Every user has a version key in the cache which changes whenever one of
+their notifications is saved or deleted. Pollers compare the version they
+last saw with the cached one, so idle polls never touch the notifications
+table.
+"""
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+VERSION_KEY = 'notifications:version:{}'
+
+
+def new_version():
+    return '{:.6f}'.format(time.time())
+
+
+def bump_version(user_id):
+    """bump_version function - marks the user's notifications as changed"""
+    version = new_version()
+    cache.set(VERSION_KEY.format(user_id), version, None)
+    return version
+
+
+def bumps_version(view):
+    """bumps_version decorator - for the notify views that write with
+    QuerySet.update(), which sends no post_save (mark all read/unread)"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            # the response may fail after the write
+            if request.user.is_authenticated:
+                bump_version(request.user.pk)
+    return wrapper
+
+
+def get_version(user_id):
+    """get_version function - a missing key (cold or evicted cache) gets a
+    fresh version, clients then refresh once instead of missing a change"""
+    version = cache.get(VERSION_KEY.format(user_id))
+    if version is None:
+        version = new_version()
+        if not cache.add(VERSION_KEY.format(user_id), version, None):
+            version = cache.get(VERSION_KEY.format(user_id), version)
+    return version
+
+
+def wait_for_change(user_id, version, timeout):
+    """wait_for_change function - sleeps until the version differs from
+    the given one or the timeout runs out
+    :return: - current version"""
+    interval = settings.NOTIFICATIONS_POLL_INTERVAL
+    deadline = time.monotonic() + timeout
+    current = get_version(user_id)
+    while current == version and time.monotonic() < deadline:
+        time.sleep(min(interval, max(deadline - time.monotonic(), 0)))
+        current = get_version(user_id)
+    return current
+
+
+def snapshot(user, cursor=0, limit=20):
+    """snapshot function - unread count and unread notifications newer than
+    the cursor, the only place that queries the notifications table"""
+    unreads = user.notifications.unread()
+    notifications = list(unreads.filter(pk__gt=cursor).order_by('-pk').values(
+        'pk', 'verb', 'created')[:limit])
+    return {
+        'unread': unreads.count(),
+        'cursor': max([cursor] + [item['pk'] for item in notifications]),
+        'notifications': [{'id': item['pk'],
+                           'verb': item['verb'],
+                           'created': item['created'].isoformat()}
+                          for item in reversed(notifications)],
+    }
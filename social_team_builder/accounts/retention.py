@@ -0,0 +1,192 @@
+"""Retention policies.
+
+Each policy picks the rows of one table that are past their retention age
+and archives or deletes them. RetentionRunner applies a policy in primary
+key order, a batch per transaction, saving its RetentionCursor with every
+batch so an interrupted run resumes where it stopped. The batch size adapts
+to RETENTION_BATCH_SECONDS, so no batch holds the write lock for long while
+live traffic is running.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from notify.models import Notification
+
+from .models import ApplicationArchive, RetentionCursor, User, UserApplication
+from .notifications import bump_version
+# noinspection PyUnresolvedReferences
+from projects.deletion import Cascade
+# noinspection PyUnresolvedReferences
+from projects.models import Project
+
+
+class Policy:
+    """Policy - one retention rule
+    :argument: - name - also the RetentionCursor key
+               - days_setting - name of the retention age setting
+    :methods: - cutoff() as a property
+              - candidates() - queryset of the rows past retention
+              - apply() - handles one batch of candidate pks, returns rows
+    """
+    name = None
+    days_setting = None
+
+    def __init__(self, now=None):
+        self.now = now or timezone.now()
+
+    @property
+    def cutoff(self):
+        return self.now - timedelta(days=getattr(settings,
+                                                 self.days_setting))
+
+    def candidates(self):
+        raise NotImplementedError
+
+    def apply(self, pks):
+        raise NotImplementedError
+
+
+class ArchiveApplications(Policy):
+    """Archive applications policy - decided applications move to
+    ApplicationArchive. Accepted applications that fill their position stay,
+    the position's filled state depends on them, and the rollups keep
+    counting the archived ones"""
+    name = 'archive_applications'
+    days_setting = 'RETENTION_APPLICATION_DAYS'
+
+    def candidates(self):
+        # noinspection PyUnresolvedReferences
+        return UserApplication.objects.filter(
+            Q(decided_at__lt=self.cutoff) |
+            Q(decided_at__isnull=True, created_at__lt=self.cutoff),
+            status__isnull=False).exclude(
+            status=True, position__filled_by=F('applicant'))
+
+    def apply(self, pks):
+        applications = self.candidates().filter(pk__in=pks)
+        rows = list(applications.values(
+            'pk', 'applicant_id', 'project_id', 'position_id',
+            'project__title', 'position__name', 'status', 'created_at',
+            'decided_at'))
+        # noinspection PyUnresolvedReferences
+        ApplicationArchive.objects.bulk_create([ApplicationArchive(
+            application_id=row['pk'], applicant_id=row['applicant_id'],
+            project_id=row['project_id'], position_id=row['position_id'],
+            project_title=row['project__title'],
+            position_name=row['position__name'], status=row['status'],
+            created_at=row['created_at'], decided_at=row['decided_at'],
+            archived_at=self.now) for row in rows], ignore_conflicts=True)
+        # the delete signals would take the archived applications out of
+        # the rollups
+        # noinspection PyProtectedMember
+        UserApplication.objects.filter(
+            pk__in=[row['pk'] for row in rows])._raw_delete(applications.db)
+        # noinspection PyUnresolvedReferences
+        Project.objects.filter(
+            pk__in={row['project_id'] for row in rows}).update(
+            updated_at=timezone.now())
+        return len(rows)
+
+
+class PurgeNotifications(Policy):
+    """Purge notifications policy - read (or dismissed) notifications"""
+    name = 'purge_notifications'
+    days_setting = 'RETENTION_NOTIFICATION_DAYS'
+
+    def candidates(self):
+        return Notification.objects.filter(
+            Q(read=True) | Q(deleted=True), created__lt=self.cutoff)
+
+    def apply(self, pks):
+        notifications = self.candidates().filter(pk__in=pks)
+        recipients = set(notifications.values_list('recipient_id',
+                                                   flat=True))
+        # one version bump per recipient instead of one per notification
+        # noinspection PyProtectedMember
+        rows = notifications._raw_delete(notifications.db)
+        for recipient_id in recipients:
+            transaction.on_commit(
+                lambda pk=recipient_id: bump_version(pk))
+        return rows
+
+
+class DeleteUnactivated(Policy):
+    """Delete unactivated policy - sign ups that never validated their
+    email address"""
+    name = 'delete_unactivated'
+    days_setting = 'RETENTION_UNACTIVATED_DAYS'
+
+    def candidates(self):
+        return User.objects.filter(
+            is_active=False, last_login__isnull=True, is_staff=False,
+            is_superuser=False, date_joined__lt=self.cutoff)
+
+    def apply(self, pks):
+        cascade = Cascade(pause=0)
+        cascade.purge(self.candidates().filter(pk__in=pks))
+        return cascade.rows
+
+
+POLICIES = {policy.name: policy for policy in (
+    ArchiveApplications, PurgeNotifications, DeleteUnactivated)}
+
+
+class RetentionRunner:
+    """Retention runner - applies policies in resumable, time boxed batches
+    :argument: - batch_size - largest batch
+               - budget - seconds per batch, larger batches shrink
+               - max_seconds - per policy and run, the cursor resumes
+               - pause - seconds between batches
+    :methods: - run()
+              - resize()
+    """
+    def __init__(self, batch_size=None, budget=None, max_seconds=None,
+                 pause=0):
+        self.batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+        self.budget = budget or settings.RETENTION_BATCH_SECONDS
+        self.max_seconds = max_seconds
+        self.pause = pause
+
+    def run(self, policy):
+        """run method - applies a policy until it has no rows left or the
+        run is out of time
+        :return: - (rows, batches, finished)"""
+        # noinspection PyUnresolvedReferences
+        cursor, _ = RetentionCursor.objects.get_or_create(policy=policy.name)
+        size, rows, batches = self.batch_size, 0, 0
+        started = time.perf_counter()
+        while True:
+            if self.max_seconds is not None and \
+                    time.perf_counter() - started >= self.max_seconds:
+                return rows, batches, False
+            pks = list(policy.candidates().filter(
+                pk__gt=cursor.last_pk).order_by('pk').values_list(
+                'pk', flat=True)[:size])
+            if not pks:
+                cursor.last_pk = 0
+                cursor.passes += 1
+                cursor.save()
+                return rows, batches, True
+            start = time.perf_counter()
+            with transaction.atomic():
+                handled = policy.apply(pks)
+                cursor.last_pk = pks[-1]
+                cursor.rows += handled
+                cursor.save()
+            size = self.resize(size, time.perf_counter() - start)
+            rows += handled
+            batches += 1
+            if self.pause:
+                time.sleep(self.pause)
+
+    def resize(self, size, seconds):
+        if seconds > self.budget:
+            return max(1, int(size * self.budget / seconds))
+        if seconds < self.budget / 2:
+            return min(size * 2, self.batch_size)
+        return size
@@ -0,0 +1,114 @@
+"""Application rollups.
+
+The owner dashboard never aggregates the applications table. Every
+application adds one to the "received" bucket of its position and creation
+day, every decision adds one (and its time to decision) to the "accepted" or
+"rejected" bucket of the decision day. Reversing a decision takes the old
+bucket back out, so the rollups stay equal to a full recount.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ApplicationRollup
+
+RECEIVED = ApplicationRollup.RECEIVED
+ACCEPTED = ApplicationRollup.ACCEPTED
+REJECTED = ApplicationRollup.REJECTED
+
+
+def decision_status(status):
+    """decision_status function - UserApplication.status to bucket status"""
+    if status is None:
+        return None
+    return ACCEPTED if status else REJECTED
+
+
+def day_of(moment):
+    return timezone.localdate(moment) if timezone.is_aware(moment) \
+        else moment.date()
+
+
+def decision_seconds(created_at, decided_at):
+    return max(int((decided_at - created_at).total_seconds()), 0)
+
+
+def bump(project_id, position_id, day, status, count=1, seconds=0):
+    """bump function - adds to one bucket, creating it on first use"""
+    # noinspection PyUnresolvedReferences
+    buckets = ApplicationRollup.objects.filter(
+        position_id=position_id, day=day, status=status)
+    changes = {'count': F('count') + count,
+               'decision_seconds': F('decision_seconds') + seconds}
+    if buckets.update(**changes) or count < 0:
+        # nothing to take back from a missing bucket (its position may be
+        # on the way out)
+        return
+    try:
+        with transaction.atomic():
+            # noinspection PyUnresolvedReferences
+            ApplicationRollup.objects.create(
+                project_id=project_id, position_id=position_id, day=day,
+                status=status, count=count, decision_seconds=seconds)
+    except IntegrityError:
+        # a concurrent request created the bucket first
+        buckets.update(**changes)
+
+
+def bump_many(buckets):
+    """bump_many function - dict of
+    (project_id, position_id, day, status) -> (count, seconds)"""
+    for key, (count, seconds) in buckets.items():
+        if count or seconds:
+            bump(*key, count=count, seconds=seconds)
+
+
+def record_received(application, sign=1):
+    """record_received function - a new (or, with sign=-1, a deleted)
+    application"""
+    bump(application.project_id, application.position_id,
+         day_of(application.created_at), RECEIVED, count=sign)
+
+
+def record_decided(application, status, decided_at, sign=1):
+    """record_decided function - adds (or takes back) one decision"""
+    status = decision_status(status)
+    if status and decided_at:
+        seconds = decision_seconds(application.created_at, decided_at)
+        bump(application.project_id, application.position_id,
+             day_of(decided_at), status, count=sign, seconds=sign * seconds)
+
+
+def record_decision(application, previous_status, previous_decided_at):
+    """record_decision function - moves the application's decision from
+    its previous bucket (if any) to the current one"""
+    record_decided(application, previous_status, previous_decided_at, -1)
+    record_decided(application, application.status, application.decided_at)
+
+
+def record_removed(application):
+    """record_removed function - a deleted application leaves its buckets"""
+    record_received(application, -1)
+    record_decided(application, application.status, application.decided_at,
+                   -1)
+
+
+def count_applications(applications, buckets=None):
+    """count_applications function - the buckets of a batch of applications
+    as a dict for bump_many()
+    :param: - buckets - a dict of earlier batches to add to"""
+    buckets = {} if buckets is None else buckets
+    for application in applications:
+        key = (application.project_id, application.position_id)
+        add(buckets, key + (day_of(application.created_at), RECEIVED), 0)
+        status = decision_status(application.status)
+        if status and application.decided_at:
+            add(buckets, key + (day_of(application.decided_at), status),
+                decision_seconds(application.created_at,
+                                 application.decided_at))
+    return buckets
+
+
+def add(buckets, key, seconds):
+    count, total = buckets.get(key, (0, 0))
+    buckets[key] = (count + 1, total + seconds)
@@ -0,0 +1,71 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from notify.models import Notification
+
+from .models import MyProject, Skill, User, UserApplication
+from .notifications import bump_version
+from .rollups import record_received, record_removed
+# noinspection PyUnresolvedReferences
+from projects.facets import facets
+# noinspection PyUnresolvedReferences
+from projects.fuzzy import names
+# noinspection PyUnresolvedReferences
+from projects.models import Project
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def notification_changed(sender, instance, **kwargs):
+    bump_version(instance.recipient_id)
+
+
+@receiver(post_save, sender=Skill)
+@receiver(post_delete, sender=Skill)
+@receiver(post_save, sender=MyProject)
+@receiver(post_delete, sender=MyProject)
+def profile_changed(sender, instance, **kwargs):
+    """profile_changed receiver - skills and own projects are part of the
+    profile page, skill names also show up on project pages"""
+    now = timezone.now()
+    # noinspection PyUnresolvedReferences
+    User.objects.filter(pk=instance.user_id).update(updated_at=now)
+    if sender is Skill:
+        # noinspection PyUnresolvedReferences
+        Project.objects.filter(positions__skill=instance.pk).update(
+            updated_at=now)
+        if not kwargs.get('created'):
+            # a renamed or deleted skill may be used by any position
+            transaction.on_commit(facets.invalidate)
+
+
+@receiver(post_save, sender=UserApplication)
+@receiver(post_delete, sender=UserApplication)
+def application_changed(sender, instance, **kwargs):
+    """application_changed receiver - applications decide which positions
+    are open and which ones the viewer applied for"""
+    # noinspection PyUnresolvedReferences
+    Project.objects.filter(pk=instance.project_id).update(
+        updated_at=timezone.now())
+
+
+@receiver(post_save, sender=UserApplication)
+def application_saved(sender, instance, created, **kwargs):
+    """application_saved receiver - decisions go through
+    DecisionView.application_update, which records them itself"""
+    if created:
+        record_received(instance)
+
+
+@receiver(post_delete, sender=UserApplication)
+def application_deleted(sender, instance, **kwargs):
+    record_removed(instance)
+
+
+@receiver(post_save, sender=Skill)
+def names_skill_saved(sender, instance, **kwargs):
+    normalised, name = instance.normalized_name, instance.name
+    transaction.on_commit(lambda: names.changed(
+        lambda: names.add(normalised, name)))
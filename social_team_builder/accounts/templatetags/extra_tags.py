@@ -1,6 +1,5 @@
 from django import template
 from django.utils.safestring import mark_safe
-import markdown2
 
 
 register = template.Library()
@@ -8,5 +7,8 @@ register = template.Library()
 
 @register.filter('mark_down')
 def mark_down(text):
+    # imported on first use, the template engine loads every tag library
+    # when it starts
+    import markdown2
     html_body = markdown2.markdown(text)
     return mark_safe(html_body)
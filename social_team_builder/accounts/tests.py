@@ -1,3 +1,445 @@
-from django.test import TestCase
+import io
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core import mail
+from django.core.mail import get_connection
+from django.core.files.uploadhandler import SkipFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import (RequestFactory, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from notify.signals import notify
+
+from . import rollups
+from .digest import DigestRunner
+from .models import (ApplicationArchive, ApplicationRollup, Skill, User,
+                     UserApplication)
+from .uploads import LimitedUploadHandler, rejected_uploads
+from .views import DecisionView
+# noinspection PyUnresolvedReferences
+from projects.matching import match_scores
+# noinspection PyUnresolvedReferences
+from projects.models import Position, Project
+
+
+def make_user(name):
+    user = User.objects.create_user(email='{}@example.com'.format(name),
+                                    username=name, password='pw')
+    user.is_active = True
+    user.save()
+    return user
+
+
+class DecisionMixin:
+    """Decision mixin - a project owner, a position and two applicants"""
+    def make_applications(self):
+        self.owner = make_user('owner')
+        self.anna = make_user('anna')
+        self.bob = make_user('bob')
+        # noinspection PyUnresolvedReferences
+        self.project = Project.objects.create(
+            user=self.owner, title='Project', time_estimate='1',
+            description='-', requirements='-')
+        # noinspection PyUnresolvedReferences
+        self.position = Position.objects.create(
+            project=self.project, name='Developer', time='1')
+        # noinspection PyUnresolvedReferences
+        self.application = UserApplication.objects.create(
+            applicant=self.anna, project=self.project, position=self.position)
+        # noinspection PyUnresolvedReferences
+        self.other = UserApplication.objects.create(
+            applicant=self.bob, project=self.project, position=self.position)
+
+    def decision_url(self, applicant, decision):
+        return reverse('accounts:decision_update',
+                       args=[applicant.pk, self.position.pk, decision])
+
+
+# the conflict page renders without collectstatic; the notifications are
+# sent on commit, which TestCase never reaches (DecisionNotificationTests)
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.'
+                                       'StaticFilesStorage')
+@mock.patch('accounts.views.notify.send')
+class DecisionTests(DecisionMixin, TestCase):
+    def setUp(self):
+        self.make_applications()
+        self.client.force_login(self.owner)
+
+    def decide(self, applicant, decision):
+        return self.client.get(self.decision_url(applicant, decision))
+
+    def assert_state(self, application, status, version):
+        application.refresh_from_db()
+        self.assertIs(application.status, status)
+        self.assertEqual(application.version, version)
+
+    def test_accept_new(self, send):
+        response = self.decide(self.anna, 'accept')
+        self.assertRedirects(response, reverse('accounts:application'),
+                             fetch_redirect_response=False)
+        self.assert_state(self.application, True, 1)
+        self.position.refresh_from_db()
+        self.assertEqual(self.position.filled_by, self.anna)
+
+    def test_reversals(self, send):
+        self.decide(self.anna, 'accept')
+        self.decide(self.anna, 'reject')
+        self.assert_state(self.application, False, 2)
+        self.position.refresh_from_db()
+        self.assertFalse(self.position.is_filled)
+        self.decide(self.anna, 'accept')
+        self.assert_state(self.application, True, 3)
+
+    def test_same_decision_twice_conflicts(self, send):
+        self.decide(self.anna, 'accept')
+        response = self.decide(self.anna, 'accept')
+        self.assertEqual(response.status_code, 409)
+        self.assertContains(response, 'accepted already', status_code=409)
+        self.assert_state(self.application, True, 1)
+
+    def test_stale_version_loses(self, send):
+        decide = DecisionView.decide
+
+        def racing(application, arg):
+            # another request rejects between the read and the UPDATE
+            UserApplication.objects.filter(pk=application.pk).update(
+                status=False, version=F('version') + 1)
+            return decide(application, arg)
+
+        with mock.patch.object(DecisionView, 'decide',
+                               staticmethod(racing)):
+            response = self.decide(self.anna, 'accept')
+        self.assertContains(response, 'rejected already', status_code=409)
+        self.assert_state(self.application, False, 1)
+        # the position taken for the lost decision is given back
+        self.position.refresh_from_db()
+        self.assertFalse(self.position.is_filled)
+
+    def test_filled_position_refuses_second_applicant(self, send):
+        self.decide(self.anna, 'accept')
+        response = self.decide(self.bob, 'accept')
+        self.assertContains(response, 'filled by another applicant',
+                            status_code=409)
+        self.assert_state(self.other, None, 0)
+        self.position.refresh_from_db()
+        self.assertEqual(self.position.filled_by, self.anna)
+
+    def test_transition_table(self, send):
+        application = self.application
+        self.assertFalse(UserApplication.objects.transition(application,
+                                                            None))
+        self.assertTrue(UserApplication.objects.transition(application,
+                                                           False))
+        self.assertFalse(UserApplication.objects.transition(application,
+                                                            False))
+        self.assertTrue(UserApplication.objects.transition(application,
+                                                           True))
+        self.assert_state(application, True, 2)
+
+    def test_only_owner_decides(self, send):
+        self.client.force_login(make_user('eve'))
+        self.assertEqual(self.decide(self.anna, 'accept').status_code, 404)
+        self.assert_state(self.application, None, 0)
+
+
+class DecisionNotificationTests(DecisionMixin, TransactionTestCase):
+    def setUp(self):
+        self.make_applications()
+
+    @mock.patch('accounts.views.notify.send')
+    def test_notified_on_commit(self, send):
+        with transaction.atomic():
+            self.assertIsNone(DecisionView.decide(self.application, True))
+            send.assert_not_called()
+        send.assert_called_once()
+        self.assertEqual(send.call_args[1]['recipient'], self.anna)
+
+    @mock.patch('accounts.views.notify.send')
+    def test_not_notified_on_rollback(self, send):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                DecisionView.decide(self.application, True)
+                raise RuntimeError
+        send.assert_not_called()
+
+
+class AvatarSizeTests(TestCase):
+    def test_missing_avatar_file_loads(self):
+        user = make_user('anna')
+        User.objects.filter(pk=user.pk).update(
+            avatar='user_avatar/missing.jpg', avatar_width=None,
+            avatar_height=None)
+        user = User.objects.get(pk=user.pk)
+        self.assertEqual(user.avatar.name, 'user_avatar/missing.jpg')
+        self.assertIsNone(user.avatar_width)
+
+
+class UploadLimitTests(TestCase):
+    def receive(self, field_name):
+        request = RequestFactory().post('/')
+        handler = LimitedUploadHandler(request)
+        handler.new_file(field_name, 'upload', 'application/octet-stream',
+                         None)
+        chunk = b'x' * 1024
+        try:
+            handler.receive_data_chunk(chunk, settings.AVATAR_MAX_BYTES)
+        finally:
+            handler.file.close()
+        return request
+
+    def test_avatar_past_limit_skipped(self):
+        with self.assertRaises(SkipFile):
+            self.receive('avatar')
+
+    def test_other_uploads_unlimited(self):
+        request = self.receive('file')
+        self.assertEqual(rejected_uploads(request), set())
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.'
+                                       'StaticFilesStorage')
+class ProfileValidatorTests(DecisionMixin, TestCase):
+    def test_application_changes_the_etag(self):
+        self.make_applications()
+        url = reverse('accounts:profile', args=[self.owner.pk])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(
+            url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # noinspection PyUnresolvedReferences
+        Project.objects.filter(pk=self.project.pk).update(
+            updated_at=self.project.updated_at + timedelta(seconds=1))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class NotificationVersionTests(TestCase):
+    def test_mark_all_read_bumps_the_version(self):
+        user = make_user('anna')
+        notify.send(user, recipient=user, actor=user, verb='hello')
+        self.client.force_login(user)
+        url = reverse('accounts:notifications_poll')
+        data = self.client.get(url).json()
+        self.assertEqual(data['unread'], 1)
+        self.client.post(reverse('notifications:mark_all'),
+                         {'action': 'read'},
+                         HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        data = self.client.get(url, {'version': data['version']}).json()
+        self.assertTrue(data['changed'])
+        self.assertEqual(data['unread'], 0)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.'
+                                       'StaticFilesStorage')
+class MatchScoreTests(TestCase):
+    def setUp(self):
+        self.owner = make_user('owner')
+        # noinspection PyUnresolvedReferences
+        self.project = Project.objects.create(
+            user=self.owner, title='Project', time_estimate='1',
+            description='-', requirements='-')
+        # noinspection PyUnresolvedReferences
+        self.position = Position.objects.create(
+            project=self.project, name='Developer', time='1')
+        # noinspection PyUnresolvedReferences
+        self.position.skill.add(
+            Skill.objects.create(user=self.owner, name='Python'),
+            Skill.objects.create(user=self.owner, name='Django'))
+        # noinspection PyUnresolvedReferences
+        self.open = Position.objects.create(
+            project=self.project, name='Anyone', time='1')
+        self.client.force_login(self.owner)
+
+    def apply(self, name, skills, position=None):
+        applicant = make_user(name)
+        for skill in skills:
+            # noinspection PyUnresolvedReferences
+            Skill.objects.create(user=applicant, name=skill)
+        # noinspection PyUnresolvedReferences
+        return UserApplication.objects.create(
+            applicant=applicant, project=self.project,
+            position=position or self.position)
+
+    def apply_many(self, count, start=0):
+        for number in range(start, start + count):
+            self.apply('applicant{}'.format(number),
+                       ['Python', 'CSS'][:number % 3])
+
+    def count(self):
+        # noinspection PyUnresolvedReferences
+        return UserApplication.objects.count()
+
+    def listed(self, **params):
+        response = self.client.get(reverse('accounts:application'), params)
+        self.assertEqual(response.status_code, 200)
+        return [(application.applicant.username, application.match_score)
+                for application in response.context['applications']]
+
+    def test_two_queries_whatever_the_count(self):
+        for total in (3, 12):
+            self.apply_many(total - self.count(), start=self.count())
+            # noinspection PyUnresolvedReferences
+            applications = list(UserApplication.objects.all())
+            self.assertEqual(len(applications), total)
+            with self.assertNumQueries(2):
+                match_scores(applications)
+
+    def test_page_queries_do_not_grow(self):
+        self.apply_many(2)
+        with CaptureQueriesContext(connection) as few:
+            self.listed()
+        self.apply_many(10, start=2)
+        with CaptureQueriesContext(connection) as many:
+            self.listed()
+        self.assertEqual(len(many), len(few))
+
+    def test_scores(self):
+        self.apply('anna', ['python', 'Django', 'CSS'])
+        self.apply('bob', ['Python'])
+        self.apply('carl', [])
+        self.apply('dora', ['Python'], position=self.open)
+        self.assertEqual(sorted(self.listed()), [
+            ('anna', 100), ('bob', 50), ('carl', 0), ('dora', None)])
+
+    def test_match_filter(self):
+        self.apply('anna', ['Python', 'Django'])
+        self.apply('bob', ['Python'])
+        self.apply('carl', [])
+        self.apply('dora', ['Python'], position=self.open)
+        self.assertEqual(sorted(self.listed(match_filter='50')),
+                         [('anna', 100), ('bob', 50)])
+        self.assertEqual(self.listed(match_filter='100'), [('anna', 100)])
+
+    def test_sort_by_match(self):
+        self.apply('dora', ['Python'], position=self.open)
+        self.apply('carl', [])
+        self.apply('anna', ['Python', 'Django'])
+        self.apply('bob', ['Python'])
+        self.assertEqual(self.listed(sort='match'), [
+            ('anna', 100), ('bob', 50), ('carl', 0), ('dora', None)])
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class DigestTests(TestCase):
+    def setUp(self):
+        self.owner = self.subscriber('owner', ['Python'])
+        # an old project, edited since, is not new
+        self.old = self.project('Old project', 'Python')
+        # noinspection PyUnresolvedReferences
+        Project.objects.filter(pk=self.old.pk).update(created_at=None)
+        self.new = self.project('New project', 'Python')
+        self.readers = [self.subscriber('reader{}'.format(number),
+                                        ['python'])
+                        for number in range(5)]
+        self.subscriber('designer', ['CSS'])
+        self.subscriber('weekly', ['Python'], digest='weekly')
+
+    def subscriber(self, name, skills, digest='daily'):
+        user = make_user(name)
+        user.digest = digest
+        user.save()
+        for skill in skills:
+            Skill.objects.create(user=user, name=skill)
+        return user
+
+    def project(self, title, skill):
+        # noinspection PyUnresolvedReferences
+        project = Project.objects.create(
+            user=self.owner, title=title, time_estimate='1',
+            description='-', requirements='-')
+        # noinspection PyUnresolvedReferences
+        position = Position.objects.create(project=project,
+                                           name='Developer', time='1')
+        position.skill.add(Skill.objects.create(user=self.owner, name=skill))
+        return project
+
+    def send(self, max_batches=None):
+        with mock.patch('accounts.digest.get_connection',
+                        side_effect=get_connection) as connections:
+            run = DigestRunner('daily', batch_size=2).run(max_batches)
+        return run, connections.call_count
+
+    def test_one_message_per_matching_user(self):
+        run, connections = self.send()
+        self.assertIsNotNone(run.finished_at)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         sorted(user.email for user in self.readers))
+        for message in mail.outbox:
+            self.assertIn('New project', message.body)
+            self.assertNotIn('Old project', message.body)
+        # owner, five readers and the designer, two a batch
+        self.assertEqual((run.users, run.emails, run.batches),
+                         (7, 5, 4))
+        self.assertEqual(connections, 3)
+
+    def test_resumes_after_max_batches(self):
+        run, _ = self.send(max_batches=2)
+        self.assertIsNone(run.finished_at)
+        self.assertEqual(run.last_user_id, self.readers[2].pk)
+        self.assertEqual(len(mail.outbox), 3)
+        run, _ = self.send()
+        self.assertIsNotNone(run.finished_at)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(len({message.to[0] for message in mail.outbox}), 5)
+        self.assertEqual((run.users, run.emails, run.batches), (7, 5, 4))
+
+    def test_next_run_has_only_the_newer_projects(self):
+        self.send()
+        self.project('Newer project', 'CSS')
+        mail.outbox = []
+        run, _ = self.send()
+        self.assertEqual(run.projects, 1)
+        self.assertEqual([message.to[0] for message in mail.outbox],
+                         ['designer@example.com'])
+
+
+class BackfillRollupsTests(DecisionMixin, TestCase):
+    def setUp(self):
+        self.make_applications()
+        # accepted two days after it came in
+        decided_at = self.application.created_at + timedelta(days=2)
+        UserApplication.objects.filter(pk=self.application.pk).update(
+            status=True, decided_at=decided_at)
+        self.application.refresh_from_db()
+        rollups.record_decision(self.application, None, None)
+        # archived by the retention command, still in the rollups
+        # noinspection PyUnresolvedReferences
+        ApplicationArchive.objects.create(
+            application_id=self.other.pk + 1, applicant_id=self.bob.pk,
+            project_id=self.project.pk, position_id=self.position.pk,
+            project_title='Project', position_name='Developer',
+            status=False, created_at=self.application.created_at,
+            decided_at=decided_at)
+        rollups.bump(self.project.pk, self.position.pk,
+                     rollups.day_of(self.application.created_at),
+                     rollups.RECEIVED)
+        rollups.bump(self.project.pk, self.position.pk,
+                     rollups.day_of(decided_at), rollups.REJECTED,
+                     seconds=2 * 24 * 3600)
+
+    @staticmethod
+    def buckets():
+        # noinspection PyUnresolvedReferences
+        return sorted(ApplicationRollup.objects.values_list(
+            'position_id', 'day', 'status', 'count', 'decision_seconds'))
+
+    def backfill(self):
+        call_command('backfill_rollups', chunk_size=1, stdout=io.StringIO())
+
+    def test_rebuild_matches_the_live_rollups(self):
+        live = self.buckets()
+        self.assertEqual(len(live), 3)
+        # noinspection PyUnresolvedReferences
+        ApplicationRollup.objects.filter(
+            status=rollups.RECEIVED).update(count=10)
+        self.backfill()
+        self.assertEqual(self.buckets(), live)
+        self.backfill()
+        self.assertEqual(self.buckets(), live)
@@ -0,0 +1,33 @@
+"""Upload handling - every upload is streamed to a temporary file. An avatar
+past AVATAR_MAX_BYTES is skipped as soon as it gets there instead of being
+written out in full, the other uploads (the admin project import) have no
+limit here. The views tell the user from rejected_uploads()."""
+from django.conf import settings
+from django.core.files.uploadhandler import (SkipFile,
+                                             TemporaryFileUploadHandler)
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """Limited upload handler
+    :inherit: - TemporaryFileUploadHandler
+    :methods: - receive_data_chunk()
+    """
+    limited_fields = ('avatar',)
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.field_name in self.limited_fields and \
+                start + len(raw_data) > settings.AVATAR_MAX_BYTES:
+            self.file.close()
+            if not hasattr(self.request, 'rejected_uploads'):
+                self.request.rejected_uploads = set()
+            self.request.rejected_uploads.add(self.field_name)
+            raise SkipFile()
+        return super().receive_data_chunk(raw_data, start)
+
+
+def rejected_uploads(request):
+    """rejected_uploads function - names of the file fields skipped for
+    their size"""
+    # parses the body, if nothing did yet
+    request.FILES
+    return getattr(request, 'rejected_uploads', set())
@@ -14,15 +14,22 @@ urlpatterns = [
         name='profile_edit'),
     url(r'profile/avatar/$', views.AvatarView.as_view(),
         name='avatar_edit'),
+    url(r'avatar/(?P<pk>\d+)/(?P<key>[0-9a-f]+-[0-9a-f]+)/$',
+        views.AvatarFileView.as_view(), name='avatar_file'),
     url(r'profile/avatar/crop/$', views.CropView.as_view(), name='crop_avatar'),
     url(r'profile/avatar/edit/(?P<action>\w+)/$', views.AvatarEditView.as_view(),
         name='edit_avatar'),
     url(r'applications/$', views.ApplicationView.as_view(),
         name='application'),
+    url(r'applications/export/$', views.ApplicationExportView.as_view(),
+        name='application_export'),
     url(r'applications/(?P<user_pk>\d+)/(?P<pos_pk>\d+)/(?P<decision>\w+)/$',
         views.DecisionView.as_view(), name='decision_update'),
+    url(r'dashboard/$', views.DashboardView.as_view(), name='dashboard'),
     url(r'notifications/$', views.NotificationsView.as_view(),
         name='own_notifications'),
+    url(r'notifications/poll/$', views.NotificationPollView.as_view(),
+        name='notifications_poll'),
     url(r'validate/(?P<uid>[0-9A-Za-z_\-]+)/'
         r'(?P<token>[0-9A-Za-z]{1,13}-[0-9A-Za-z]{1,20})/$',
         views.ValidateView.as_view(), name='validate'),
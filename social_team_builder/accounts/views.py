@@ -1,6 +1,11 @@
 # NOTE: # noinspection - prefixed comments are for pycharm editor only
 # for ignoring PEP 8 style highlights
+import csv
+import json
+import time
+from datetime import timedelta
 
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import get_user_model, login, logout
 from django.contrib.auth.forms import AuthenticationForm
@@ -9,23 +14,38 @@ from django.contrib.auth.tokens import default_token_generator
 from django.contrib.sites.shortcuts import get_current_site
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.mail import EmailMessage
+from django.db import transaction
+from django.db.models import Max, Sum
 # from django.core.urlresolvers import reverse, reverse_lazy
 from django.urls import reverse, reverse_lazy
-from django.http import HttpResponseRedirect
+from django.http import (Http404, HttpResponseRedirect, JsonResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404
 from django.template.loader import render_to_string
+from django.utils import timezone
 from django.views.generic import (CreateView, FormView, RedirectView,
-                                  TemplateView, UpdateView, ListView)
+                                  TemplateView, UpdateView, ListView, View)
 
 from braces.views import PrefetchRelatedMixin as PrM
 from notify.signals import notify
-from PIL import Image
 
+from . import avatars
 from . import forms
 from . import models
+from . import notifications
+from . import rollups
+from .mixins import ApplicationFilterMixin as AfM
+from .mixins import ConditionalGetMixin as CgM
 from .mixins import PageTitleMixin as PtM
+from .uploads import rejected_uploads
+# noinspection PyUnresolvedReferences
+from projects.matching import match_scores
 # noinspection PyUnresolvedReferences
 from projects.models import Position, Project
+# noinspection PyUnresolvedReferences
+from projects.signals import refresh_facets
+# noinspection PyUnresolvedReferences
+from social_team_builder.metrics import timed
 
 
 class ValidateView(RedirectView):
@@ -132,25 +152,42 @@ class SignUpView(CreateView):
                 'token': default_token_generator.make_token(user), })
             email = EmailMessage('Activate your account.',
                                  message, to=[email_to])
-            email.send()
+            with timed('activation_email'):
+                email.send()
             messages.info(self.request, "Check email for user activation!")
             return HttpResponseRedirect(self.success_url)
 
 
-class UserProfileView(PrM, TemplateView):
+class UserProfileView(CgM, PrM, TemplateView):
     """User profile view
     :url:
     ^accounts/profile/(?P<pk>\d+)/$
 
-    :inherit: - PrM (PrefetchRelatedMixin)
+    :inherit: - CgM (ConditionalGetMixin)
+              - PrM (PrefetchRelatedMixin)
               - generic.TemplateView
-    :methods: - get()
+    :methods: - get_validators()
+              - get()
               - get_context_data()
     """
     template_name = "accounts/profile.html"
     context_object_name = "profile"
     prefetch_related = ['profile_skills', 'my_projects', 'projects', 'positions']
 
+    def get_validators(self):
+        # the past projects show position and applicant counts, their
+        # changes bump the project only
+        # noinspection PyUnresolvedReferences
+        row = models.User.objects.filter(
+            pk=self.kwargs.get('pk')).annotate(
+            projects_updated_at=Max('projects__updated_at')).values_list(
+            'updated_at', 'projects_updated_at').first()
+        if row is None:
+            return None
+        updated_at = max(moment for moment in row if moment is not None)
+        return [moment.isoformat() if moment else '' for moment in row], \
+            updated_at
+
     def get(self, request, **kwargs):
         pk = kwargs.get('pk')
         profile = get_object_or_404(models.User, pk=pk)
@@ -161,7 +198,7 @@ class UserProfileView(PrM, TemplateView):
         context = super().get_context_data(**kwargs)
         context['skills'] = context['profile'].profile_skills.all()
         context['my_projects'] = context['profile'].my_projects.all()
-        context['past_projects'] = context['profile'].projects.all()
+        context['past_projects'] = context['profile'].projects.with_counts()
         # import pdb; pdb.set_trace()
         return context
 
@@ -207,6 +244,10 @@ class UserProfileEditView(LrM, PtM, UpdateView):
 
     def post(self, request, *args, **kwargs):
         user = self.get_object()
+        if rejected_uploads(request):
+            messages.error(request, 'The avatar can be at most {} MB.'.format(
+                settings.AVATAR_MAX_BYTES // (1024 * 1024)))
+            return HttpResponseRedirect(reverse('accounts:profile_edit'))
         form = forms.UserProfileForm(
             request.POST, request.FILES, instance=user)
         # noinspection PyUnresolvedReferences
@@ -256,71 +297,236 @@ class UserProfileEditView(LrM, PtM, UpdateView):
             return HttpResponseRedirect(reverse_lazy("accounts:profile",
                                                      kwargs={'pk': request.user.id}))
 
-        return HttpResponseRedirect(reverse('accounts:profile_edit',
-                                            {'skill_formset': skill_formset,
-                                             'project_formset': project_formset}))
+        for error in form.errors.get('avatar', ()):
+            messages.error(request, error)
+        return HttpResponseRedirect(reverse('accounts:profile_edit'))
 
 
-class ApplicationView(LrM, PrM, ListView):
+class ApplicationView(LrM, AfM, PrM, ListView):
     """Application view
     :url:
     ^accounts/applications/$
 
     :inherit: - LrM (mixins.LoginRequiredMixin)
+              - AfM (ApplicationFilterMixin)
               - PrM (PrefetchRelatedMixin)
               - generic.ListView
-    :methods: - choice() - staticmethod
-              - get_context_data()
+    :methods: - get_context_data()
               - get_queryset()
+              - match_applications()
     """
     template_name = "accounts/applications.html"
     model = models.UserApplication
     context_object_name = 'applications'
     prefetch_related = ['applicant__projects', ]
-
-    @staticmethod
-    def choice(arg):
-        if arg == "New application":
-            arg = None
-        if arg == "Accepted":
-            arg = True
-        if arg == "Rejected":
-            arg = False
-        return arg
+    match_choices = [50, 100]
 
     def get_context_data(self, **kwargs):
         context = super(ApplicationView, self).get_context_data(**kwargs)
-        context['applications'] = context['applications'].filter(
-            project__user=self.request.user)
+        context['applications'] = self.match_applications(
+            context['applications'])
         # import pdb; pdb.set_trace()
 
         context['app_list'] = ['New application', 'Accepted', 'Rejected']
         # noinspection PyUnresolvedReferences
-        context['projects'] = self.request.user.projects.all()
+        context['projects'] = self.request.user.projects.with_counts()
         # noinspection PyUnresolvedReferences
         context['skills_list'] = Position.objects.filter(
-            project__in=context['projects']).values('name').distinct()
+            project__user=self.request.user,
+            project__is_deleted=False).values('name').distinct()
+        context['match_list'] = self.match_choices
 
         context['pro_selected'] = self.request.GET.get('pro_filter')
         context['skill_selected'] = self.request.GET.get('skill_filter')
         context['app_selected'] = self.request.GET.get('app_filter')
+        context['match_selected'] = self.request.GET.get('match_filter')
+        context['sort_selected'] = self.request.GET.get('sort')
         return context
 
     def get_queryset(self):
-        queryset = super().get_queryset()
-        app_term = self.request.GET.get('app_filter')
-        pro_term = self.request.GET.get('pro_filter')
-        skill_term = self.request.GET.get('skill_filter')
-        if app_term:
-            queryset = queryset.filter(status=self.choice(app_term))
+        queryset = super().get_queryset().filter(
+            project__user=self.request.user).select_related(
+            'applicant', 'project', 'position')
+        return self.filter_applications(queryset)
+
+    def match_applications(self, applications):
+        """match_applications method - match scores for the listed
+        applications, then the match_filter (minimum score) and the
+        sort=match order, best matches first"""
+        applications = match_scores(list(applications))
+        minimum = self.request.GET.get('match_filter', '')
+        if minimum.isdigit():
+            applications = [application for application in applications
+                            if (application.match_score or 0) >=
+                            int(minimum)]
+        if self.request.GET.get('sort') == 'match':
+            applications.sort(key=lambda application: (
+                application.match_score is None,
+                -(application.match_score or 0)))
+        return applications
+
+
+class Echo:
+    """Pseudo buffer for csv.writer - returns the written row
+    instead of storing it, so rows can be streamed one by one"""
+    @staticmethod
+    def write(value):
+        return value
+
+
+class ApplicationExportView(LrM, AfM, View):
+    """Application export view - streams the owner's applications as csv
+    :url:
+    ^accounts/applications/export/$
+
+    :inherit: - LrM (LoginRequiredMixin)
+              - AfM (ApplicationFilterMixin)
+              - generic.View
+    :methods: - get_queryset()
+              - iter_chunks()
+              - iter_rows()
+              - get()
+    """
+    chunk_size = 500
+    filename = 'applications.csv'
+    header = ['Applicant', 'Email', 'Skills', 'Project', 'Position', 'Status']
+
+    def get_queryset(self):
+        # noinspection PyUnresolvedReferences
+        queryset = models.UserApplication.objects.filter(
+            project__user=self.request.user)
+        return self.filter_applications(queryset).select_related(
+            'applicant', 'project', 'position').prefetch_related(
+            'applicant__profile_skills').order_by('pk')
+
+    def iter_chunks(self, queryset):
+        """iter_chunks method - keyset pagination on pk, every chunk is a
+        bounded query with its own skills prefetch, so memory stays flat
+        :param: - queryset"""
+        last_pk = 0
+        while True:
+            chunk = list(queryset.filter(pk__gt=last_pk)[:self.chunk_size])
+            if not chunk:
+                return
+            yield chunk
+            last_pk = chunk[-1].pk
+
+    def iter_rows(self):
+        """iter_rows method - header goes out before the first query runs"""
+        writer = csv.writer(Echo())
+        yield writer.writerow(self.header)
+        for chunk in self.iter_chunks(self.get_queryset()):
+            yield ''.join(writer.writerow([
+                application.applicant.full_name,
+                application.applicant.email,
+                ' | '.join(skill.name for skill in
+                           application.applicant.profile_skills.all()),
+                application.project.title,
+                application.position.name,
+                self.status_label(application.status),
+            ]) for application in chunk)
+
+    def get(self, request, *args, **kwargs):
+        response = StreamingHttpResponse(self.iter_rows(),
+                                         content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="{}"'.format(
+            self.filename)
+        return response
+
+
+class DashboardView(LrM, TemplateView):
+    """Dashboard view - application analytics for the owner's projects,
+    read from the daily rollups only
+    :url:
+    ^accounts/dashboard/$
+
+    :inherit: - LrM (LoginRequiredMixin)
+              - generic.TemplateView
+    :methods: - get_window()
+              - get_rollups()
+              - position_rows()
+              - daily_rows()
+              - get_context_data()
+    """
+    template_name = 'accounts/dashboard.html'
+    windows = (7, 30, 90, 365)
+    default_window = 30
+
+    def get_window(self):
+        try:
+            days = int(self.request.GET.get('days', self.default_window))
+        except ValueError:
+            days = self.default_window
+        return days if days in self.windows else self.default_window
+
+    def get_rollups(self, start):
+        # noinspection PyUnresolvedReferences
+        rollups = models.ApplicationRollup.objects.filter(
+            project__user=self.request.user, project__is_deleted=False,
+            day__gte=start)
+        project = self.request.GET.get('project')
+        if project and project.isdigit():
+            rollups = rollups.filter(project_id=project)
+        return rollups
 
-        if pro_term:
-            queryset = queryset.filter(project__title=pro_term)
+    @staticmethod
+    def position_rows(rollups):
+        rows = {}
+        for bucket in rollups.values(
+                'project_id', 'project__title', 'position_id',
+                'position__name', 'status').annotate(
+                total=Sum('count'), seconds=Sum('decision_seconds')):
+            row = rows.setdefault(bucket['position_id'], {
+                'project': bucket['project__title'],
+                'position': bucket['position__name'],
+                'received': 0, 'accepted': 0, 'rejected': 0, 'seconds': 0})
+            row[bucket['status']] += bucket['total']
+            row['seconds'] += bucket['seconds']
+        for row in rows.values():
+            decided = row['accepted'] + row['rejected']
+            row['decided'] = decided
+            row['acceptance'] = round(
+                100.0 * row['accepted'] / decided) if decided else None
+            row['decision_hours'] = round(
+                row.pop('seconds') / 3600.0 / decided, 1) if decided else None
+        return sorted(rows.values(),
+                      key=lambda row: (row['project'], row['position']))
 
-        if skill_term:
-            queryset = queryset.filter(position__name=skill_term)
+    @staticmethod
+    def daily_rows(rollups, start, end):
+        days = {}
+        for bucket in rollups.values('day', 'status').annotate(
+                total=Sum('count')):
+            days.setdefault(bucket['day'], {})[bucket['status']] = \
+                bucket['total']
+        rows = []
+        day = end
+        while day >= start:
+            counts = days.get(day, {})
+            rows.append({'day': day,
+                         'received': counts.get('received', 0),
+                         'accepted': counts.get('accepted', 0),
+                         'rejected': counts.get('rejected', 0)})
+            day -= timedelta(days=1)
+        return rows
 
-        return queryset
+    def get_context_data(self, **kwargs):
+        context = super(DashboardView, self).get_context_data(**kwargs)
+        days = self.get_window()
+        end = timezone.localdate()
+        start = end - timedelta(days=days - 1)
+        rollups = self.get_rollups(start)
+        positions = self.position_rows(rollups)
+        context['positions'] = positions
+        context['daily'] = self.daily_rows(rollups, start, end)
+        context['totals'] = {
+            status: sum(row[status] for row in positions)
+            for status in ('received', 'accepted', 'rejected')}
+        context['windows'] = self.windows
+        context['days'] = days
+        context['projects'] = self.request.user.projects.values('pk', 'title')
+        context['project_selected'] = self.request.GET.get('project', '')
+        return context
 
 
 class DecisionView(LrM, TemplateView):
@@ -331,34 +537,83 @@ class DecisionView(LrM, TemplateView):
     :inherit: - LrM (LoginRequiredMixin)
               - generic.TemplateView
     :methods: - application_update() - staticmethod
-              - get()
+              - decide() - classmethod
+              - get() - 409 when the decision lost
     """
+    template_name = 'accounts/decision_conflict.html'
+
     @staticmethod
-    def application_update(user, position, arg):
-        # noinspection PyUnresolvedReferences
-        models.UserApplication.objects.filter(
-            applicant=user, position=position
-        ).update(status=arg)
+    def application_update(application, arg):
+        """application_update method - the application status and the
+        position's filled state change in one transaction. The position is
+        taken and the application moved with conditional UPDATEs, a lost
+        one rolls the transaction back
+        :return: - None, or why the decision lost"""
+        applicant = application.applicant
+        status, decided_at = application.status, application.decided_at
+        with transaction.atomic():
+            positions = Position.objects.filter(pk=application.position_id)
+            # one accepted applicant per position
+            if arg and not positions.fill(applicant) and \
+                    not positions.filter(filled_by=applicant).exists():
+                return '{} is filled by another applicant.'.format(
+                    application.position.name)
+            # noinspection PyUnresolvedReferences
+            won = models.UserApplication.objects.transition(application, arg)
+            if not won:
+                transaction.set_rollback(True)
+            else:
+                if not arg:
+                    positions.release(applicant)
+                rollups.record_decision(application, status, decided_at)
+                # update() skips the signals, the project page shows filled
+                # positions
+                # noinspection PyUnresolvedReferences
+                Project.objects.filter(pk=application.project_id).update(
+                    updated_at=timezone.now())
+                refresh_facets(application.project_id)
+        if won:
+            return None
+        application.refresh_from_db(fields=['status', 'decided_at', 'version'])
+        return 'The application of {} for {} was {} already.'.format(
+            applicant, application.position.name,
+            'accepted' if application.status else 'rejected')
+
+    @classmethod
+    def decide(cls, application, arg):
+        """decide method - updates the application and, once committed,
+        notifies the applicant
+        :return: - None, or why the decision lost"""
+        conflict = cls.application_update(application, arg)
+        if conflict is None:
+            user = application.applicant
+            message = "accepted" if arg else "rejected"
+            verb = 'Your application for {} it was {}'.format(
+                application.position.name, message)
+            transaction.on_commit(lambda: notify.send(
+                user, recipient=user, actor=user, verb=verb,
+                decription=""))
+        return conflict
 
     def get(self, request, *args, **kwargs):
-        user_pk = self.kwargs.get('user_pk')
-        position_pk = self.kwargs.get('pos_pk')
         decision = self.kwargs.get('decision')
-        user = models.User.objects.get(pk=user_pk)
-        position = Position.objects.filter(pk=position_pk).first()
-        message = ''
-        if user and position:
-            if decision == "accept":
-                self.application_update(user, position, True)
-                message = "accepted"
-            if decision == "reject":
-                self.application_update(user, position, False)
-                message = "rejected"
-
-            notify.send(user, recipient=user, actor=user,
-                        verb='Your application for {} it was {}'.format(position.name, message),
-                        decription="")
-            return HttpResponseRedirect(reverse("accounts:application"))
+        if decision not in ("accept", "reject"):
+            raise Http404('Unknown decision')
+        # noinspection PyUnresolvedReferences
+        application = models.UserApplication.objects.select_related(
+            'applicant', 'position', 'project').filter(
+            applicant_id=self.kwargs.get('user_pk'),
+            position_id=self.kwargs.get('pos_pk')).order_by('-pk').first()
+        if application is None:
+            raise Http404('No such application')
+        if application.project.user != request.user:
+            raise Http404('You are not allowed to decide the application!')
+        conflict = self.decide(application, decision == "accept")
+        if conflict is not None:
+            messages.warning(request, conflict)
+            return self.render_to_response(self.get_context_data(),
+                                           status=409)
+        return HttpResponseRedirect(reverse("accounts:application"))
 
 
 class NotificationsView(LrM, TemplateView):
@@ -382,6 +637,83 @@ class NotificationsView(LrM, TemplateView):
         return super().get(request, *args, **kwargs)
 
 
+class NotificationPollView(LrM, View):
+    """Notification poll view - unread count and notifications newer than
+    the cursor, as a short poll (json). With NOTIFICATIONS_PUSH, as a
+    long-poll or a Server-Sent Events stream too
+    :url:
+    ^accounts/notifications/poll/$
+
+    :inherit: - LrM (LoginRequiredMixin)
+              - generic.View
+    :methods: - get()
+              - long_poll()
+              - stream()
+    """
+    def get(self, request, *args, **kwargs):
+        version = request.GET.get('version', '')
+        try:
+            cursor = int(request.GET.get('cursor', 0))
+        except ValueError:
+            cursor = 0
+        last_event = request.META.get('HTTP_LAST_EVENT_ID', '')
+        if '/' in last_event:
+            version, cursor = last_event.rsplit('/', 1)
+            cursor = int(cursor) if cursor.isdigit() else 0
+
+        if settings.NOTIFICATIONS_PUSH and (
+                request.GET.get('mode') == 'sse' or
+                'text/event-stream' in request.META.get('HTTP_ACCEPT', '')):
+            response = StreamingHttpResponse(
+                self.stream(request.user, version, cursor),
+                content_type='text/event-stream')
+            response['Cache-Control'] = 'no-cache'
+            response['X-Accel-Buffering'] = 'no'
+            return response
+        return self.long_poll(request, version, cursor)
+
+    @staticmethod
+    def long_poll(request, version, cursor):
+        try:
+            timeout = float(request.GET.get('timeout', 0))
+        except ValueError:
+            timeout = 0
+        # without push the request returns at once, the badge asks again
+        # after NOTIFICATIONS_POLL_EVERY
+        timeout = min(max(timeout, 0), settings.NOTIFICATIONS_POLL_TIMEOUT
+                      if settings.NOTIFICATIONS_PUSH else 0)
+        current = notifications.wait_for_change(
+            request.user.pk, version, timeout)
+        data = {'version': current, 'changed': current != version,
+                'push': settings.NOTIFICATIONS_PUSH,
+                'every': settings.NOTIFICATIONS_POLL_EVERY}
+        if data['changed']:
+            data.update(notifications.snapshot(request.user, cursor))
+        return JsonResponse(data)
+
+    @staticmethod
+    def stream(user, version, cursor):
+        """stream method - the connection is closed after
+        NOTIFICATIONS_SSE_DURATION, EventSource reconnects on its own with
+        the Last-Event-ID"""
+        deadline = time.monotonic() + settings.NOTIFICATIONS_SSE_DURATION
+        yield 'retry: {}\n\n'.format(
+            int(settings.NOTIFICATIONS_POLL_INTERVAL * 1000))
+        while time.monotonic() < deadline:
+            current = notifications.wait_for_change(
+                user.pk, version,
+                min(settings.NOTIFICATIONS_SSE_KEEPALIVE,
+                    deadline - time.monotonic()))
+            if current == version:
+                yield ': keep-alive\n\n'
+                continue
+            data = notifications.snapshot(user, cursor)
+            version, cursor = current, data['cursor']
+            data['version'] = version
+            yield 'id: {}/{}\nevent: notifications\ndata: {}\n\n'.format(
+                version, cursor, json.dumps(data))
+
+
 class AvatarView(LrM, UpdateView):
     """Avatar view - new avatar upload
     :url:
@@ -407,17 +739,23 @@ class AvatarView(LrM, UpdateView):
 
     def post(self, request, *args, **kwargs):
         user = self.get_object()
+        if rejected_uploads(request):
+            messages.error(request, 'The avatar can be at most {} MB.'.format(
+                settings.AVATAR_MAX_BYTES // (1024 * 1024)))
+            return HttpResponseRedirect(reverse('accounts:avatar_edit'))
         form = forms.AvatarForm(
             request.POST, request.FILES, instance=user)
         if form.is_valid():
             form.save()
-            return HttpResponseRedirect(reverse('accounts:avatar_edit'))
-        return HttpResponseRedirect(reverse('accounts:avatar_edit',
-                                            {'form': form}))
+        else:
+            for error in form.errors.get('avatar', ()):
+                messages.error(request, error)
+        return HttpResponseRedirect(reverse('accounts:avatar_edit'))
 
 
 class AvatarEditView(LrM, TemplateView):
-    """Avatar edit view - rotate right-left, flip up-side
+    """Avatar edit view - rotate right-left, flip up-side, reset. The
+    original stays untouched, the edit is added to the user's op list
     :url:
     ^accounts/profile/avatar/edit/(?P<action>\w+)/$
 
@@ -429,26 +767,33 @@ class AvatarEditView(LrM, TemplateView):
     template_name = "accounts/avatar_edit.html"
 
     @staticmethod
-    def edit(path, arg):
-        with Image.open(path) as image:
-            image = image.transpose(arg)
-            image.save(path)
+    def edit(user, op=None):
+        """edit method - appends an op (None resets the edits) and bumps
+        the profile version for the conditional get of the profile page"""
+        with transaction.atomic():
+            # noinspection PyUnresolvedReferences
+            current = models.User.objects.select_for_update().filter(
+                pk=user.pk).values_list('avatar_ops', flat=True).first()
+            ops = [] if op is None else avatars.append(
+                avatars.load_ops(current), op)
+            user.avatar_ops = avatars.dump_ops(ops)
+            # noinspection PyUnresolvedReferences
+            models.User.objects.filter(pk=user.pk).update(
+                avatar_ops=user.avatar_ops, updated_at=timezone.now())
 
     def get(self, request, *args, **kwargs):
         action = self.kwargs.get('action')
-        if action == 'left':
-            self.edit(request.user.avatar.path, Image.ROTATE_90)
-        if action == 'right':
-            self.edit(request.user.avatar.path, Image.ROTATE_270)
-        if action == 'up':
-            self.edit(request.user.avatar.path, Image.FLIP_TOP_BOTTOM)
-        if action == 'side':
-            self.edit(request.user.avatar.path, Image.FLIP_LEFT_RIGHT)
+        if request.user.avatar:
+            if action in avatars.ACTIONS:
+                self.edit(request.user,
+                          {'transpose': avatars.ACTIONS[action]})
+            if action == 'reset':
+                self.edit(request.user)
         return HttpResponseRedirect(reverse('accounts:avatar_edit'))
 
 
 class CropView(LrM, FormView):
-    """Crop view - cropping
+    """Crop view - cropping, added to the op list like the other edits
     :url:
     ^accounts/profile/avatar/crop/$
 
@@ -463,29 +808,35 @@ class CropView(LrM, FormView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        with Image.open(self.request.user.avatar.path) as image:
-            width, height = image.size
-            size = str(width), str(height)
-        context['size'] = size
+        width, height = avatars.current_size(self.request.user)
+        context['size'] = str(width), str(height)
         return context
 
     def post(self, request, *args, **kwargs):
-        with Image.open(request.user.avatar.path) as image:
-            width, height = image.size
-            size = str(width), str(height)
-            print('##### SIZE ####')
-            print(size)
-            print('###############')
-            form = forms.AvatarCropForm(data=request.POST, request=request)
-
-            if form.is_valid():
-                new = (int(form.cleaned_data['left']),
-                       int(form.cleaned_data['top']),
-                       int(form.cleaned_data['right']),
-                       int(form.cleaned_data['bottom']))
-                image = image.crop(new)
-                image.save(request.user.avatar.path)
-                # import pdb; pdb.set_trace()
-                return HttpResponseRedirect(reverse("accounts:avatar_edit"))
-            return HttpResponseRedirect(reverse_lazy('accounts/avatar_edit.html',
-                                        {'form': form}))
+        form = forms.AvatarCropForm(data=request.POST, request=request)
+        if form.is_valid():
+            AvatarEditView.edit(request.user, {'crop': [
+                int(form.cleaned_data[name])
+                for name in ('left', 'top', 'right', 'bottom')]})
+            return HttpResponseRedirect(reverse("accounts:avatar_edit"))
+        return HttpResponseRedirect(reverse("accounts:crop_avatar"))
+
+
+class AvatarFileView(View):
+    """Avatar file view - renders the edited avatar on its first request
+    and redirects to the stored file
+    :url:
+    ^accounts/avatar/(?P<pk>\d+)/(?P<key>[0-9a-f]+-[0-9a-f]+)/$
+
+    :inherit: - generic.View
+    :methods: - get()
+    """
+    def get(self, request, *args, **kwargs):
+        user = get_object_or_404(get_user_model(), pk=self.kwargs['pk'])
+        if not user.avatar:
+            raise Http404('No avatar')
+        # an older edit, or the edits were reset, go to the current avatar
+        if avatars.derivative_key(user) == self.kwargs['key'] and \
+                user.avatar_derivative_key != self.kwargs['key']:
+            avatars.render(user)
+        return HttpResponseRedirect(user.avatar_url)
@@ -0,0 +1,12 @@
+"""Benchmarks - run from the project directory, e.g.
+python -m benchmarks.static_media
+
+Results are recorded in benchmarks/results.md."""
+import os
+
+
+def setup():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE",
+                          "social_team_builder.settings")
+    import django
+    django.setup()
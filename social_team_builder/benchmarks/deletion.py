@@ -0,0 +1,107 @@
+"""Project deletion benchmark - request latency and longest write lock hold
+of Django's delete collector against the soft delete plus the batched
+DeletionJob (projects/deletion.py), on a throwaway SQLite file database."""
+import os
+import tempfile
+import time
+
+from benchmarks import setup
+
+setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from accounts import rollups  # noqa: E402
+from accounts.models import Skill, User, UserApplication  # noqa: E402
+from projects.deletion import delete_project, run_job  # noqa: E402
+from projects.models import Position, Project  # noqa: E402
+
+POSITIONS = 200
+APPLICANTS = 25
+WRITES = ('DELETE', 'UPDATE', 'INSERT')
+
+
+class WriteTimer:
+    """WriteTimer - execute wrapper timing the write statements, each batch
+    of the job is one statement in its own transaction"""
+    def __init__(self):
+        self.longest = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if sql.lstrip().upper().startswith(WRITES):
+                self.longest = max(self.longest, time.perf_counter() - start)
+
+
+def make_project(owner, applicants, skill):
+    project = Project.objects.create(user=owner, title='Big project',
+                                     time_estimate='1', requirements='-')
+    Position.objects.bulk_create(
+        [Position(project=project, name='Position {}'.format(number),
+                  time='1') for number in range(POSITIONS)])
+    positions = list(project.positions.all())
+    Position.skill.through.objects.bulk_create(
+        [Position.skill.through(position=position, skill=skill)
+         for position in positions])
+    now = timezone.now()
+    applications = [UserApplication(applicant=applicant, position=position,
+                                    project=project, status=index % 3 == 0,
+                                    created_at=now, decided_at=now)
+                    for position in positions
+                    for index, applicant in enumerate(applicants)]
+    UserApplication.objects.bulk_create(applications)
+    rollups.bump_many(rollups.count_applications(applications))
+    return project
+
+
+def main():
+    owner = User.objects.create_user(email='owner@example.com',
+                                     username='owner', password='-')
+    applicants = [User.objects.create_user(
+        email='a{}@example.com'.format(number),
+        username='a{}'.format(number), password='-')
+        for number in range(APPLICANTS)]
+    skill = Skill.objects.create(user=owner, name='Python')
+    settings.DELETION_IN_BACKGROUND = False
+
+    project = make_project(owner, applicants, skill)
+    timer = WriteTimer()
+    with connection.execute_wrapper(timer):
+        start = time.perf_counter()
+        Project.objects.get(pk=project.pk).delete()
+        request = time.perf_counter() - start
+    # the collector deletes everything in one transaction
+    print('{:<30} {:>10.1f} {:>10.1f} {:>10}'.format(
+        'before: collector delete', request * 1000, request * 1000, '-'))
+
+    project = make_project(owner, applicants, skill)
+    timer = WriteTimer()
+    with connection.execute_wrapper(timer):
+        start = time.perf_counter()
+        job = delete_project(Project.objects.get(pk=project.pk))
+        request = time.perf_counter() - start
+        hide = timer.longest
+        timer.longest = 0.0
+        start = time.perf_counter()
+        job = run_job(job.pk, pause=0)
+        total = time.perf_counter() - start
+    print('{:<30} {:>10.1f} {:>10.1f} {:>10}'.format(
+        'after: soft delete (request)', request * 1000, hide * 1000, '-'))
+    print('{:<30} {:>10.1f} {:>10.1f} {:>10}'.format(
+        'after: DeletionJob', total * 1000, timer.longest * 1000,
+        '{} / {}'.format(job.rows_deleted, job.batches)))
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as directory:
+        settings.DATABASES['default']['TEST'] = {
+            'NAME': os.path.join(directory, 'benchmark.sqlite3')}
+        connection.creation.create_test_db(verbosity=0)
+        print('{:<30} {:>10} {:>10} {:>10}'.format(
+            'path', 'ms', 'lock ms', 'rows / batches'))
+        main()
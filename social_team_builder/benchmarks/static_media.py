@@ -0,0 +1,124 @@
+"""Static and media serving benchmark - bytes transferred and time to first
+byte for the old views (staticfiles finders and django.views.static) and
+serve.py (collected, hashed and precompressed files)."""
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks import setup
+
+setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.staticfiles import finders  # noqa: E402
+from django.contrib.staticfiles.storage import staticfiles_storage  # noqa
+from django.contrib.staticfiles.views import serve as finders_serve  # noqa
+from django.core.management import call_command  # noqa: E402
+from django.test import RequestFactory, override_settings  # noqa: E402
+from django.views.static import serve as static_serve  # noqa: E402
+
+from social_team_builder import serve  # noqa: E402
+
+ROUNDS = 20
+BROWSER = {'HTTP_ACCEPT_ENCODING': 'gzip, deflate, br'}
+
+
+def static_names():
+    names = []
+    for finder in finders.get_finders():
+        for path, _ in finder.list([]):
+            if path.endswith(('.css', '.js', '.svg')):
+                names.append(path.replace(os.sep, '/'))
+    return sorted(set(names))
+
+
+def fetch(view, request, *args):
+    """fetch function - (bytes, seconds to the first body byte)"""
+    start = time.perf_counter()
+    response = view(request, *args)
+    if response.streaming:
+        chunks = iter(response.streaming_content)
+        first = next(chunks, b'')
+        ttfb = time.perf_counter() - start
+        body = first + b''.join(chunks)
+    else:
+        body = response.content
+        ttfb = time.perf_counter() - start
+    if hasattr(response, 'close'):
+        response.close()
+    return len(body), ttfb, response
+
+
+def run(label, view, paths, headers, revalidate):
+    factory = RequestFactory()
+    total, first_byte, repeat, requests = 0, 0.0, 0, 0
+    for path, url_path in paths:
+        best = None
+        for _ in range(ROUNDS):
+            size, ttfb, response = fetch(
+                view, factory.get('/' + path, **headers), url_path)
+            best = ttfb if best is None else min(best, ttfb)
+        total += size
+        first_byte += best
+        if revalidate:
+            conditional = dict(headers)
+            if response.has_header('ETag'):
+                conditional['HTTP_IF_NONE_MATCH'] = response['ETag']
+            if response.has_header('Last-Modified'):
+                conditional['HTTP_IF_MODIFIED_SINCE'] = \
+                    response['Last-Modified']
+            cache_control = response.get('Cache-Control', '')
+            if 'immutable' not in cache_control:
+                size, _, _ = fetch(view, factory.get('/' + path,
+                                                     **conditional), url_path)
+                repeat += size
+                requests += 1
+    print('{:<34} {:>10} {:>10.3f} {:>10} {:>10}'.format(
+        label, total, first_byte * 1000, requests, repeat))
+
+
+def main():
+    root = tempfile.mkdtemp()
+    try:
+        with override_settings(STATIC_ROOT=root, STATIC_ROOT_SERVE=True):
+            staticfiles_storage._setup()
+            staticfiles_storage.__init__()
+            call_command('collectstatic', interactive=False, verbosity=0)
+            staticfiles_storage.load_manifest()
+            names = static_names()
+            hashed = [(staticfiles_storage.stored_name(name),) * 2
+                      for name in names]
+            print('{} static files, best of {} rounds'.format(
+                len(names), ROUNDS))
+            print('{:<34} {:>10} {:>10} {:>10} {:>10}'.format(
+                'view', 'bytes', 'ttfb ms', 'revalidate', 'rv bytes'))
+            run('before: staticfiles finders', finders_serve,
+                [(name, name) for name in names], BROWSER, True)
+            run('after: hashed + precompressed', serve.static_view,
+                hashed, BROWSER, True)
+
+            media = []
+            for directory, _, files in os.walk(settings.MEDIA_ROOT):
+                for name in files:
+                    path = os.path.relpath(os.path.join(directory, name),
+                                           settings.MEDIA_ROOT)
+                    media.append((path, path))
+            print('{} media files'.format(len(media)))
+            run('before: django.views.static',
+                lambda request, path: static_serve(
+                    request, path, document_root=settings.MEDIA_ROOT),
+                media, BROWSER, True)
+            run('after: serve.media_view', serve.media_view, media,
+                BROWSER, True)
+            run('after: media_view, Range 0-1023', serve.media_view, media,
+                dict(BROWSER, HTTP_RANGE='bytes=0-1023'), False)
+            with override_settings(MEDIA_SENDFILE='x-accel-redirect'):
+                run('after: media_view, X-Accel', serve.media_view, media,
+                    BROWSER, False)
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
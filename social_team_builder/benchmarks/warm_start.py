@@ -0,0 +1,138 @@
+"""Warm start benchmark - latency of the first requests of a fresh worker
+with and without the warm-up of wsgi.py (social_team_builder/startup.py),
+against its steady state, on a throwaway SQLite file database.
+
+Every round is a new interpreter importing wsgi.py with DEBUG off and
+serving PASSES rounds of PATHS through the WSGI application. A worker forked
+by prefork.py starts from the same state."""
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import setup
+
+setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connection, connections  # noqa: E402
+
+ROUNDS = 7
+PASSES = 30
+STEADY_AFTER = 3
+PATHS = ('/', '/?filter=Developer', '/?skill=Python', '/project/{project}/',
+         '/suggest/?q=proj', '/accounts/signin/', '/accounts/signup/',
+         '/accounts/profile/{user}/')
+
+
+def seed():
+    from accounts.models import Skill, User
+    from projects.models import Position, Project
+    users = [User.objects.create_user(
+        email='u{}@example.com'.format(number), username='u{}'.format(number),
+        password='-') for number in range(50)]
+    Skill.objects.bulk_create(
+        [Skill(user=user, name=name) for index, user in enumerate(users)
+         for name in ('Python', 'Django', 'SQL', 'CSS')[:1 + index % 4]])
+    skills = list(Skill.objects.all()[:4])
+    for number in range(100):
+        project = Project.objects.create(
+            user=users[number % len(users)],
+            title='Project {}'.format(number), time_estimate='1',
+            description='A project', requirements='-')
+        for name in ('Developer', 'Designer', 'Tester'):
+            position = Position.objects.create(project=project, name=name,
+                                               time='1')
+            position.skill.add(skills[number % len(skills)])
+    return {'project': Project.objects.order_by('pk').first().pk,
+            'user': users[0].pk}
+
+
+def call(application, path):
+    path, _, query = path.partition('?')
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query,
+        'SCRIPT_NAME': '', 'SERVER_NAME': 'localhost', 'SERVER_PORT': '80',
+        'HTTP_HOST': 'localhost', 'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.input': io.BytesIO(), 'wsgi.errors': io.StringIO(),
+        'wsgi.url_scheme': 'http'}
+    statuses = []
+    response = application(environ, lambda status, headers: statuses.append(
+        status))
+    b''.join(response)
+    response.close()
+    return statuses[0]
+
+
+def worker(mode, directory, ids):
+    """worker function - one fresh worker, prints its latencies"""
+    connections['default'].settings_dict['NAME'] = os.path.join(
+        directory, 'benchmark.sqlite3')
+    # as in production, the cached template loader is only used without
+    # DEBUG (and the static files manifest is needed)
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ['localhost']
+    settings.STATIC_ROOT = os.path.join(directory, 'static')
+    settings.WARM_UP = mode == 'warm'
+    start = time.perf_counter()
+    from social_team_builder.wsgi import application
+    loaded = time.perf_counter() - start
+    paths = [path.format(**ids) for path in PATHS]
+    latencies = []
+    for _ in range(PASSES):
+        for path in paths:
+            start = time.perf_counter()
+            status = call(application, path)
+            latencies.append(time.perf_counter() - start)
+            assert status.startswith('200'), (path, status)
+    print(json.dumps({'loaded': loaded, 'latencies': latencies}))
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def main(directory, ids):
+    print('{:<20} {:>8} {:>8} {:>10} {:>10} {:>11}'.format(
+        'worker', 'load ms', '1st ms', '1st pass', 'steady p99',
+        'worst ratio'))
+    for mode in ('cold', 'warm'):
+        rows = []
+        for _ in range(ROUNDS):
+            child = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.warm_start', mode,
+                 directory, json.dumps(ids)], stdout=subprocess.PIPE,
+                check=True, universal_newlines=True)
+            result = json.loads(child.stdout.strip().splitlines()[-1])
+            latencies = result['latencies']
+            first_pass = latencies[:len(PATHS)]
+            steady = latencies[STEADY_AFTER * len(PATHS):]
+            # a path's first request against its own steady median
+            ratio = max(
+                first / statistics.median(steady[index::len(PATHS)])
+                for index, first in enumerate(first_pass))
+            rows.append((result['loaded'] * 1000, latencies[0] * 1000,
+                         max(first_pass) * 1000,
+                         percentile(steady, 0.99) * 1000, ratio))
+        medians = [statistics.median(column) for column in zip(*rows)]
+        print('{:<20} {:>8.1f} {:>8.1f} {:>10.1f} {:>10.1f} {:>10.1f}x'.format(
+            mode, *medians))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4:
+        worker(sys.argv[1], sys.argv[2], json.loads(sys.argv[3]))
+        sys.exit()
+    with tempfile.TemporaryDirectory() as directory:
+        settings.DATABASES['default']['TEST'] = {
+            'NAME': os.path.join(directory, 'benchmark.sqlite3')}
+        connection.creation.create_test_db(verbosity=0)
+        settings.STATIC_ROOT = os.path.join(directory, 'static')
+        call_command('collectstatic', interactive=False, verbosity=0)
+        main(directory, seed())
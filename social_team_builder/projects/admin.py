@@ -1,7 +1,93 @@
-from django.contrib import admin
+import io
+import os
 
-from .models import Position, Project
+from django import forms
+from django.contrib import admin, messages
+from django.http import HttpResponseRedirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
 
+from .deletion import delete_project
+from .importer import READERS, ProjectImporter
+from .models import DeletionJob, Position, Project, SkillAlias
 
+
+class ProjectImportForm(forms.Form):
+    """Project import form - admin upload of a CSV or JSON Lines file"""
+    file = forms.FileField()
+    batch_size = forms.IntegerField(initial=500, min_value=1)
+
+
+class ProjectAdmin(admin.ModelAdmin):
+    """Project admin - adds the bulk import page to the change list
+    :methods: - get_urls()
+              - import_view()
+              - delete_in_background() as an action
+    """
+    change_list_template = 'admin/projects/project/change_list.html'
+    actions = ['delete_in_background']
+
+    def delete_in_background(self, request, queryset):
+        for project in queryset:
+            delete_project(project)
+        messages.success(request, '{} projects hidden, their rows are '
+                                  'deleted in the background.'.format(
+                                      len(queryset)))
+    delete_in_background.short_description = \
+        'Delete selected projects in the background'
+
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_view),
+                 name='projects_project_import'),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        form = ProjectImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            fmt = os.path.splitext(upload.name)[1].lstrip('.')
+            if fmt not in READERS:
+                messages.error(request, 'Upload a .csv or .jsonl file.')
+            else:
+                importer = ProjectImporter(
+                    owner=request.user,
+                    batch_size=form.cleaned_data['batch_size'])
+                result = importer.run(
+                    io.TextIOWrapper(upload, encoding='utf-8', newline=''),
+                    fmt)
+                for line, message in result.errors[:50]:
+                    messages.warning(request, 'line {}: {}'.format(
+                        line, message))
+                messages.success(request, '{} projects and {} positions '
+                                          'imported ({} errors).'.format(
+                                              result.projects,
+                                              result.positions,
+                                              len(result.errors)))
+                return HttpResponseRedirect(
+                    reverse('admin:projects_project_changelist'))
+        context = dict(self.admin_site.each_context(request),
+                       opts=self.model._meta,
+                       title='Import projects',
+                       form=form)
+        return TemplateResponse(request,
+                                'admin/projects/project/import.html', context)
+
+
+class DeletionJobAdmin(admin.ModelAdmin):
+    """Deletion job admin - progress of the background deletions"""
+    list_display = ('model', 'object_id', 'status', 'step', 'rows_deleted',
+                    'batches', 'created_at', 'finished_at')
+    list_filter = ('status', 'model')
+    readonly_fields = [field.name for field in DeletionJob._meta.fields]
+
+
+class SkillAliasAdmin(admin.ModelAdmin):
+    list_display = ('alias', 'name')
+    search_fields = ('alias', 'name')
+
+
+admin.site.register(DeletionJob, DeletionJobAdmin)
+admin.site.register(SkillAlias, SkillAliasAdmin)
 admin.site.register(Position)
-admin.site.register(Project)
+admin.site.register(Project, ProjectAdmin)
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class ProjectsConfig(AppConfig):
     name = 'projects'
+
+    def ready(self):
+        # noinspection PyUnresolvedReferences
+        from . import signals  # noqa: F401
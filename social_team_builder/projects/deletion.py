@@ -0,0 +1,242 @@
+"""Soft delete and batched background cascade.
+
+Deleting a project (or a user) only flags it in the request, the rows that
+hang off it are removed afterwards by a DeletionJob. The job walks the same
+relations as Django's delete collector, but loads primary keys only and
+removes them children first, a bounded batch per DELETE statement and
+transaction, so the SQLite write lock is never held for long.
+
+The batches bypass the delete signals, so the search and facet indexes
+forget the projects when they are hidden, and a user's job rebuilds the
+facets once the user's skills are gone.
+"""
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, models, transaction
+from django.db.models import F
+from django.db.models.deletion import get_candidate_relations_to_delete
+from django.utils import timezone
+
+# noinspection PyUnresolvedReferences
+from accounts import rollups
+from .facets import facets
+from .models import DeletionJob, Position, Project
+from .search import suggestions
+
+PROJECT = 'projects.project'
+USER = 'accounts.user'
+
+
+class Cascade:
+    """Cascade - deletes a queryset and everything pointing at it in
+    primary key batches
+    :methods: - purge()
+              - purge_related()
+              - set_null()
+              - progress()
+    """
+    def __init__(self, job=None, batch_size=None, pause=None):
+        self.job = job
+        self.batch_size = batch_size or settings.DELETION_BATCH_SIZE
+        self.pause = settings.DELETION_PAUSE if pause is None else pause
+        self.rows = 0
+
+    def purge(self, queryset):
+        model = queryset.model
+        pks = queryset.order_by().values_list('pk', flat=True)
+        while True:
+            batch = list(pks[:self.batch_size])
+            if not batch:
+                return
+            self.purge_related(model, batch)
+            with transaction.atomic():
+                # noinspection PyProtectedMember
+                deleted = model._base_manager.filter(pk__in=batch) \
+                    ._raw_delete(queryset.db)
+            self.progress(model, deleted)
+
+    def purge_related(self, model, pks):
+        """purge_related method - the rows pointing at one batch, including
+        many to many through rows"""
+        # noinspection PyProtectedMember
+        for relation in get_candidate_relations_to_delete(model._meta):
+            field = relation.field
+            on_delete = field.remote_field.on_delete
+            # noinspection PyProtectedMember
+            related = relation.related_model._base_manager.filter(
+                **{'{}__in'.format(field.name): pks})
+            if on_delete is models.CASCADE:
+                self.purge(related)
+            elif on_delete is models.SET_NULL:
+                self.set_null(related, field)
+            elif on_delete is not models.DO_NOTHING:
+                raise ValueError('{} of {} is not supported.'.format(
+                    on_delete.__name__, field))
+
+    def set_null(self, queryset, field):
+        pks = queryset.order_by().values_list('pk', flat=True)
+        while True:
+            batch = list(pks[:self.batch_size])
+            if not batch:
+                return
+            with transaction.atomic():
+                queryset.model._base_manager.filter(pk__in=batch).update(
+                    **{field.name: None})
+            self.progress(queryset.model, 0)
+
+    def progress(self, model, deleted):
+        self.rows += deleted
+        if self.job is not None:
+            # noinspection PyProtectedMember
+            DeletionJob.objects.filter(pk=self.job.pk).update(
+                rows_deleted=F('rows_deleted') + deleted,
+                batches=F('batches') + 1, step=model._meta.db_table,
+                updated_at=timezone.now())
+        if self.pause:
+            time.sleep(self.pause)
+
+
+def hide_projects(projects):
+    """hide_projects function - soft-deletes a queryset of projects and
+    drops them (and their positions) from the indexes after the commit"""
+    project_ids = list(projects.values_list('pk', flat=True))
+    owner_ids = set(projects.values_list('user_id', flat=True))
+    position_ids = list(Position.objects.filter(
+        project_id__in=project_ids).values_list('pk', flat=True))
+    # noinspection PyUnresolvedReferences
+    Project.all_objects.filter(pk__in=project_ids).update(
+        is_deleted=True, updated_at=timezone.now())
+    # project titles are listed on the owners' profile pages
+    get_user_model().objects.filter(pk__in=owner_ids).update(
+        updated_at=timezone.now())
+
+    def forget():
+        for pk in project_ids:
+            suggestions.remove('project', pk)
+            facets.unset_project(pk)
+        for pk in position_ids:
+            suggestions.remove('position', pk)
+    transaction.on_commit(lambda: suggestions.changed(
+        lambda: facets.changed(forget)))
+    return project_ids
+
+
+def delete_project(project):
+    """delete_project function - hides the project now, deletes its rows
+    in the background"""
+    with transaction.atomic():
+        # noinspection PyUnresolvedReferences
+        hide_projects(Project.all_objects.filter(pk=project.pk))
+        project.is_deleted = True
+        return schedule(PROJECT, project.pk)
+
+
+def delete_user(user):
+    """delete_user function - deactivates the user and hides their
+    projects now, deletes their rows in the background"""
+    with transaction.atomic():
+        user.is_active = False
+        user.save(update_fields=['is_active', 'updated_at'])
+        # noinspection PyUnresolvedReferences
+        hide_projects(Project.all_objects.filter(user=user))
+        return schedule(USER, user.pk)
+
+
+def schedule(model, object_id):
+    # noinspection PyUnresolvedReferences
+    job = DeletionJob.objects.create(model=model, object_id=object_id)
+    if settings.DELETION_IN_BACKGROUND:
+        transaction.on_commit(lambda: start(job.pk))
+    return job
+
+
+def start(job_pk):
+    threading.Thread(target=run_in_thread, args=(job_pk,),
+                     daemon=True).start()
+
+
+def run_in_thread(job_pk):
+    try:
+        run_job(job_pk)
+    finally:
+        connection.close()
+
+
+def claim(job_pk, stale_before=None):
+    """claim function - pending jobs (and, given stale_before, running jobs
+    without progress since then) go to exactly one runner"""
+    # noinspection PyUnresolvedReferences
+    jobs = DeletionJob.objects.filter(pk=job_pk)
+    waiting = models.Q(status=DeletionJob.PENDING)
+    if stale_before is not None:
+        waiting |= models.Q(status=DeletionJob.RUNNING,
+                            updated_at__lt=stale_before)
+    now = timezone.now()
+    return jobs.filter(waiting).update(
+        status=DeletionJob.RUNNING, started_at=now, updated_at=now) == 1
+
+
+def run_job(job_pk, batch_size=None, pause=None, stale_before=None):
+    """run_job function - runs one job unless another runner has it
+    :return: - the job, or None when it was not claimed"""
+    if not claim(job_pk, stale_before):
+        return None
+    # noinspection PyUnresolvedReferences
+    job = DeletionJob.objects.get(pk=job_pk)
+    cascade = Cascade(job, batch_size, pause)
+    try:
+        if job.model == PROJECT:
+            purge_project(cascade, job.object_id)
+        elif job.model == USER:
+            purge_user(cascade, job.object_id)
+        else:
+            raise ValueError('Unknown model "{}".'.format(job.model))
+    except Exception as error:
+        job.status, job.error = DeletionJob.FAILED, repr(error)
+        job.save(update_fields=['status', 'error', 'updated_at'])
+        raise
+    job.refresh_from_db()
+    job.status, job.step, job.finished_at = \
+        DeletionJob.DONE, '', timezone.now()
+    job.save(update_fields=['status', 'step', 'finished_at', 'updated_at'])
+    return job
+
+
+def purge_project(cascade, project_id):
+    # noinspection PyUnresolvedReferences
+    cascade.purge(Project.all_objects.filter(pk=project_id,
+                                             is_deleted=True))
+
+
+def purge_user(cascade, user_id):
+    """purge_user function - the user's applications elsewhere leave the
+    rollups and the positions they filled first, as a regular delete
+    would through the signals"""
+    applications = apps.get_model('accounts', 'UserApplication').objects \
+        .filter(applicant_id=user_id)
+    cursor = 0
+    while True:
+        batch = list(applications.filter(pk__gt=cursor).order_by('pk')[
+            :cascade.batch_size])
+        if not batch:
+            break
+        with transaction.atomic():
+            rollups.bump_many({key: (-count, -seconds) for key, (
+                count, seconds) in rollups.count_applications(
+                batch).items()})
+        cursor = batch[-1].pk
+    # noinspection PyUnresolvedReferences
+    Position.objects.filter(filled_by_id=user_id).release(user_id)
+    # noinspection PyUnresolvedReferences
+    Project.objects.filter(
+        pk__in=applications.values('project_id')).update(
+        updated_at=timezone.now())
+    # noinspection PyProtectedMember
+    cascade.purge(get_user_model()._base_manager.filter(pk=user_id,
+                                                        is_active=False))
+    # skills of the user may be linked to anybody's positions
+    facets.invalidate()
@@ -0,0 +1,225 @@
+"""Project facets - one Python int bitset per facet value, bit n is set when
+the project in row n has that value. Selections are AND across facets and
+OR within a facet, so any combination is a handful of bitwise operations.
+
+Rows are handed out densely, in pk order by build() and then to new projects
+from the rows of removed ones, so a bitset is as long as the number of
+projects rather than the largest pk.
+
+Facets:
+    position - names of all positions (the list `filter`)
+    open - names of open positions (the sidebar)
+    skill - skill names of all positions
+    state - 'open' when a position is open, 'filled' when all are filled
+    owner - owner pk
+"""
+import threading
+from collections import defaultdict
+
+from django.db import connection
+
+from .indexes import VersionedIndex
+from .models import Position, Project
+
+FACETS = ('position', 'open', 'skill', 'state', 'owner')
+
+
+if hasattr(int, 'bit_count'):
+    popcount = int.bit_count
+else:  # Python < 3.10
+    def popcount(bits):
+        return bin(bits).count('1')
+
+
+def bit_ids(bits):
+    """bit_ids function - rows of the set bits, lowest first"""
+    ids = []
+    while bits:
+        low = bits & -bits
+        ids.append(low.bit_length() - 1)
+        bits ^= low
+    return ids
+
+
+class FacetIndex(VersionedIndex):
+    """Facet index
+    :inherit: - VersionedIndex
+    :methods: - build()
+              - load()
+              - refresh_project() - incremental, from the model signals
+              - ids() - pks of a bitset
+              - select()
+              - counts()
+              - query() - None while stale, the caller falls back to SQL
+    """
+    version_key = 'projects:facets:version'
+
+    def __init__(self):
+        super().__init__()
+        self.all = 0
+        self.bits = {facet: defaultdict(int) for facet in FACETS}
+        self.values = {}
+        # pk -> row, row -> pk (None for a free row), free rows
+        self.rows, self.pks, self.free = {}, [], []
+        self.building = False
+
+    @staticmethod
+    def load(project_ids=None):
+        """load method - facet values per project in three queries
+        :param: - project_ids - None loads every project
+        :return: - {pk: {facet: set of values}}"""
+        # noinspection PyUnresolvedReferences
+        projects = Project.objects.all()
+        # noinspection PyUnresolvedReferences
+        positions = Position.objects.all()
+        skills = Position.skill.through.objects.all()
+        if project_ids is not None:
+            projects = projects.filter(pk__in=project_ids)
+            positions = positions.filter(project_id__in=project_ids)
+            skills = skills.filter(position__project_id__in=project_ids)
+
+        values = {}
+        for pk, user_id in projects.values_list('pk', 'user_id'):
+            values[pk] = {facet: set() for facet in FACETS}
+            values[pk]['owner'].add(user_id)
+        open_count = {}
+        position_project = {}
+        for pk, project_id, name, is_filled in positions.values_list(
+                'pk', 'project_id', 'name', 'is_filled'):
+            if project_id not in values:
+                continue
+            position_project[pk] = project_id
+            values[project_id]['position'].add(name)
+            open_count.setdefault(project_id, 0)
+            if not is_filled:
+                values[project_id]['open'].add(name)
+                open_count[project_id] += 1
+        for position_id, name in skills.values_list(
+                'position_id', 'skill__name'):
+            project_id = position_project.get(position_id)
+            if project_id is not None:
+                values[project_id]['skill'].add(name)
+        for project_id, count in open_count.items():
+            values[project_id]['state'].add('open' if count else 'filled')
+        return values
+
+    def build(self):
+        values = self.load()
+        self.all, self.values = 0, {}
+        self.bits = {facet: defaultdict(int) for facet in FACETS}
+        self.rows, self.pks, self.free = {}, [], []
+        for pk in sorted(values):
+            self.set_project(pk, values[pk])
+
+    def set_project(self, pk, project_values):
+        self.unset_project(pk)
+        if self.free:
+            row = self.free.pop()
+            self.pks[row] = pk
+        else:
+            row = len(self.pks)
+            self.pks.append(pk)
+        self.rows[pk] = row
+        bit = 1 << row
+        self.all |= bit
+        for facet, facet_values in project_values.items():
+            for value in facet_values:
+                self.bits[facet][value] |= bit
+        self.values[pk] = project_values
+
+    def unset_project(self, pk):
+        project_values = self.values.pop(pk, None)
+        if project_values is None:
+            return
+        row = self.rows.pop(pk)
+        bit = 1 << row
+        self.all &= ~bit
+        for facet, facet_values in project_values.items():
+            for value in facet_values:
+                self.bits[facet][value] &= ~bit
+                if not self.bits[facet][value]:
+                    del self.bits[facet][value]
+        self.pks[row] = None
+        self.free.append(row)
+
+    def refresh_project(self, pk):
+        project_values = self.load([pk]).get(pk)
+        if project_values is None:
+            self.unset_project(pk)
+        else:
+            self.set_project(pk, project_values)
+
+    def ids(self, bits):
+        """ids method - pks of the projects in the bitset"""
+        return [self.pks[row] for row in bit_ids(bits)]
+
+    def select(self, selection, skip=None):
+        """select method - AND across facets, OR within a facet
+        :param: - selection - {facet: iterable of values}
+                - skip - facet left out (for that facet's own counts)"""
+        bits = self.all
+        for facet, values in selection.items():
+            if facet == skip or not values:
+                continue
+            facet_bits = 0
+            for value in values:
+                facet_bits |= self.bits[facet].get(value, 0)
+            bits &= facet_bits
+        return bits
+
+    def counts(self, selection, base=None, facets=FACETS):
+        """counts method - matching projects per facet value, each facet
+        is counted against the selection without its own values
+        :param: - base - extra mask applied to every count
+                - facets - the facets to count, or {facet: selection facet
+                           left out}, e.g. {'open': 'position'}"""
+        if not isinstance(facets, dict):
+            facets = {facet: facet for facet in facets}
+        counts = {}
+        for facet, skip in facets.items():
+            mask = self.select(selection, skip=skip)
+            if base is not None:
+                mask &= base
+            counts[facet] = {value: popcount(bits & mask)
+                             for value, bits in self.bits[facet].items()}
+        return counts
+
+    def query(self, selection, within=None, exclude=None, count=FACETS):
+        """query method
+        :param: - selection - {facet: values}, counted per facet value
+                - within - {facet: values} the result is limited to
+                - exclude - {facet: values} removed from the result
+                - count - facets to return counts for, see counts()
+        :return: - (project ids, counts) or None when the index is stale"""
+        if not self.is_fresh():
+            self.rebuild_in_background()
+            return None
+        with self.lock:
+            base = self.all
+            for facet, values in (within or {}).items():
+                facet_bits = 0
+                for value in values:
+                    facet_bits |= self.bits[facet].get(value, 0)
+                base &= facet_bits
+            for facet, values in (exclude or {}).items():
+                for value in values:
+                    base &= ~self.bits[facet].get(value, 0)
+            bits = self.select(selection) & base
+            return self.ids(bits), self.counts(selection, base, count)
+
+    def rebuild_in_background(self):
+        with self.lock:
+            if self.building:
+                return
+            self.building = True
+        threading.Thread(target=self.background_build, daemon=True).start()
+
+    def background_build(self):
+        try:
+            self.ensure_fresh()
+        finally:
+            self.building = False
+            connection.close()
+
+
+facets = FacetIndex()
@@ -0,0 +1,262 @@
+"""Personal project feed.
+
+New positions are pushed to the users whose profile skills match one of the
+position's skills: fan_out() looks the users up through the normalised skill
+name index (Skill.normalized_name, alias aware) and writes one FeedEntry per
+user and position in bulk, after the commit, on one worker thread per
+process fed by a bounded queue. A position reaches at most FEED_FANOUT_LIMIT
+users, the ones sharing the most skills with it first.
+
+Skills held by more than FEED_HOT_SKILL_USERS users are not pushed, a single
+position would write a row for a large share of the users. read() pulls the
+positions of those skills instead and merges them with the pushed entries,
+both sides ordered by position pk, which is also the page cursor. The hot
+skills are recorded (HotSkill), when one cools down the positions asking
+for it are pushed, they would drop out of the feeds otherwise.
+"""
+import atexit
+import logging
+import queue
+import threading
+from collections import Counter, defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count
+
+from .models import FeedEntry, HotSkill, Position, SkillAlias
+
+HOT_SKILLS_KEY = 'projects:feed:hot_skills'
+BACKFILL_BATCH = 500
+
+logger = logging.getLogger(__name__)
+
+local = threading.local()
+jobs = queue.Queue(maxsize=settings.FEED_QUEUE_SIZE)
+worker = None
+worker_lock = threading.Lock()
+
+
+def alias_groups():
+    """alias_groups function - canonical name of every alias and the
+    normalised names of every canonical name with aliases"""
+    # noinspection PyUnresolvedReferences
+    aliases = dict(SkillAlias.objects.values_list('alias', 'name'))
+    groups = defaultdict(set)
+    for alias, name in aliases.items():
+        groups[name].update((alias, name))
+    return aliases, groups
+
+
+def hot_skills():
+    """hot_skills function - canonical skill names with more than
+    FEED_HOT_SKILL_USERS users, cached for FEED_HOT_SKILLS_TIMEOUT. Records
+    them and backfills the ones that cooled down since the last time"""
+    hot = cache.get(HOT_SKILLS_KEY)
+    if hot is not None:
+        return hot
+    skills = apps.get_model('accounts', 'Skill').objects
+    aliases, groups = alias_groups()
+    users = defaultdict(int)
+    for name, count in skills.values('normalized_name').annotate(
+            users=Count('user_id', distinct=True)).values_list(
+            'normalized_name', 'users'):
+        # an upper bound when a user has the name and one of its aliases
+        users[aliases.get(name, name)] += count
+    hot = {name for name, count in users.items()
+           if count > settings.FEED_HOT_SKILL_USERS}
+    cache.set(HOT_SKILLS_KEY, hot, settings.FEED_HOT_SKILLS_TIMEOUT)
+    # noinspection PyUnresolvedReferences
+    recorded = set(HotSkill.objects.values_list('name', flat=True))
+    # noinspection PyUnresolvedReferences
+    HotSkill.objects.bulk_create([HotSkill(name=name)
+                                  for name in hot - recorded],
+                                 ignore_conflicts=True)
+    if recorded - hot:
+        # noinspection PyUnresolvedReferences
+        HotSkill.objects.filter(name__in=recorded - hot).delete()
+        backfill(recorded - hot, groups)
+    return hot
+
+
+def backfill(cooled, groups):
+    """backfill function - pushes the positions asking for skills that
+    are no longer hot, a concurrent backfill of the same skills writes the
+    same entries"""
+    lookup = set()
+    for canonical in cooled:
+        lookup.update(groups.get(canonical, {canonical}))
+    # noinspection PyUnresolvedReferences
+    position_ids = list(Position.objects.filter(
+        skill__normalized_name__in=lookup, project__is_deleted=False)
+        .order_by('pk').values_list('pk', flat=True).distinct())
+    for start in range(0, len(position_ids), BACKFILL_BATCH):
+        submit(position_ids[start:start + BACKFILL_BATCH])
+
+
+def schedule(position_ids):
+    """schedule function - fans the positions out once the transaction
+    commits, one fan-out per transaction whatever the number of positions"""
+    # a rolled back transaction drops the callback, not the pending set
+    registered = any(func is flush for _, func in connection.run_on_commit)
+    if not registered:
+        local.pending = set()
+    local.pending.update(position_ids)
+    if not registered:
+        transaction.on_commit(flush)
+
+
+def flush():
+    position_ids = sorted(local.__dict__.pop('pending', ()))
+    if position_ids:
+        submit(position_ids)
+
+
+def submit(position_ids):
+    """submit function - queues a fan-out for the worker thread, waits
+    while the queue is full"""
+    global worker
+    if not settings.FEED_IN_BACKGROUND or \
+            threading.current_thread() is worker:
+        # the worker never waits for its own queue
+        fan_out(position_ids)
+        return
+    with worker_lock:
+        # also after a fork, the parent's thread doesn't run in the child
+        if worker is None or not worker.is_alive():
+            worker = threading.Thread(target=work, name='feed-fan-out',
+                                      daemon=True)
+            worker.start()
+    jobs.put(position_ids)
+
+
+def work():
+    while True:
+        position_ids = jobs.get()
+        try:
+            fan_out(position_ids)
+        except Exception:
+            logger.exception('Feed fan-out of %s positions failed',
+                             len(position_ids))
+        finally:
+            connection.close()
+            jobs.task_done()
+
+
+@atexit.register
+def drain():
+    """drain function - import_projects and the other commands wait for
+    their queued fan-outs before exiting"""
+    if worker is not None and worker.is_alive():
+        jobs.join()
+
+
+def fan_out(position_ids, limit=None):
+    """fan_out function - feed entries for the users matching the positions,
+    in three queries and one bulk insert
+    :return: - number of entries written (or already there)"""
+    limit = limit or settings.FEED_FANOUT_LIMIT
+    skills = apps.get_model('accounts', 'Skill').objects
+    aliases, groups = alias_groups()
+    hot = hot_skills()
+    # noinspection PyUnresolvedReferences
+    positions = {pk: (project_id, owner_id) for pk, project_id, owner_id in
+                 Position.objects.filter(
+                     pk__in=position_ids, project__is_deleted=False)
+                 .values_list('pk', 'project_id', 'project__user_id')}
+    wanted = defaultdict(dict)
+    for position_id, normalised, name in Position.skill.through.objects \
+            .filter(position_id__in=positions).values_list(
+            'position_id', 'skill__normalized_name', 'skill__name'):
+        canonical = aliases.get(normalised, normalised)
+        if canonical and canonical not in hot:
+            wanted[position_id].setdefault(canonical, name)
+    lookup = set()
+    for names in wanted.values():
+        for canonical in names:
+            lookup.update(groups.get(canonical, {canonical}))
+    holders = defaultdict(set)
+    for user_id, normalised in skills.filter(
+            normalized_name__in=lookup, user__is_active=True).values_list(
+            'user_id', 'normalized_name'):
+        holders[aliases.get(normalised, normalised)].add(user_id)
+    entries = []
+    for position_id, names in wanted.items():
+        shared = Counter()
+        for canonical in names:
+            shared.update(holders[canonical])
+        project_id, owner_id = positions[position_id]
+        shared.pop(owner_id, None)
+        for user_id, _ in sorted(shared.items(),
+                                 key=lambda item: (-item[1], item[0]))[:limit]:
+            reason = ', '.join(sorted(
+                name for canonical, name in names.items()
+                if user_id in holders[canonical]))
+            entries.append(FeedEntry(
+                user_id=user_id, project_id=project_id,
+                position_id=position_id, reason=reason[:255]))
+    # noinspection PyUnresolvedReferences
+    FeedEntry.objects.bulk_create(entries, batch_size=1000,
+                                  ignore_conflicts=True)
+    return len(entries)
+
+
+def read(user, before=None, limit=None):
+    """read function - one page of the feed, newest position first: the
+    pushed entries (one indexed query) merged with the positions of the
+    user's hot skills
+    :return: - (entries, cursor for the next page or None) - entries as
+               [{position, project, reason}]"""
+    limit = limit or settings.FEED_PAGE_SIZE
+    # first, a skill that cooled down is pushed before the entries are read
+    hot = hot_skills()
+    # noinspection PyUnresolvedReferences
+    pushed = FeedEntry.objects.filter(user=user, project__is_deleted=False)
+    if before is not None:
+        pushed = pushed.filter(position_id__lt=before)
+    entries = {entry.position_id: {
+        'position': entry.position, 'project': entry.project,
+        'reason': entry.reason} for entry in pushed.select_related(
+        'project', 'position').order_by('-position_id')[:limit + 1]}
+    if hot:
+        entries.update(pull(user, hot, before, limit + 1))
+    ordered = [entries[pk] for pk in sorted(entries, reverse=True)]
+    if len(ordered) > limit:
+        return ordered[:limit], ordered[limit - 1]['position'].pk
+    return ordered, None
+
+
+def pull(user, hot, before, limit):
+    """pull function - feed entries of the positions asking for one of the
+    user's hot skills, keyed by position pk"""
+    aliases, groups = alias_groups()
+    held = {}
+    for normalised, name in user.profile_skills.values_list(
+            'normalized_name', 'name'):
+        canonical = aliases.get(normalised, normalised)
+        if canonical in hot:
+            held[canonical] = name
+    if not held:
+        return {}
+    lookup = set()
+    for canonical in held:
+        lookup.update(groups.get(canonical, {canonical}))
+    # noinspection PyUnresolvedReferences
+    positions = Position.objects.filter(
+        skill__normalized_name__in=lookup, project__is_deleted=False).exclude(
+        project__user=user)
+    if before is not None:
+        positions = positions.filter(pk__lt=before)
+    found = list(positions.select_related('project').order_by('-pk')
+                 .distinct()[:limit])
+    reasons = defaultdict(set)
+    for position_id, normalised in Position.skill.through.objects.filter(
+            position__in=found, skill__normalized_name__in=lookup) \
+            .values_list('position_id', 'skill__normalized_name'):
+        reasons[position_id].add(held[aliases.get(normalised, normalised)])
+    return {position.pk: {
+        'position': position, 'project': position.project,
+        'reason': ', '.join(sorted(reasons[position.pk]))}
+        for position in found}
@@ -0,0 +1,116 @@
+"""Fuzzy name matching - a trigram index over the normalised skill and
+position names. Names are grouped under their canonical form (the alias
+target, see SkillAlias), each group keeps the raw names it was built from,
+so a match can be expanded into the raw names the facets and queries use.
+"""
+import math
+from collections import defaultdict
+from itertools import chain
+
+from django.apps import apps
+from django.conf import settings
+
+from .indexes import VersionedIndex
+from .models import Position, SkillAlias
+from .names import normalise_name, trigrams
+
+
+class NameIndex(VersionedIndex):
+    """Name index
+    :inherit: - VersionedIndex
+    :methods: - build()
+              - canonical()
+              - add() - incremental, from the model signals
+              - similar()
+              - expand()
+    """
+    version_key = 'projects:names:version'
+    cache_size = 1024
+
+    def __init__(self):
+        super().__init__()
+        self.reset()
+
+    def reset(self):
+        self.keys = []
+        self.ids = {}
+        self.grams = []
+        self.postings = defaultdict(list)
+        self.raw = defaultdict(set)
+        self.aliases = {}
+        self.cache = {}
+
+    def build(self):
+        self.reset()
+        # noinspection PyUnresolvedReferences
+        self.aliases = dict(SkillAlias.objects.values_list('alias', 'name'))
+        skills = apps.get_model('accounts', 'Skill').objects
+        # noinspection PyUnresolvedReferences
+        positions = Position.objects.filter(project__is_deleted=False)
+        for queryset in (skills, positions):
+            for normalised, name in queryset.values_list(
+                    'normalized_name', 'name').distinct():
+                self.add(normalised, name)
+
+    def canonical(self, normalised):
+        return self.aliases.get(normalised, normalised)
+
+    def add(self, normalised, name):
+        key = self.canonical(normalised)
+        if not key:
+            return
+        if key not in self.ids:
+            self.ids[key] = len(self.keys)
+            self.keys.append(key)
+            grams = trigrams(key)
+            self.grams.append(grams)
+            for gram in grams:
+                self.postings[gram].append(self.ids[key])
+        self.raw[key].add(name)
+        self.cache.clear()
+
+    def similar(self, text, threshold=None):
+        """similar method - canonical names at least `threshold` similar to
+        the text, most similar first
+        :return: - list of (canonical name, similarity)"""
+        if threshold is None:
+            threshold = settings.NAME_MATCH_THRESHOLD
+        self.ensure_fresh()
+        with self.lock:
+            key = self.canonical(normalise_name(text))
+            cached = self.cache.get((key, threshold))
+            if cached is not None:
+                return cached
+            grams = trigrams(key)
+            # a name sharing fewer than `needed` trigrams cannot reach the
+            # threshold, so it contains one of the rarest len - needed + 1
+            rarest = sorted(grams, key=lambda gram: len(
+                self.postings.get(gram, ())))
+            needed = max(1, int(math.ceil(threshold * len(grams))))
+            candidates = set(chain.from_iterable(
+                self.postings.get(gram, ())
+                for gram in rarest[:len(rarest) - needed + 1]))
+            matches = []
+            for index in candidates:
+                shared = len(grams & self.grams[index])
+                score = shared / (len(grams) + len(self.grams[index]) -
+                                  shared)
+                if score >= threshold:
+                    matches.append((self.keys[index], score))
+            matches.sort(key=lambda match: (-match[1], match[0]))
+            if len(self.cache) >= self.cache_size:
+                self.cache.clear()
+            self.cache[(key, threshold)] = matches
+            return matches
+
+    def expand(self, texts, threshold=None):
+        """expand method - the texts and every raw name similar to one of
+        them, for the facets and the `name__in` lookups"""
+        expanded = set(texts)
+        for text in texts:
+            for key, _ in self.similar(text, threshold):
+                expanded.update(self.raw[key])
+        return sorted(expanded)
+
+
+names = NameIndex()
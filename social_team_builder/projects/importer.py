@@ -0,0 +1,311 @@
+"""Bulk import of projects, positions and position skills.
+
+Rows are read from CSV (one position per row, consecutive rows with the
+same owner and title belong to one project) or JSON Lines (one project per
+line with an optional ``positions`` list). Every record is validated with
+the ProjectForm/PositionForm rules and written in batches with bulk_create.
+"""
+import csv
+import json
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, connection, transaction
+from django.db.models import AutoField, Max
+from django.utils import timezone
+
+from . import feed
+from . import forms
+from . import models
+from .facets import facets
+from .fuzzy import names
+from .names import normalise_name
+from .search import suggestions
+# noinspection PyUnresolvedReferences
+from accounts.models import Skill
+
+
+PROJECT_FIELDS = ('title', 'description', 'time_estimate', 'requirements')
+POSITION_FIELDS = ('name', 'description', 'time')
+
+
+def split_skills(value):
+    """split_skills function - csv cells hold skills separated by '|'
+    :param: - value - str or list"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split('|')
+    return [name.strip() for name in value if name and name.strip()]
+
+
+def read_csv(stream):
+    """read_csv function - groups consecutive rows of the same project
+    :param: - stream - text file object
+    :return: - generator of (line, record)"""
+    record, key = None, None
+    for line, row in enumerate(csv.DictReader(stream), start=2):
+        row_key = (row.get('owner', ''), row.get('title', ''))
+        if record is None or row_key != key:
+            if record is not None:
+                yield record['line'], record
+            key = row_key
+            record = {field: row.get(field, '') for field in PROJECT_FIELDS}
+            record.update(owner=row.get('owner', ''), positions=[], line=line)
+        if row.get('position_name'):
+            record['positions'].append({
+                'name': row.get('position_name', ''),
+                'description': row.get('position_description', ''),
+                'time': row.get('position_time', ''),
+                'skills': split_skills(row.get('skills')),
+            })
+    if record is not None:
+        yield record['line'], record
+
+
+def read_jsonl(stream):
+    """read_jsonl function - one project per line
+    :param: - stream - text file object
+    :return: - generator of (line, record or error message)"""
+    for line, raw in enumerate(stream, start=1):
+        raw = raw.strip()
+        if not raw:
+            continue
+        try:
+            record = json.loads(raw)
+        except ValueError as error:
+            yield line, 'Invalid JSON: {}'.format(error)
+            continue
+        if not isinstance(record, dict):
+            yield line, 'Expected a JSON object.'
+            continue
+        record['line'] = line
+        record['positions'] = [
+            dict(position, skills=split_skills(position.get('skills')))
+            for position in record.get('positions') or []
+            if isinstance(position, dict)]
+        yield line, record
+
+
+READERS = {'csv': read_csv, 'jsonl': read_jsonl}
+
+
+class SharedFields(dict):
+    """Form fields shared between instances - forms deepcopy base_fields
+    on every __init__, which dominates validation of thousands of rows.
+    Only used by the import forms below, which never mutate their fields"""
+    def __deepcopy__(self, memo):
+        return self
+
+
+class ImportProjectForm(forms.ProjectForm):
+    """Import project form - ProjectForm rules"""
+
+
+class ImportPositionForm(forms.PositionForm):
+    """Import position form - PositionForm rules without the skill field,
+    skills come in by name and are resolved once per batch"""
+    skill = None
+
+    class Meta(forms.PositionForm.Meta):
+        fields = list(POSITION_FIELDS)
+
+
+ImportProjectForm.base_fields = SharedFields(ImportProjectForm.base_fields)
+ImportPositionForm.base_fields = SharedFields(ImportPositionForm.base_fields)
+
+
+def reserve_pks(model, count):
+    """reserve_pks function - moves the SQLite AUTOINCREMENT counter of the
+    model's table past count new ids. The UPDATE takes the database write
+    lock, a concurrent import waits for the transaction and gets the next
+    range; ids of deleted rows are never handed out again
+    :return: - the id before the reserved range"""
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute('UPDATE sqlite_sequence SET seq = seq + %s '
+                       'WHERE name = %s', [count, table])
+        if cursor.rowcount:
+            cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = %s',
+                           [table])
+            return cursor.fetchone()[0] - count
+        # no row was ever inserted
+        # noinspection PyProtectedMember
+        top = model._base_manager.aggregate(top=Max('pk'))['top'] or 0
+        cursor.execute('INSERT INTO sqlite_sequence (name, seq) '
+                       'VALUES (%s, %s)', [table, top + count])
+        return top
+
+
+def insert(model, objs):
+    """insert function - bulk_create that leaves the ids set, the rows
+    pointing at the new objects need them. Call inside a transaction
+    - PostgreSQL returns the ids of a bulk insert
+    - SQLite inserts a reserved range of ids, see reserve_pks()
+    - other backends insert row by row
+    :param: - model
+            - objs - unsaved instances"""
+    if not objs:
+        return
+    if connection.features.can_return_ids_from_bulk_insert:
+        model.objects.bulk_create(objs)
+    elif connection.vendor == 'sqlite':
+        top = reserve_pks(model, len(objs))
+        for offset, obj in enumerate(objs, start=1):
+            obj.pk = top + offset
+        model.objects.bulk_create(objs)
+    else:
+        # noinspection PyProtectedMember
+        fields = [field for field in model._meta.concrete_fields
+                  if not isinstance(field, AutoField)]
+        for obj in objs:
+            # noinspection PyProtectedMember
+            obj.pk = model._base_manager._insert([obj], fields=fields,
+                                                 return_id=True)
+            # noinspection PyProtectedMember
+            obj._state.adding, obj._state.db = False, connection.alias
+
+
+class ImportResult:
+    """Import result - counters and per-row errors
+    :methods: - add_error()
+    """
+    def __init__(self):
+        self.records = 0
+        self.projects = 0
+        self.positions = 0
+        self.errors = []
+
+    def add_error(self, line, message):
+        self.errors.append((line, message))
+
+
+class ProjectImporter:
+    """Project importer
+    :argument: - owner - default owner for records without an 'owner' email
+               - batch_size
+    :methods: - run()
+              - validate()
+              - write()
+    """
+    def __init__(self, owner=None, batch_size=500):
+        self.owner = owner
+        self.batch_size = batch_size
+
+    def run(self, stream, fmt='csv'):
+        """run method - reads, validates and writes batch by batch
+        :param: - stream - text file object
+                - fmt - 'csv' or 'jsonl'"""
+        result = ImportResult()
+        rows = READERS[fmt](stream)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                return result
+            result.records += len(batch)
+            records = []
+            for line, record in batch:
+                if isinstance(record, str):
+                    result.add_error(line, record)
+                else:
+                    records.append(record)
+            self.write(self.validate(records, result), result)
+
+    @staticmethod
+    def form_errors(form):
+        return '; '.join('{}: {}'.format(field, ' '.join(errors))
+                         for field, errors in form.errors.items())
+
+    def validate(self, records, result):
+        """validate method - form rules per record, owners and skills are
+        resolved with one query each for the whole batch
+        :return: - list of (record, owner, [(position, skill_ids)])"""
+        emails = {record.get('owner') for record in records
+                  if record.get('owner')}
+        owners = {user.email: user for user in
+                  get_user_model().objects.filter(email__in=emails)}
+        names = {name for record in records
+                 for position in record['positions']
+                 for name in position['skills']}
+        skills = {}
+        # noinspection PyUnresolvedReferences
+        for pk, name in Skill.objects.filter(
+                name__in=names).order_by('-pk').values_list('pk', 'name'):
+            skills[name] = pk
+
+        valid = []
+        for record in records:
+            line = record['line']
+            owner = owners.get(record.get('owner')) or (
+                None if record.get('owner') else self.owner)
+            if owner is None:
+                result.add_error(line, 'Unknown owner "{}".'.format(
+                    record.get('owner', '')))
+                continue
+            form = ImportProjectForm(data={
+                field: record.get(field, '') for field in PROJECT_FIELDS})
+            if not form.is_valid():
+                result.add_error(line, self.form_errors(form))
+                continue
+            positions, errors = [], []
+            for position in record['positions']:
+                position_form = ImportPositionForm(data={
+                    field: position.get(field, '')
+                    for field in POSITION_FIELDS})
+                missing = [name for name in position['skills']
+                           if name not in skills]
+                if not position_form.is_valid():
+                    errors.append(self.form_errors(position_form))
+                elif missing:
+                    errors.append('Unknown skills: {}'.format(
+                        ', '.join(missing)))
+                else:
+                    positions.append((
+                        position_form.save(commit=False),
+                        {skills[name] for name in position['skills']}))
+            if errors:
+                result.add_error(line, ' | '.join(errors))
+                continue
+            project = form.save(commit=False)
+            project.user = owner
+            valid.append((line, project, positions))
+        return valid
+
+    @staticmethod
+    def write(valid, result):
+        """write method - one transaction and three bulk inserts per batch"""
+        if not valid:
+            return
+        projects = [project for _, project, _ in valid]
+        through = models.Position.skill.through
+        try:
+            with transaction.atomic():
+                insert(models.Project, projects)
+                positions, skill_ids = [], []
+                for _, project, project_positions in valid:
+                    for position, ids in project_positions:
+                        position.project = project
+                        # bulk_create skips Position.save()
+                        position.normalized_name = normalise_name(
+                            position.name)
+                        positions.append(position)
+                        skill_ids.append(ids)
+                insert(models.Position, positions)
+                through.objects.bulk_create([
+                    through(position_id=position.pk, skill_id=skill_id)
+                    for position, ids in zip(positions, skill_ids)
+                    for skill_id in ids])
+                # bulk_create skips the signals, owners list their projects
+                get_user_model().objects.filter(pk__in={
+                    project.user_id for project in projects}).update(
+                    updated_at=timezone.now())
+                feed.schedule([position.pk for position in positions])
+        except DatabaseError as error:
+            for line, _, _ in valid:
+                result.add_error(line, 'Batch failed: {}'.format(error))
+            return
+        result.projects += len(projects)
+        result.positions += len(positions)
+        suggestions.invalidate()
+        facets.invalidate()
+        names.invalidate()
@@ -0,0 +1,97 @@
+"""In-memory read models.
+
+Every worker process keeps its own copy of an index. A version counter in
+the shared cache tells the processes apart: the process that saw a change
+increments it, and applies the change in place when the increment is the
+next version after its own copy's. Otherwise another process changed the
+data in between, so it rebuilds like every other process that finds its
+version outdated on the next lookup.
+"""
+import threading
+import time
+
+from django.core.cache import cache
+
+
+def new_version():
+    """new_version function - where a counter starts, from the time so that
+    a counter lost from the cache never repeats a version"""
+    return int(time.time() * 1000000)
+
+
+class VersionedIndex:
+    """Versioned index base class
+    :argument: - version_key - cache key shared by all processes
+    :methods: - build() - loads the whole index from the database
+              - shared_version()
+              - is_fresh()
+              - ensure_fresh()
+              - publish()
+              - changed()
+              - invalidate()
+    """
+    version_key = None
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.version = None
+
+    def build(self):
+        raise NotImplementedError
+
+    def shared_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            version = new_version()
+            if not cache.add(self.version_key, version, None):
+                version = cache.get(self.version_key, version)
+        return version
+
+    def is_fresh(self):
+        return self.version is not None and \
+            self.version == self.shared_version()
+
+    def ensure_fresh(self):
+        """ensure_fresh method - rebuilds when another process changed
+        the data since this copy was built"""
+        version = self.shared_version()
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.build()
+                    self.version = version
+        return self
+
+    def publish(self):
+        """publish method - increments the shared version
+        :return: - the new version"""
+        try:
+            version = cache.incr(self.version_key)
+        except ValueError:
+            # evicted
+            cache.add(self.version_key, new_version(), None)
+            version = cache.incr(self.version_key)
+        except TypeError:
+            # a version of an older release
+            cache.set(self.version_key, new_version(), None)
+            version = cache.incr(self.version_key)
+        # incr() may set the default timeout
+        cache.touch(self.version_key, None)
+        return version
+
+    def changed(self, apply):
+        """changed method - applies an incremental update to a fresh copy
+        and publishes a new version for the other processes
+        :param: - apply - callable updating this copy in place"""
+        with self.lock:
+            previous = self.version
+            version = self.publish()
+            if previous is not None and version == previous + 1:
+                apply()
+                self.version = version
+
+    def invalidate(self):
+        """invalidate method - for writes that skip the model signals
+        (bulk_create, update), every process rebuilds on its next lookup"""
+        with self.lock:
+            self.publish()
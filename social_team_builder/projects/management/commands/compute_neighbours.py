@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from projects.neighbours import refresh
+
+
+class Command(BaseCommand):
+    """Compute neighbours command
+    - python manage.py compute_neighbours [--all]
+    :methods: - add_arguments()
+              - handle()
+    """
+    help = 'Recomputes the related projects of the projects whose ' \
+           'positions changed (and of the projects that change affects).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Recompute every project.')
+        parser.add_argument('--top', type=int,
+                            help='Defaults to settings.RELATED_PROJECTS.')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        written = refresh(full=options['all'], top=options['top'],
+                          chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            'Neighbours of {} projects written in {:.2f}s.'.format(
+                written, time.perf_counter() - start)))
@@ -0,0 +1,57 @@
+import io
+import os
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from projects.importer import READERS, ProjectImporter
+
+
+class Command(BaseCommand):
+    """Import projects command
+    - python manage.py import_projects projects.csv --owner=me@example.com
+    :methods: - add_arguments()
+              - handle()
+    """
+    help = 'Imports projects, positions and position skills from ' \
+           'CSV or JSON Lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=sorted(READERS),
+                            help='Defaults to the file extension.')
+        parser.add_argument('--owner',
+                            help='Email of the owner for rows without one.')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or os.path.splitext(path)[1].lstrip('.')
+        if fmt == 'jsonlines':
+            fmt = 'jsonl'
+        if fmt not in READERS:
+            raise CommandError('Unknown format "{}".'.format(fmt))
+
+        owner = None
+        if options['owner']:
+            try:
+                owner = get_user_model().objects.get(email=options['owner'])
+            except get_user_model().DoesNotExist:
+                raise CommandError('Unknown owner "{}".'.format(
+                    options['owner']))
+
+        importer = ProjectImporter(owner=owner,
+                                   batch_size=options['batch_size'])
+        start = time.perf_counter()
+        with io.open(path, encoding='utf-8', newline='') as stream:
+            result = importer.run(stream, fmt)
+        elapsed = time.perf_counter() - start
+
+        for line, message in result.errors:
+            self.stderr.write('line {}: {}'.format(line, message))
+        self.stdout.write(self.style.SUCCESS(
+            '{} projects and {} positions imported from {} records '
+            '({} errors) in {:.2f}s.'.format(
+                result.projects, result.positions, result.records,
+                len(result.errors), elapsed)))
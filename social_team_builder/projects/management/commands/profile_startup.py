@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+# noinspection PyUnresolvedReferences
+from social_team_builder.startup import PHASES, profile, tree_lines
+
+
+class Command(BaseCommand):
+    """Profile startup command
+    - python manage.py profile_startup [--path=/] [--runs=5]
+    :methods: - add_arguments()
+              - handle()
+    """
+    help = 'Starts fresh workers and reports their import tree by phase, ' \
+           'the time from app ready to the first response and the cold ' \
+           'start time (median of the runs).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/',
+                            help='Path of the first request.')
+        parser.add_argument('--host', default='localhost',
+                            help='Host header, one of ALLOWED_HOSTS.')
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--depth', type=int, default=3,
+                            help='Levels of the import tree shown.')
+        parser.add_argument('--min-ms', type=float, default=2.0,
+                            help='Leaves out the faster imports.')
+        parser.add_argument('--no-tree', action='store_true')
+
+    def handle(self, *args, **options):
+        try:
+            timings, statuses, trees = profile(
+                options['path'], options['host'], max(1, options['runs']))
+        except RuntimeError as error:
+            raise CommandError('The worker failed: {}'.format(error))
+        if not options['no_tree']:
+            for phase in PHASES:
+                if not trees.get(phase):
+                    continue
+                self.stdout.write(self.style.MIGRATE_HEADING(
+                    'Imported by {}'.format(phase)))
+                self.stdout.write('  cumul ms   self ms  module')
+                for line in tree_lines(trees[phase], options['min_ms'],
+                                       options['depth']):
+                    self.stdout.write(line)
+            if not trees:
+                self.stdout.write('No import tree, -X importtime needs '
+                                  'Python 3.7 or later.')
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            'Timings (median of {} runs, ms)'.format(options['runs'])))
+        for name, ms in timings.items():
+            self.stdout.write('{:>30}  {:>8.1f}'.format(name, ms))
+        self.stdout.write('Responses: {}'.format(', '.join(statuses)))
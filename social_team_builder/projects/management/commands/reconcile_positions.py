@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from projects.facets import facets
+from projects.models import Position
+
+
+class Command(BaseCommand):
+    """Reconcile positions command
+    - python manage.py reconcile_positions
+    :methods: - handle()
+    """
+    help = 'Repairs Position.is_filled/filled_by drift from the accepted ' \
+           'applications.'
+
+    def handle(self, *args, **options):
+        # noinspection PyUnresolvedReferences
+        opened, filled, reassigned = Position.objects.reconcile()
+        if opened or filled or reassigned:
+            facets.invalidate()
+        self.stdout.write(self.style.SUCCESS(
+            '{} positions reopened, {} filled, {} reassigned.'.format(
+                opened, filled, reassigned)))
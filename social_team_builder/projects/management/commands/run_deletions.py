@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from projects.deletion import run_job
+from projects.models import DeletionJob
+
+
+class Command(BaseCommand):
+    """Run deletions command
+    - python manage.py run_deletions --stale-minutes=10
+    :methods: - add_arguments()
+              - handle()
+    """
+    help = 'Runs the pending deletion jobs, and the running ones without ' \
+           'progress for --stale-minutes (e.g. after a restart).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stale-minutes', type=int, default=10)
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument('--pause', type=float)
+
+    def handle(self, *args, **options):
+        stale_before = timezone.now() - timedelta(
+            minutes=options['stale_minutes'])
+        # noinspection PyUnresolvedReferences
+        jobs = DeletionJob.objects.exclude(
+            status__in=[DeletionJob.DONE, DeletionJob.FAILED]).order_by('pk')
+        ran = 0
+        for pk in jobs.values_list('pk', flat=True):
+            job = run_job(pk, options['batch_size'], options['pause'],
+                          stale_before)
+            if job is not None:
+                ran += 1
+                self.stdout.write('{}: {} rows in {} batches'.format(
+                    job, job.rows_deleted, job.batches))
+        self.stdout.write(self.style.SUCCESS('{} jobs run.'.format(ran)))
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    """Serve prefork command
+    - python manage.py serve_prefork --bind=127.0.0.1:8000 --workers=4
+    :methods: - add_arguments()
+              - handle()
+    """
+    help = 'Warms the application up and serves it from forked worker ' \
+           'processes, see social_team_builder/prefork.py.'
+    # like any WSGI server, `manage.py check --deploy` belongs to the deploy
+    requires_system_checks = False
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bind', default='127.0.0.1:8000')
+        parser.add_argument('--workers', type=int,
+                            help='Defaults to settings.PREFORK_WORKERS.')
+        parser.add_argument('--max-requests', type=int,
+                            help='Requests after which a worker is '
+                                 'replaced, 0 for none. Defaults to '
+                                 'settings.PREFORK_MAX_REQUESTS.')
+        parser.add_argument('--no-warm-up', action='store_true',
+                            help='Forks cold workers (to compare).')
+
+    def handle(self, *args, **options):
+        if options['no_warm_up']:
+            settings.WARM_UP = False
+        # noinspection PyUnresolvedReferences
+        from social_team_builder.prefork import Arbiter
+        # noinspection PyUnresolvedReferences
+        from social_team_builder.wsgi import application
+        workers = options['workers'] or settings.PREFORK_WORKERS
+        max_requests = settings.PREFORK_MAX_REQUESTS \
+            if options['max_requests'] is None else options['max_requests']
+        Arbiter(application, options['bind'], workers, max_requests).run()
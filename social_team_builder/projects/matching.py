@@ -0,0 +1,189 @@
+"""Team suggestions.
+
+Scores every pending applicant against every open position of a project by
+skill overlap and picks the maximum weight assignment (one applicant per
+position, one position per applicant) with the Hungarian algorithm. Only
+pairs backed by an application can be assigned.
+
+numpy is imported by the functions using it, match_scores() (the application
+inbox) and the worker startup don't pay for it.
+"""
+from django.apps import apps
+
+from .models import Position
+
+# an application always beats a vacancy, a shared skill beats any
+# application without one
+APPLIED = 1
+SKILL = 1000
+
+
+def hungarian(cost):
+    """hungarian function - minimum cost assignment of a rectangular cost
+    matrix, shortest augmenting paths with the column loop vectorised
+    :param: - cost - (rows, columns) array
+    :return: - (rows, columns) index arrays of the assigned pairs"""
+    import numpy as np
+    cost = np.asarray(cost, dtype=float)
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+    if not n:
+        return np.array([], dtype=int), np.array([], dtype=int)
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    # row (1-based) assigned to each column, 0 when free; column 0 is the
+    # root of the current search
+    p = np.zeros(m + 1, dtype=int)
+    way = np.zeros(m + 1, dtype=int)
+    for row in range(1, n + 1):
+        p[0] = row
+        column = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[column] = True
+            current = p[column]
+            reduced = cost[current - 1] - u[current] - v[1:]
+            free = ~used[1:]
+            better = free & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = column
+            candidates = np.where(free, minv[1:], np.inf)
+            nxt = int(np.argmin(candidates)) + 1
+            delta = candidates[nxt - 1]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[~used] -= delta
+            column = nxt
+            if p[column] == 0:
+                break
+        while column:
+            previous = way[column]
+            p[column] = p[previous]
+            column = previous
+    columns = np.nonzero(p[1:])[0]
+    rows = p[1:][columns] - 1
+    order = np.argsort(rows)
+    rows, columns = rows[order], columns[order]
+    if transposed:
+        rows, columns = columns, rows
+        order = np.argsort(rows)
+        rows, columns = rows[order], columns[order]
+    return rows, columns
+
+
+def load(project):
+    """load function - open positions and pending applications of a project
+    with their skill names, in four queries
+    :return: - (positions, applicants, applied) - positions as
+               [(position, skill set)], applicants as [(user, skill set)],
+               applied as a set of (position pk, applicant pk)"""
+    applications = apps.get_model('accounts', 'UserApplication').objects
+    skills = apps.get_model('accounts', 'Skill').objects
+    # noinspection PyUnresolvedReferences
+    positions = list(Position.objects.filter(project=project).open()
+                     .order_by('pk'))
+    position_skills = {position.pk: set() for position in positions}
+    for position_id, name in Position.skill.through.objects.filter(
+            position__in=positions).values_list('position_id',
+                                                'skill__name'):
+        position_skills[position_id].add(name.lower())
+    pending = applications.filter(position__in=positions,
+                                  status__isnull=True).select_related(
+        'applicant').order_by('applicant_id')
+    applied, users = set(), {}
+    for application in pending:
+        applied.add((application.position_id, application.applicant_id))
+        users[application.applicant_id] = application.applicant
+    user_skills = {pk: set() for pk in users}
+    for user_id, name in skills.filter(user_id__in=users).values_list(
+            'user_id', 'name'):
+        user_skills[user_id].add(name.lower())
+    return ([(position, position_skills[position.pk])
+             for position in positions],
+            [(user, user_skills[pk]) for pk, user in users.items()],
+            applied)
+
+
+def scores(positions, applicants, applied):
+    """scores function - (positions, applicants) weight matrix from the
+    skill incidence matrices, zero for pairs without an application"""
+    import numpy as np
+    vocabulary = {}
+    for _, names in positions:
+        for name in names:
+            vocabulary.setdefault(name, len(vocabulary))
+    wanted = np.zeros((len(positions), len(vocabulary)))
+    for row, (_, names) in enumerate(positions):
+        wanted[row, [vocabulary[name] for name in names]] = 1
+    offered = np.zeros((len(applicants), len(vocabulary)))
+    for row, (_, names) in enumerate(applicants):
+        offered[row, [vocabulary[name] for name in names
+                      if name in vocabulary]] = 1
+    mask = np.zeros((len(positions), len(applicants)), dtype=bool)
+    rows = {position.pk: row for row, (position, _) in enumerate(positions)}
+    columns = {user.pk: column
+               for column, (user, _) in enumerate(applicants)}
+    for position_id, user_id in applied:
+        mask[rows[position_id], columns[user_id]] = True
+    return np.where(mask, APPLIED + SKILL * wanted.dot(offered.T), 0)
+
+
+def suggest_team(project):
+    """suggest_team function - the maximum weight team for the open
+    positions of a project
+    :return: - {'team': [{position, applicant, matched, missing}],
+                'vacant': [{position, missing}],
+                'coverage': share of the wanted skills covered}"""
+    positions, applicants, applied = load(project)
+    weights = scores(positions, applicants, applied)
+    assigned = {}
+    if weights.size:
+        rows, columns = hungarian(weights.max() - weights)
+        for row, column in zip(rows, columns):
+            if weights[row, column] > 0:
+                assigned[row] = column
+    team, vacant, wanted_total, covered = [], [], 0, 0
+    for row, (position, wanted) in enumerate(positions):
+        wanted_total += len(wanted)
+        if row in assigned:
+            user, offered = applicants[assigned[row]]
+            matched = wanted & offered
+            covered += len(matched)
+            team.append({'position': position, 'applicant': user,
+                         'matched': sorted(matched),
+                         'missing': sorted(wanted - offered)})
+        else:
+            vacant.append({'position': position, 'missing': sorted(wanted)})
+    return {'team': team, 'vacant': vacant,
+            'coverage': covered / wanted_total if wanted_total else None}
+
+
+def match_scores(applications):
+    """match_scores function - sets match_score (percent of the position's
+    skills the applicant has, None for positions without skills),
+    matched_skills and missing_skills on every application, in two queries
+    whatever the number of applications"""
+    skills = apps.get_model('accounts', 'Skill').objects
+    position_skills = {application.position_id: set()
+                       for application in applications}
+    user_skills = {application.applicant_id: set()
+                   for application in applications}
+    for position_id, name in Position.skill.through.objects.filter(
+            position_id__in=position_skills).values_list('position_id',
+                                                         'skill__name'):
+        position_skills[position_id].add(name.lower())
+    for user_id, name in skills.filter(user_id__in=user_skills).values_list(
+            'user_id', 'name'):
+        user_skills[user_id].add(name.lower())
+    for application in applications:
+        wanted = position_skills[application.position_id]
+        offered = user_skills[application.applicant_id]
+        application.matched_skills = sorted(wanted & offered)
+        application.missing_skills = sorted(wanted - offered)
+        application.match_score = round(
+            100 * len(application.matched_skills) / len(wanted)) \
+            if wanted else None
+    return applications
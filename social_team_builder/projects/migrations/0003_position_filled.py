@@ -0,0 +1,50 @@
+# Generated by Django 2.2.10 on 2026-10-19 12:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def fill_positions(apps, schema_editor):
+    """Positions with an accepted application are filled by the first one"""
+    Position = apps.get_model('projects', 'Position')
+    UserApplication = apps.get_model('accounts', 'UserApplication')
+    accepted = UserApplication.objects.filter(status=True).order_by('-pk')
+    holders = dict(accepted.values_list('position_id', 'applicant_id'))
+    now = timezone.now()
+    for position_id, applicant_id in holders.items():
+        Position.objects.filter(pk=position_id).update(
+            is_filled=True, filled_by=applicant_id, filled_at=now)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('accounts', '0003_user_updated_at'),
+        ('projects', '0002_project_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='position',
+            name='filled_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='position',
+            name='filled_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='filled_positions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='position',
+            name='is_filled',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.AddIndex(
+            model_name='position',
+            index=models.Index(fields=['project', 'is_filled'], name='projects_po_project_77949f_idx'),
+        ),
+        migrations.RunPython(fill_positions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 2.2.10 on 2026-10-19 12:10
+
+from django.db import migrations, models
+
+from projects.names import normalise_name
+
+ALIASES = [('js', 'javascript'), ('ts', 'typescript'), ('py', 'python'),
+           ('golang', 'go'), ('postgres', 'postgresql'),
+           ('k8s', 'kubernetes'), ('ml', 'machine learning'),
+           ('ux', 'ux design'), ('ui', 'ui design'),
+           ('reactjs', 'react'), ('react.js', 'react')]
+
+
+def normalise_positions(apps, schema_editor):
+    Position = apps.get_model('projects', 'Position')
+    for pk, name in Position.objects.values_list('pk', 'name').iterator():
+        Position.objects.filter(pk=pk).update(
+            normalized_name=normalise_name(name))
+
+
+def add_aliases(apps, schema_editor):
+    SkillAlias = apps.get_model('projects', 'SkillAlias')
+    SkillAlias.objects.bulk_create([
+        SkillAlias(alias=normalise_name(alias), name=normalise_name(name))
+        for alias, name in ALIASES])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0004_deletion_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SkillAlias',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alias', models.CharField(max_length=50, unique=True)),
+                ('name', models.CharField(max_length=50)),
+            ],
+            options={
+                'verbose_name_plural': 'skill aliases',
+            },
+        ),
+        migrations.AddField(
+            model_name='position',
+            name='normalized_name',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=50),
+        ),
+        migrations.RunPython(normalise_positions, migrations.RunPython.noop),
+        migrations.RunPython(add_aliases, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 2.2.10 on 2026-10-19 12:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0005_name_matching'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='neighbours_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='neighbours_dirty',
+            field=models.BooleanField(db_index=True, default=True),
+        ),
+        migrations.CreateModel(
+            name='ProjectNeighbour',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('neighbour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='projects.Project')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbours', to='projects.Project')),
+            ],
+            options={
+                'unique_together': {('project', 'rank')},
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+from projects.names import normalise_name
+
+
+def renormalise(apps, schema_editor):
+    """renormalise function - names like "D3" or "Web3" lost their digits"""
+    for label in ('accounts.Skill', 'projects.Position'):
+        model = apps.get_model(label)
+        for pk, name, normalized_name in model.objects.values_list(
+                'pk', 'name', 'normalized_name').iterator():
+            if normalise_name(name) != normalized_name:
+                model.objects.filter(pk=pk).update(
+                    normalized_name=normalise_name(name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_avatar_size_fields'),
+        ('projects', '0007_feed'),
+    ]
+
+    operations = [
+        migrations.RunPython(renormalise, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 2.2.10 on 2026-10-19 13:31
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0009_project_created_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HotSkill',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('since', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -1,11 +1,54 @@
+from django.apps import apps
 from django.conf import settings
 from django.db import models
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from .names import normalise_name
+
+
+class ProjectQuerySet(models.QuerySet):
+    """Project queryset
+    :inherit: - models.QuerySet
+    :methods: - with_counts()
+    """
+    def with_counts(self):
+        """with_counts method - position and applicant counts annotated in
+        the same query. Filters on positions placed before this call would
+        restrict the counts, so filter by pk (e.g. pk__in=...) instead"""
+        accepted = Q(positions__apply__status=True)
+        return self.annotate(
+            positions_total=Count('positions', distinct=True),
+            positions_filled=Count('positions',
+                                   filter=Q(positions__is_filled=True),
+                                   distinct=True),
+            applicants_total=Count('positions__apply', distinct=True),
+            applicants_accepted=Count('positions__apply', filter=accepted,
+                                      distinct=True))
+
+
+class ProjectManager(models.Manager.from_queryset(ProjectQuerySet)):
+    """Project manager - hides soft-deleted projects, their rows are
+    removed by a DeletionJob (see deletion.py)"""
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=False)
 
 
 class Project(models.Model):
     """Project model
     :inherit: - models.Model
     :fields: - user, title, description, time_estimate, requirements
+             - created_at - null for the projects created before it was
+                            added
+             - updated_at - project version, also bumped by position and
+                            application changes (see signals)
+             - is_deleted - hidden, waiting for its DeletionJob
+             - neighbours_dirty, neighbours_at - related projects need to
+               be recomputed / were computed (see neighbours.py)
+    :managers: - objects - without the deleted projects
+               - all_objects
+    :methods: - positions_open() as a property, needs with_counts()
+              - __str__()
     """
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
                              related_name='projects',
@@ -14,15 +57,103 @@ class Project(models.Model):
     description = models.TextField(default='')
     time_estimate = models.CharField(max_length=100)
     requirements = models.CharField(max_length=255)
+    created_at = models.DateTimeField(default=timezone.now, null=True,
+                                      editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    is_deleted = models.BooleanField(default=False, db_index=True)
+    neighbours_dirty = models.BooleanField(default=True, db_index=True)
+    neighbours_at = models.DateTimeField(null=True, blank=True)
+
+    objects = ProjectManager()
+    all_objects = ProjectQuerySet.as_manager()
+
+    @property
+    def positions_open(self):
+        return self.positions_total - self.positions_filled
 
     def __str__(self):
         return '{}'.format(self.title)
 
 
+class ProjectNeighbour(models.Model):
+    """Project neighbour model - the most similar projects by skills and
+    position names, written by the compute_neighbours command
+    :inherit: - models.Model
+    :fields: - project, rank, neighbour, score - cosine similarity
+    """
+    project = models.ForeignKey(Project, related_name='neighbours',
+                                on_delete=models.CASCADE)
+    rank = models.PositiveSmallIntegerField()
+    neighbour = models.ForeignKey(Project, related_name='+',
+                                  on_delete=models.CASCADE)
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ('project', 'rank')
+
+
+class PositionQuerySet(models.QuerySet):
+    """Position queryset - keeps the filled state in step with the
+    accepted applications
+    :inherit: - models.QuerySet
+    :methods: - open()
+              - fill()
+              - release()
+              - reconcile()
+    """
+    def open(self):
+        return self.filter(is_filled=False)
+
+    def fill(self, applicant):
+        """fill method - marks open positions as filled by the applicant"""
+        return self.filter(is_filled=False).update(
+            is_filled=True, filled_by=applicant, filled_at=timezone.now())
+
+    def release(self, applicant):
+        """release method - positions filled by the applicant go to another
+        accepted applicant, or open up again when there is none"""
+        released = 0
+        for position in self.filter(filled_by=applicant):
+            # noinspection PyUnresolvedReferences
+            other = position.apply.filter(status=True).exclude(
+                applicant=applicant).values_list(
+                'applicant_id', flat=True).first()
+            released += self.model.objects.filter(pk=position.pk).update(
+                is_filled=other is not None, filled_by=other,
+                filled_at=timezone.now() if other is not None else None)
+        return released
+
+    def reconcile(self):
+        """reconcile method - repairs drift between is_filled/filled_by and
+        the accepted applications in three set-based updates
+        :return: - (opened, filled, reassigned) row counts"""
+        applications = apps.get_model('accounts', 'UserApplication').objects
+        first_accepted = Subquery(applications.filter(
+            position=OuterRef('pk'), status=True).order_by('pk').values(
+            'applicant_id')[:1])
+        opened = self.filter(is_filled=True).exclude(
+            apply__status=True).update(
+            is_filled=False, filled_by=None, filled_at=None)
+        filled = self.filter(is_filled=False, apply__status=True).update(
+            is_filled=True, filled_by=first_accepted,
+            filled_at=timezone.now())
+        reassigned = self.filter(is_filled=True).exclude(
+            pk__in=applications.filter(
+                status=True, position__filled_by=F('applicant')).values(
+                'position_id')).update(filled_by=first_accepted)
+        return opened, filled, reassigned
+
+
 class Position(models.Model):
     """Position model
     :inherit: - models.Model
     :fields: - name, description, project, time, skill
+             - normalized_name - set on save, see names.py
+             - is_filled, filled_by, filled_at - denormalised from the
+               accepted applications, maintained by DecisionView and
+               repaired by the reconcile_positions command
+    :methods: - save()
+              - __str__()
     """
     name = models.CharField(max_length=50)
     description = models.TextField(default='')
@@ -33,7 +164,118 @@ class Position(models.Model):
     skill = models.ManyToManyField('accounts.Skill',
                                    default='',
                                    related_name='skills')
+    normalized_name = models.CharField(max_length=50, default='',
+                                       db_index=True, editable=False)
+    is_filled = models.BooleanField(default=False, db_index=True)
+    filled_by = models.ForeignKey(settings.AUTH_USER_MODEL,
+                                  null=True, blank=True,
+                                  related_name='filled_positions',
+                                  on_delete=models.SET_NULL)
+    filled_at = models.DateTimeField(null=True, blank=True)
+
+    objects = PositionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=['project', 'is_filled'])]
+
+    def save(self, *args, **kwargs):
+        self.normalized_name = normalise_name(self.name)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return '{}'.format(self.name)
 
+
+class SkillAlias(models.Model):
+    """Skill alias model - "js" stands for "javascript"; the fuzzy name
+    index groups an alias with its name
+    :inherit: - models.Model
+    :fields: - alias, name - both normalised on save
+    :methods: - save()
+              - __str__()
+    """
+    alias = models.CharField(max_length=50, unique=True)
+    name = models.CharField(max_length=50)
+
+    class Meta:
+        verbose_name_plural = 'skill aliases'
+
+    def save(self, *args, **kwargs):
+        self.alias = normalise_name(self.alias)
+        self.name = normalise_name(self.name)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return '{} -> {}'.format(self.alias, self.name)
+
+
+class DeletionJob(models.Model):
+    """Deletion job model - the cascade of a soft-deleted project or user,
+    run in batches by deletion.run_job()
+    :inherit: - models.Model
+    :fields: - model - app_label.model_name of the deleted object
+             - object_id
+             - status, step - the table being emptied
+             - rows_deleted, batches - progress
+             - error
+             - created_at, started_at, updated_at, finished_at
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = ((PENDING, 'Pending'),
+                      (RUNNING, 'Running'),
+                      (DONE, 'Done'),
+                      (FAILED, 'Failed'))
+
+    model = models.CharField(max_length=100)
+    object_id = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES,
+                              default=PENDING, db_index=True)
+    step = models.CharField(max_length=100, blank=True, default='')
+    rows_deleted = models.PositiveIntegerField(default=0)
+    batches = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return '{} {} ({})'.format(self.model, self.object_id, self.status)
+
+
+class FeedEntry(models.Model):
+    """Feed entry model - a new position matching one of the user's
+    skills, written by feed.fan_out()
+    :inherit: - models.Model
+    :fields: - user, project, position - feeds are ordered by position
+             - reason - the matching skill names
+             - created_at
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='feed',
+                             on_delete=models.CASCADE)
+    project = models.ForeignKey(Project, related_name='+',
+                                on_delete=models.CASCADE)
+    position = models.ForeignKey(Position, related_name='+',
+                                 on_delete=models.CASCADE)
+    reason = models.CharField(max_length=255, blank=True, default='')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # also the index of the feed query: user, newest position first
+        unique_together = ('user', 'position')
+
+
+class HotSkill(models.Model):
+    """Hot skill model - a canonical skill name the feed pulls instead of
+    pushing (see feed.py), its positions are pushed once it cools down
+    :inherit: - models.Model
+    :fields: - name, since
+    """
+    name = models.CharField(max_length=50, unique=True)
+    since = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return '{}'.format(self.name)
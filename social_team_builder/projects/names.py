@@ -0,0 +1,48 @@
+"""Skill and position name normalisation.
+
+normalise_name() is stored on Skill and Position (normalized_name) when they
+are saved, so "Python", "python3" and "Python dev" all become "python".
+The fuzzy NameIndex (fuzzy.py) compares the normalised names by their
+trigrams().
+"""
+import re
+
+# words that describe the role rather than the skill
+FILLER_WORDS = {'dev', 'devs', 'developer', 'developers', 'development',
+                'engineer', 'engineers', 'engineering', 'programmer',
+                'programming', 'language', 'specialist', 'expert'}
+SEPARATORS = re.compile(r'[^\w+#.]+')
+# a version after two letters or more: python3, html5, angular2 (d3, s3 and
+# x86 are names)
+VERSION = re.compile(r'(?<=[a-z][a-z])v?\d+(\.\d+)*$')
+NUMBER = re.compile(r'^v?\d+(\.\d+)*$')
+# names ending like a version
+KEEP_DIGITS = {'web3', 'es5', 'es6', 'ec2', 'ipv4', 'ipv6', 'mp3', 'mp4',
+               'oauth2', 'http2', 'http3'}
+
+
+def normalise_name(text):
+    """normalise_name function - lower case, punctuation (except the + # .
+    of c++, c# and node.js) and version numbers removed, role words dropped
+    unless nothing else is left"""
+    words = []
+    for word in SEPARATORS.sub(' ', text.lower()).split():
+        word = word.strip('.')
+        if word not in KEEP_DIGITS:
+            word = VERSION.sub('', word)
+        if word:
+            words.append(word)
+    kept = [word for word in words
+            if word not in FILLER_WORDS and not NUMBER.match(word)]
+    return ' '.join(kept or words)
+
+
+def trigrams(name):
+    """trigrams function - the trigrams of every word, padded like
+    PostgreSQL's pg_trgm so that short words and word starts count"""
+    grams = set()
+    for word in name.split():
+        padded = '  {} '.format(word)
+        grams.update(padded[index:index + 3]
+                     for index in range(len(padded) - 2))
+    return grams
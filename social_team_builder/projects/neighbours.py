@@ -0,0 +1,152 @@
+"""Related projects.
+
+Every live project is a vector over the canonical names of its position
+skills and positions, weighted by inverse document frequency and scaled to
+unit length, so a matrix product gives the cosine similarities. refresh()
+writes the top neighbours of each project to ProjectNeighbour, either for
+every project or only for the ones the change could affect: the dirty
+projects (positions changed), the projects listing a dirty or deleted
+project, and the projects a dirty project now beats their last neighbour
+for. The other scores drift as the idf weights change, a full refresh now
+and then (compute_neighbours --all) brings them back in line.
+"""
+import math
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from .models import Position, Project, ProjectNeighbour, SkillAlias
+
+
+def load_features():
+    """load_features function - canonical skill and position names of
+    every live project, in three queries
+    :return: - (project pks, [set of features] in the same order)"""
+    # noinspection PyUnresolvedReferences
+    aliases = dict(SkillAlias.objects.values_list('alias', 'name'))
+    features = defaultdict(set)
+    # noinspection PyUnresolvedReferences
+    for project_id, name in Position.objects.filter(
+            project__is_deleted=False).values_list(
+            'project_id', 'normalized_name'):
+        features[project_id].add('position:' + aliases.get(name, name))
+    for project_id, name in Position.skill.through.objects.filter(
+            position__project__is_deleted=False).values_list(
+            'position__project_id', 'skill__normalized_name'):
+        features[project_id].add('skill:' + aliases.get(name, name))
+    # noinspection PyUnresolvedReferences
+    pks = sorted(Project.objects.values_list('pk', flat=True))
+    return pks, [features[pk] for pk in pks]
+
+
+def build_matrix(features):
+    """build_matrix function - unit length tf-idf rows. Features of a
+    single project cannot make two projects similar, they only count
+    towards the row length and get no column"""
+    frequency = Counter(name for names in features for name in names)
+    count = len(features)
+    idf = {name: math.log((1 + count) / (1 + seen)) + 1
+           for name, seen in frequency.items()}
+    columns = {name: column for column, name in enumerate(
+        sorted(name for name, seen in frequency.items() if seen > 1))}
+    matrix = np.zeros((count, len(columns)), dtype=np.float32)
+    for row, names in enumerate(features):
+        if not names:
+            continue
+        length = math.sqrt(sum(idf[name] ** 2 for name in names))
+        for name in names:
+            if name in columns:
+                matrix[row, columns[name]] = idf[name] / length
+    return matrix
+
+
+def top_neighbours(matrix, rows, top):
+    """top_neighbours function - [(column, score)] of the `top` most
+    similar rows for each of `rows`, best first, without self matches
+    and zero scores"""
+    scores = matrix[rows].dot(matrix.T)
+    scores[np.arange(len(rows)), rows] = 0
+    top = min(top, matrix.shape[0])
+    if not top:
+        return [[] for _ in rows]
+    best = np.argpartition(-scores, top - 1, axis=1)[:, :top]
+    result = []
+    for line, columns in zip(scores, best):
+        columns = columns[np.argsort(-line[columns], kind='stable')]
+        result.append([(column, float(line[column])) for column in columns
+                       if line[column] > 0])
+    return result
+
+
+def affected_rows(matrix, pks, dirty, top, chunk_size):
+    """affected_rows function - rows whose neighbours a change of the dirty
+    projects can change"""
+    index = {pk: row for row, pk in enumerate(pks)}
+    dirty_rows = sorted(index[pk] for pk in dirty if pk in index)
+    affected = set(dirty_rows)
+    # noinspection PyUnresolvedReferences
+    listing = ProjectNeighbour.objects.filter(
+        neighbour__in=list(dirty)) | ProjectNeighbour.objects.filter(
+        neighbour__is_deleted=True)
+    affected.update(index[pk] for pk in listing.values_list(
+        'project_id', flat=True) if pk in index)
+    if not dirty_rows:
+        return affected
+    # how similar each project is to its nearest dirty project
+    nearest = np.zeros(len(pks), dtype=np.float32)
+    for start in range(0, len(dirty_rows), chunk_size):
+        scores = matrix[dirty_rows[start:start + chunk_size]].dot(matrix.T)
+        nearest = np.maximum(nearest, scores.max(axis=0))
+    # noinspection PyUnresolvedReferences
+    current = {row['project_id']: row for row in
+               ProjectNeighbour.objects.values('project_id').annotate(
+                   last=Min('score'), count=Count('pk'))}
+    for row in np.nonzero(nearest > 0)[0]:
+        listed = current.get(pks[row])
+        if listed is None or listed['count'] < top or \
+                nearest[row] > listed['last']:
+            affected.add(int(row))
+    return affected
+
+
+def refresh(full=False, top=None, chunk_size=500):
+    """refresh function - recomputes the neighbours of every project
+    (full) or of the projects affected by the dirty ones
+    :return: - number of projects written"""
+    top = top or settings.RELATED_PROJECTS
+    started = timezone.now()
+    pks, features = load_features()
+    matrix = build_matrix(features)
+    if full:
+        rows = list(range(len(pks)))
+    else:
+        # noinspection PyUnresolvedReferences
+        dirty = set(Project.objects.filter(
+            neighbours_dirty=True).values_list('pk', flat=True))
+        rows = sorted(affected_rows(matrix, pks, dirty, top, chunk_size))
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        project_ids = [pks[row] for row in chunk]
+        neighbours = []
+        for row, found in zip(chunk, top_neighbours(matrix, chunk, top)):
+            neighbours.extend(ProjectNeighbour(
+                project_id=pks[row], rank=rank, neighbour_id=pks[column],
+                score=score) for rank, (column, score) in enumerate(found))
+        with transaction.atomic():
+            # noinspection PyUnresolvedReferences
+            ProjectNeighbour.objects.filter(
+                project_id__in=project_ids).delete()
+            # noinspection PyUnresolvedReferences
+            ProjectNeighbour.objects.bulk_create(neighbours)
+            # noinspection PyUnresolvedReferences
+            projects = Project.objects.filter(pk__in=project_ids)
+            projects.update(neighbours_at=timezone.now())
+            # projects changed since the features were loaded stay dirty
+            projects.filter(updated_at__lte=started).update(
+                neighbours_dirty=False)
+    return len(rows)
@@ -0,0 +1,90 @@
+"""Search suggestions - a sorted array of (normalised text, kind, text)
+over project titles and position names, prefix lookups use bisect."""
+from bisect import bisect_left, insort
+
+from .indexes import VersionedIndex
+from .models import Position, Project
+
+
+def normalise(text):
+    return ' '.join(text.lower().split())
+
+
+class SuggestionIndex(VersionedIndex):
+    """Suggestion index
+    :inherit: - VersionedIndex
+    :methods: - build()
+              - update() - incremental, from the model signals
+              - remove()
+              - suggest()
+    """
+    version_key = 'projects:suggestions:version'
+
+    def __init__(self):
+        super().__init__()
+        self.keys = []
+        self.counts = {}
+        self.objects = {}
+
+    def build(self):
+        self.keys, self.counts, self.objects = [], {}, {}
+        # noinspection PyUnresolvedReferences
+        for pk, title in Project.objects.values_list('pk', 'title'):
+            self.objects[('project', pk)] = self.add('project', title)
+        # noinspection PyUnresolvedReferences
+        for pk, name in Position.objects.filter(
+                project__is_deleted=False).values_list('pk', 'name'):
+            self.objects[('position', pk)] = self.add('position', name)
+        self.keys.sort()
+
+    def add(self, kind, text, sort=False):
+        key = (normalise(text), kind, text)
+        if not key[0]:
+            return None
+        if key not in self.counts:
+            self.counts[key] = 0
+            if sort:
+                insort(self.keys, key)
+            else:
+                self.keys.append(key)
+        self.counts[key] += 1
+        return key
+
+    def discard(self, key):
+        if key is None or key not in self.counts:
+            return
+        self.counts[key] -= 1
+        if not self.counts[key]:
+            del self.counts[key]
+            del self.keys[bisect_left(self.keys, key)]
+
+    def update(self, kind, pk, text):
+        self.discard(self.objects.pop((kind, pk), None))
+        self.objects[(kind, pk)] = self.add(kind, text, sort=True)
+
+    def remove(self, kind, pk):
+        self.discard(self.objects.pop((kind, pk), None))
+
+    def suggest(self, prefix, limit=8):
+        """suggest method - the first `limit` texts starting with prefix
+        :return: - list of {'text', 'kind'}"""
+        prefix = normalise(prefix)
+        if not prefix:
+            return []
+        self.ensure_fresh()
+        results, seen = [], set()
+        with self.lock:
+            keys = self.keys
+            index = bisect_left(keys, (prefix,))
+            while index < len(keys) and len(results) < limit:
+                normalised, kind, text = keys[index]
+                if not normalised.startswith(prefix):
+                    break
+                if (normalised, kind) not in seen:
+                    seen.add((normalised, kind))
+                    results.append({'text': text, 'kind': kind})
+                index += 1
+        return results
+
+
+suggestions = SuggestionIndex()
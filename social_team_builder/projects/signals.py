@@ -0,0 +1,100 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import feed
+from .facets import facets
+from .fuzzy import names
+from .models import Position, Project, SkillAlias
+from .search import suggestions
+
+
+def refresh_facets(project_id):
+    """refresh_facets function - re-reads one project into the facet index
+    once the transaction commits"""
+    transaction.on_commit(lambda: facets.changed(
+        lambda: facets.refresh_project(project_id)))
+
+
+@receiver(post_save, sender=Position)
+@receiver(post_delete, sender=Position)
+def position_changed(sender, instance, **kwargs):
+    """position_changed receiver - positions are shown on the project page
+    and make up its related projects"""
+    # noinspection PyUnresolvedReferences
+    Project.objects.filter(pk=instance.project_id).update(
+        updated_at=timezone.now(), neighbours_dirty=True)
+
+
+@receiver(m2m_changed, sender=Position.skill.through)
+def position_skills_changed(sender, instance, action, **kwargs):
+    if action.startswith('post_') and isinstance(instance, Position):
+        position_changed(Position, instance)
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def project_changed(sender, instance, **kwargs):
+    """project_changed receiver - project titles are listed on the
+    owner's profile page"""
+    get_user_model().objects.filter(pk=instance.user_id).update(
+        updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_save, sender=Position)
+def suggestion_saved(sender, instance, **kwargs):
+    kind = 'project' if sender is Project else 'position'
+    text = instance.title if sender is Project else instance.name
+    transaction.on_commit(lambda: suggestions.changed(
+        lambda: suggestions.update(kind, instance.pk, text)))
+
+
+@receiver(post_delete, sender=Project)
+@receiver(post_delete, sender=Position)
+def suggestion_deleted(sender, instance, **kwargs):
+    kind = 'project' if sender is Project else 'position'
+    pk = instance.pk
+    transaction.on_commit(lambda: suggestions.changed(
+        lambda: suggestions.remove(kind, pk)))
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def facets_project_changed(sender, instance, **kwargs):
+    refresh_facets(instance.pk)
+
+
+@receiver(post_save, sender=Position)
+@receiver(post_delete, sender=Position)
+def facets_position_changed(sender, instance, **kwargs):
+    refresh_facets(instance.project_id)
+
+
+@receiver(m2m_changed, sender=Position.skill.through)
+def facets_position_skills_changed(sender, instance, action, **kwargs):
+    if action.startswith('post_') and isinstance(instance, Position):
+        refresh_facets(instance.project_id)
+
+
+@receiver(post_save, sender=Position)
+def names_position_saved(sender, instance, **kwargs):
+    normalised, name = instance.normalized_name, instance.name
+    transaction.on_commit(lambda: names.changed(
+        lambda: names.add(normalised, name)))
+
+
+@receiver(post_save, sender=SkillAlias)
+@receiver(post_delete, sender=SkillAlias)
+def names_alias_changed(sender, instance, **kwargs):
+    transaction.on_commit(names.invalidate)
+
+
+@receiver(m2m_changed, sender=Position.skill.through)
+def feed_position_skills_added(sender, instance, action, pk_set, **kwargs):
+    """feed_position_skills_added receiver - new positions (and new skills
+    of a position) go to the feeds of the matching users"""
+    if action == 'post_add' and isinstance(instance, Position) and pk_set:
+        feed.schedule([instance.pk])
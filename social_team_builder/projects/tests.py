@@ -1,3 +1,294 @@
-from django.test import TestCase
+import io
+from itertools import permutations
+import random
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import (SimpleTestCase, TestCase, TransactionTestCase,
+                         override_settings)
+
+from . import feed
+from .facets import FacetIndex
+from .importer import ProjectImporter
+from .indexes import VersionedIndex
+from .matching import hungarian
+from .models import FeedEntry, HotSkill, Position, Project
+from .names import normalise_name
+# noinspection PyUnresolvedReferences
+from accounts.models import Skill, User
+
+
+def brute_force(cost):
+    """brute_force function - minimum assignment cost by trying every
+    assignment of the smaller side"""
+    rows, columns = len(cost), len(cost[0])
+    if rows <= columns:
+        return min(sum(cost[row][column] for row, column in enumerate(
+            chosen)) for chosen in permutations(range(columns), rows))
+    return min(sum(cost[row][column] for column, row in enumerate(
+        chosen)) for chosen in permutations(range(rows), columns))
+
+
+class HungarianTests(SimpleTestCase):
+    def test_square(self):
+        cost = [[4, 1, 3], [2, 0, 5], [3, 2, 2]]
+        rows, columns = hungarian(cost)
+        self.assertEqual(list(rows), [0, 1, 2])
+        self.assertEqual(list(columns), [1, 0, 2])
+
+    def test_matches_brute_force(self):
+        generator = random.Random(7)
+        for shape in ((3, 3), (2, 5), (5, 2), (4, 6), (6, 4), (1, 4)):
+            for _ in range(20):
+                cost = [[generator.randint(0, 20) for _ in range(shape[1])]
+                        for _ in range(shape[0])]
+                rows, columns = hungarian(cost)
+                self.assertEqual(len(rows), min(shape))
+                self.assertEqual(len(set(rows)), len(rows))
+                self.assertEqual(len(set(columns)), len(columns))
+                self.assertEqual(list(rows), sorted(rows))
+                self.assertEqual(
+                    sum(cost[row][column]
+                        for row, column in zip(rows, columns)),
+                    brute_force(cost), (shape, cost))
+
+    def test_empty(self):
+        rows, columns = hungarian([[]])
+        self.assertEqual(len(rows), 0)
+        self.assertEqual(len(columns), 0)
+
+
+class FacetTests(SimpleTestCase):
+    def setUp(self):
+        self.index = FacetIndex()
+        for pk, position, skill, state, owner in (
+                (1, {'Developer'}, {'Python'}, 'open', 10),
+                (2, {'Developer', 'Designer'}, {'Python', 'CSS'}, 'filled',
+                 10),
+                (3, {'Designer'}, {'CSS'}, 'open', 11),
+                (4, {'Tester'}, {'Python'}, 'open', 11)):
+            self.index.set_project(pk, {
+                'position': position,
+                'open': position if state == 'open' else set(),
+                'skill': skill, 'state': {state}, 'owner': {owner}})
+
+    def test_or_within_a_facet(self):
+        bits = self.index.select({'position': ['Designer', 'Tester']})
+        self.assertEqual(self.index.ids(bits), [2, 3, 4])
+
+    def test_and_across_facets(self):
+        bits = self.index.select({'position': ['Developer', 'Designer'],
+                                  'skill': ['Python'],
+                                  'state': ['open']})
+        self.assertEqual(self.index.ids(bits), [1])
+
+    def test_counts_leave_out_their_own_facet(self):
+        counts = self.index.counts({'position': ['Developer'],
+                                    'skill': ['CSS']})
+        # position counts see the skill selection only
+        self.assertEqual(counts['position'],
+                         {'Developer': 1, 'Designer': 2, 'Tester': 0})
+        # skill counts see the position selection only
+        self.assertEqual(counts['skill'], {'Python': 2, 'CSS': 1})
+        # the other facets see both
+        self.assertEqual(counts['owner'], {10: 1, 11: 0})
+
+    def test_counts_with_base_and_facet_map(self):
+        counts = self.index.counts({'position': ['Designer']},
+                                   base=self.index.select({'owner': [11]}),
+                                   facets={'open': 'position'})
+        self.assertEqual(counts, {'open': {'Developer': 0, 'Designer': 1,
+                                           'Tester': 1}})
+
+    def test_unset_project(self):
+        self.index.unset_project(4)
+        self.assertEqual(self.index.ids(self.index.select({})), [1, 2, 3])
+        self.assertNotIn('Tester', self.index.bits['position'])
+
+    def test_rows_stay_dense(self):
+        self.index.unset_project(2)
+        self.index.set_project(10 ** 6, {
+            'position': {'Developer'}, 'open': set(), 'skill': set(),
+            'state': {'filled'}, 'owner': {10}})
+        # the new project takes the free row
+        self.assertEqual(self.index.all.bit_length(), 4)
+        bits = self.index.select({'position': ['Developer']})
+        self.assertEqual(sorted(self.index.ids(bits)), [1, 10 ** 6])
+        self.assertEqual(self.index.counts({'state': ['filled']})['owner'],
+                         {10: 1, 11: 0})
+
+
+class CountingIndex(VersionedIndex):
+    version_key = 'tests:index:version'
+
+    def __init__(self):
+        super().__init__()
+        self.builds = 0
+        self.applied = 0
+
+    def build(self):
+        self.builds += 1
+
+    def apply(self):
+        self.applied += 1
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'tests-indexes'}})
+class VersionedIndexTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        # two processes
+        self.first = CountingIndex().ensure_fresh()
+        self.second = CountingIndex().ensure_fresh()
+
+    def test_change_applied_in_place(self):
+        self.first.changed(self.first.apply)
+        self.assertEqual(self.first.applied, 1)
+        self.assertTrue(self.first.is_fresh())
+        self.assertFalse(self.second.is_fresh())
+        self.second.ensure_fresh()
+        self.assertEqual(self.second.builds, 2)
+
+    def test_change_after_another_process_rebuilds(self):
+        self.first.changed(self.first.apply)
+        # the second copy missed the first change, it can't just apply its
+        # own on top
+        self.second.changed(self.second.apply)
+        self.assertEqual(self.second.applied, 0)
+        self.assertFalse(self.second.is_fresh())
+        self.assertFalse(self.first.is_fresh())
+        for index in (self.first, self.second):
+            index.ensure_fresh()
+            self.assertEqual(index.builds, 2)
+
+    def test_evicted_version(self):
+        cache.delete(CountingIndex.version_key)
+        self.first.changed(self.first.apply)
+        self.assertEqual(self.first.applied, 0)
+        self.assertFalse(self.second.is_fresh())
+
+
+class NormaliseNameTests(SimpleTestCase):
+    def test_versions_removed(self):
+        for text in ('Python', 'python3', 'Python 3.8', 'Python dev'):
+            self.assertEqual(normalise_name(text), 'python', text)
+
+    def test_names_ending_in_digits_kept(self):
+        for text, name in (('D3', 'd3'), ('S3', 's3'), ('x86', 'x86'),
+                           ('Web3', 'web3'), ('ES6', 'es6')):
+            self.assertEqual(normalise_name(text), name, text)
+
+
+class ImporterTests(TestCase):
+    rows = ('title,description,time_estimate,requirements,position_name,'
+            'position_description,position_time,skills\n'
+            'First,-,1,-,Developer,-,1,Python|CSS\n'
+            'First,-,1,-,Designer,-,1,CSS\n'
+            'Second,-,1,-,Tester,-,1,Python\n')
+
+    def setUp(self):
+        # noinspection PyUnresolvedReferences
+        self.owner = User.objects.create_user(
+            email='owner@example.com', username='owner', password='pw')
+        for name in ('Python', 'CSS'):
+            # noinspection PyUnresolvedReferences
+            Skill.objects.create(user=self.owner, name=name)
+
+    def run_import(self):
+        result = ProjectImporter(self.owner).run(io.StringIO(self.rows))
+        self.assertEqual(result.errors, [])
+        self.assertEqual((result.projects, result.positions), (2, 3))
+
+    def assert_imported(self):
+        skills = {(position.name, position.project.title): sorted(
+            skill.name for skill in position.skill.all())
+            for position in Position.objects.all()}
+        self.assertEqual(skills, {
+            ('Developer', 'First'): ['CSS', 'Python'],
+            ('Designer', 'First'): ['CSS'],
+            ('Tester', 'Second'): ['Python']})
+
+    def test_ids_of_deleted_rows_not_reused(self):
+        self.run_import()
+        self.assert_imported()
+        before = set(Project.all_objects.values_list('pk', flat=True))
+        Project.all_objects.filter(pk=max(before)).delete()
+        self.run_import()
+        added = Project.all_objects.exclude(pk__in=before).values_list(
+            'pk', flat=True)
+        self.assertEqual(len(added), 2)
+        self.assertGreater(min(added), max(before))
+
+    def test_row_by_row_fallback(self):
+        with mock.patch.object(connection, 'vendor', 'other'):
+            self.run_import()
+        self.assert_imported()
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'tests-feed'}}, FEED_HOT_SKILL_USERS=3)
+class FeedTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = self.user('owner', [])
+        self.readers = [self.user('reader{}'.format(number), ['Python'])
+                        for number in range(3)]
+        project = Project.objects.create(
+            user=self.owner, title='Project', time_estimate='1',
+            description='-', requirements='-')
+        self.position = Position.objects.create(
+            project=project, name='Developer', time='1')
+
+    @staticmethod
+    def user(name, skills):
+        # noinspection PyUnresolvedReferences
+        user = User.objects.create_user(email='{}@example.com'.format(name),
+                                        username=name, password='pw')
+        user.is_active = True
+        user.save()
+        for skill in skills:
+            # noinspection PyUnresolvedReferences
+            Skill.objects.create(user=user, name=skill)
+        return user
+
+    def add_skill(self):
+        # noinspection PyUnresolvedReferences
+        self.position.skill.add(Skill.objects.create(user=self.owner,
+                                                     name='Python'))
+        feed.jobs.join()
+
+    def feed_of(self, user):
+        return [entry['position'].pk for entry in feed.read(user)[0]]
+
+    def pushed(self):
+        return FeedEntry.objects.filter(position=self.position).count()
+
+    @override_settings(FEED_IN_BACKGROUND=False)
+    def test_hot_skill_pulled_then_pushed_when_it_cools(self):
+        self.add_skill()
+        self.assertEqual(feed.hot_skills(), {'python'})
+        self.assertEqual(self.pushed(), 0)
+        self.assertEqual(self.feed_of(self.readers[0]), [self.position.pk])
+        # the skill cools down
+        self.readers[2].profile_skills.all().delete()
+        cache.delete(feed.HOT_SKILLS_KEY)
+        self.assertEqual(self.feed_of(self.readers[0]), [self.position.pk])
+        self.assertEqual(feed.hot_skills(), set())
+        self.assertEqual(self.pushed(), 2)
+        self.assertFalse(HotSkill.objects.exists())
+
+    def test_fan_out_on_the_worker(self):
+        self.readers[2].profile_skills.all().delete()
+        with mock.patch.object(feed, 'fan_out',
+                               side_effect=feed.fan_out) as fan_out:
+            self.add_skill()
+            self.add_skill()
+        self.assertEqual(fan_out.call_count, 2)
+        self.assertIsNot(feed.worker, threading.current_thread())
+        self.assertTrue(feed.worker.daemon)
+        self.assertEqual(self.pushed(), 2)
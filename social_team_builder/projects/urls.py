@@ -7,9 +7,12 @@ app_name = 'social_team_builder'
 
 urlpatterns = [
     url(r'^$', views.ProjectListView.as_view(), name='project_list'),
+    url(r'^feed/$', views.FeedView.as_view(), name='feed'),
+    url(r'^suggest/$', views.SuggestView.as_view(), name='suggest'),
     url(r'project/new/$', views.ProjectCreateView.as_view(), name='create'),
     url(r'project/(?P<pk>\d+)/$', views.ProjectDetailView.as_view(), name='detail'),
     url(r'project/(?P<pk>\d+)/delete/$', views.ProjectDeleteView.as_view(), name='delete'),
     url(r'project/(?P<pk>\d+)/edit/$', views.ProjectEditView.as_view(), name='edit'),
+    url(r'project/(?P<pk>\d+)/team/$', views.TeamView.as_view(), name='team'),
     url(r'project/(?P<pr_pk>\d+)/apply/position/(?P<ps_pk>\d+)/$', views.ApplyView.as_view(), name='apply'),
 ]
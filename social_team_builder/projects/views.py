@@ -6,18 +6,28 @@ from django.contrib.auth.mixins import LoginRequiredMixin as LrM
 # from django.core.urlresolvers import reverse, reverse_lazy
 from django.urls import reverse, reverse_lazy
 from django.db.models import Q
-from django.http import HttpResponseRedirect, Http404
+from django.http import HttpResponseRedirect, Http404, JsonResponse
 from django.shortcuts import get_object_or_404
 from django.views.generic import (CreateView, DetailView, DeleteView,
-                                  ListView, TemplateView, UpdateView)
+                                  ListView, TemplateView, UpdateView, View)
 # from notify.signals import notify
 from braces.views import PrefetchRelatedMixin as PrM
 
+from . import feed
 from . import forms
 from . import models
+from .deletion import delete_project
+from .facets import facets
+from .fuzzy import names
+from .matching import suggest_team
 from .mixin import PageTitleMixin as PtM
+from .search import suggestions
+# noinspection PyUnresolvedReferences
+from accounts.mixins import ConditionalGetMixin as CgM
 # noinspection PyUnresolvedReferences
 from accounts.models import UserApplication
+# noinspection PyUnresolvedReferences
+from accounts.views import DecisionView
 
 
 class ProjectListView(PrM, ListView):
@@ -27,45 +37,118 @@ class ProjectListView(PrM, ListView):
 
     :inherit: - PrefetchRelatedMixin
               - generic.ListView
-    :methods: - get_context_data()
+    :methods: - get_selection()
+              - get_context_data()
               - get_queryset()
+              - sql_queryset() - fallback while the facet index is stale
     """
     template_name = "projects/project_list.html"
     model = models.Project
     context_object_name = "projects"
     prefetch_related = ['positions', ]
+    facet_counts = None
+
+    def get_selection(self):
+        """get_selection method - facet values from the GET parameters
+        :return: - (selection, within, exclude), see FacetIndex.query()"""
+        get = self.request.GET
+        # similar names ("Python dev", "python3") match as well
+        selection = {'position': names.expand(get.getlist('filter')),
+                     'skill': names.expand(get.getlist('skill')),
+                     'state': get.getlist('state')}
+        within, exclude = {}, {}
+        user = self.request.user
+        if get.get('for_you') and user.is_authenticated:
+            within['skill'] = names.expand(user.profile_skills.values_list(
+                'name', flat=True))
+            exclude['owner'] = [user.pk]
+        return selection, within, exclude
+
+    def toggle_query(self, key, value):
+        query = self.request.GET.copy()
+        values = query.getlist(key)
+        if value in values:
+            values.remove(value)
+        else:
+            values.append(value)
+        query.setlist(key, values)
+        return query.urlencode()
 
     def get_context_data(self, **kwargs):
         context = super(ProjectListView, self).get_context_data(**kwargs)
-        # noinspection PyUnresolvedReferences
-        positions = models.Position.objects.exclude(apply__status=True)
-        context['positions_list'] = positions.values('name').distinct()
-        context['selected'] = self.request.GET.get('filter')
+        counts = self.facet_counts
+        if counts is not None:
+            open_names = sorted(name for name, count in
+                                counts['open'].items() if count)
+        else:
+            # noinspection PyUnresolvedReferences
+            positions = models.Position.objects.open().filter(
+                project__is_deleted=False)
+            open_names = [position['name'] for position in
+                          positions.values('name').distinct()]
+        context['positions_list'] = [
+            {'name': name,
+             'count': counts['open'].get(name, 0) if counts else None,
+             'query': self.toggle_query('filter', name)}
+            for name in open_names]
+        context['states_list'] = [
+            {'name': state,
+             'count': counts['state'].get(state, 0) if counts else None,
+             'query': self.toggle_query('state', state)}
+            for state in ('open', 'filled')]
+        context['selected'] = self.request.GET.getlist('filter')
+        context['states_selected'] = self.request.GET.getlist('state')
         return context
 
     def get_queryset(self):
-        user_skills = None
         # noinspection PyUnresolvedReferences
         queryset = super().get_queryset()
-        user = self.request.user
-        # import pdb; pdb.set_trace()
-
-        if str(user) != 'AnonymousUser':
-            user_skills = user.profile_skills.all().values('name')
-            user_skills = [skill['name'] for skill in user_skills.values()]
-        for_you = self.request.GET.get('for_you')
+        selection, within, exclude = self.get_selection()
+        result = facets.query(selection, within, exclude,
+                              count={'open': 'position', 'state': 'state'})
+        if result is None:
+            # the joins of the fallback would restrict the counts
+            queryset = models.Project.objects.filter(pk__in=self.sql_queryset(
+                queryset, selection, within, exclude).values('pk'))
+        else:
+            ids, self.facet_counts = result
+            if any(selection.values()) or within or exclude:
+                queryset = queryset.filter(pk__in=ids)
         term = self.request.GET.get('q')
-        selected_filter = self.request.GET.get('filter')
-        if for_you:
-            queryset = queryset.filter(Q(
-                positions__skill__name__in=user_skills)).exclude(
-                user=self.request.user).distinct()
         if term:
             queryset = queryset.filter(Q(title__icontains=term) |
                                        Q(description__icontains=term))
-        if selected_filter:
-            queryset = queryset.filter(Q(positions__name=selected_filter))
-        return queryset
+        return queryset.with_counts()
+
+    @staticmethod
+    def sql_queryset(queryset, selection, within, exclude):
+        distinct = False
+        if within.get('skill') is not None:
+            queryset = queryset.filter(Q(
+                positions__skill__name__in=within['skill']))
+            distinct = True
+        if exclude.get('owner'):
+            queryset = queryset.exclude(user__in=exclude['owner'])
+        if selection['position']:
+            queryset = queryset.filter(
+                positions__name__in=selection['position'])
+            distinct = True
+        if selection['skill']:
+            queryset = queryset.filter(
+                positions__skill__name__in=selection['skill'])
+            distinct = True
+        states = set(selection['state'])
+        if states == {'open'}:
+            queryset = queryset.filter(positions__is_filled=False)
+            distinct = True
+        elif states == {'filled'}:
+            queryset = queryset.filter(positions__isnull=False).exclude(
+                positions__is_filled=False)
+            distinct = True
+        elif states:
+            queryset = queryset.filter(positions__isnull=False)
+            distinct = True
+        return queryset.distinct() if distinct else queryset
 
 
 class ProjectCreateView(LrM, CreateView):
@@ -185,27 +268,46 @@ class ProjectEditView(LrM, PtM, UpdateView):
         return HttpResponseRedirect(reverse_lazy('projects:edit'))
 
 
-class ProjectDetailView(PrM, DetailView):
+class ProjectDetailView(CgM, PrM, DetailView):
     """Project Detail view
     :url:
     project/(?P<pk>\d+)/$
 
-    :inherit: - PrM (PrefetchRelatedMixin)
+    :inherit: - CgM (ConditionalGetMixin)
+              - PrM (PrefetchRelatedMixin)
               - generic.DetailView
-    :methods: - get_context_data()
+    :methods: - get_validators()
+              - get_context_data()
     """
     model = models.Project
     context_object_name = "project"
     template_name = "projects/project.html"
     prefetch_related = ['positions', 'user', 'positions__apply']
 
+    def get_validators(self):
+        pk = self.kwargs.get('pk')
+        # noinspection PyUnresolvedReferences
+        versions = models.Project.objects.filter(pk=pk).values_list(
+            'updated_at', 'user__updated_at', 'neighbours_at').first()
+        if versions is None:
+            return None
+        versions = [value for value in versions if value is not None]
+        applied = []
+        if self.request.user.is_authenticated:
+            # noinspection PyUnresolvedReferences
+            applied = sorted(UserApplication.objects.filter(
+                project_id=pk, applicant=self.request.user).values_list(
+                'position_id', flat=True))
+        return ([value.isoformat() for value in versions] + applied,
+                max(versions))
+
     def get_context_data(self, **kwargs):
         user = self.request.user
         context = super(ProjectDetailView, self).get_context_data(**kwargs)
         # noinspection PyUnresolvedReferences
         positions = models.Position.objects.all()
         context['positions'] = positions.filter(
-            project=context['project']).exclude(apply__status=True)
+            project=context['project']).open()
         if str(user) != "AnonymousUser":
             # noinspection PyUnresolvedReferences
             context['applied'] = positions.filter(
@@ -217,6 +319,10 @@ class ProjectDetailView(PrM, DetailView):
                 project=context['project']
             )
         # print(dir(context['applied'].values))
+        # noinspection PyUnresolvedReferences
+        context['related'] = models.ProjectNeighbour.objects.filter(
+            project=context['project'], neighbour__is_deleted=False
+        ).select_related('neighbour').order_by('rank')
         return context
 
 
@@ -228,6 +334,7 @@ class ProjectDeleteView(LrM, DeleteView):
     :inherit: - LrM (loginRequiredMixin)
               - generic.DeleteView
     :methods: - get_object()
+              - delete()
     """
     model = models.Project
     form_class = forms.ProjectForm
@@ -241,6 +348,91 @@ class ProjectDeleteView(LrM, DeleteView):
             raise Http404('You are not allowed to delete!')
         return project
 
+    def delete(self, request, *args, **kwargs):
+        """delete method - hides the project, its positions and
+        applications are deleted by a background DeletionJob"""
+        self.object = self.get_object()
+        delete_project(self.object)
+        return HttpResponseRedirect(self.get_success_url())
+
+
+class TeamView(LrM, PtM, DetailView):
+    """Team view - suggested team for the open positions, the owner can
+    accept it in one go
+    :url:
+    project/(?P<pk>\d+)/team/$
+
+    :inherit: - LrM (loginRequiredMixin)
+              - PtM (PageTitleMixin)
+              - generic.DetailView
+    :methods: - get_page_title()
+              - get_object()
+              - get_context_data()
+              - post()
+    """
+    model = models.Project
+    template_name = "projects/project_team.html"
+    context_object_name = "project"
+
+    def get_page_title(self):
+        return "Team for {}".format(self.object)
+
+    def get_object(self, queryset=None):
+        project = super().get_object(queryset)
+        if project.user != self.request.user:
+            raise Http404('You are not allowed to see the applicants!')
+        return project
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update(suggest_team(self.object))
+        return context
+
+    def post(self, request, *args, **kwargs):
+        """post method - accepts the posted position:applicant pairs that
+        are still pending applications for an open position"""
+        self.object = project = self.get_object()
+        pairs = set()
+        for value in request.POST.getlist('assign'):
+            position_pk, _, applicant_pk = value.partition(':')
+            if position_pk.isdigit() and applicant_pk.isdigit():
+                pairs.add((int(position_pk), int(applicant_pk)))
+        # noinspection PyUnresolvedReferences
+        pending = UserApplication.objects.filter(
+            project=project, position__is_filled=False,
+            status__isnull=True).select_related('applicant', 'position')
+        accepted = 0
+        for application in pending:
+            if (application.position_id, application.applicant_id) in pairs:
+                if DecisionView.decide(application, True) is None:
+                    accepted += 1
+        messages.success(request, '{} applicants accepted.'.format(accepted))
+        return HttpResponseRedirect(reverse('projects:team',
+                                            kwargs={'pk': project.pk}))
+
+
+class FeedView(LrM, PtM, TemplateView):
+    """Feed view - new positions matching the user's skills, newest first
+    :url:
+    ^feed/$
+
+    :inherit: - LrM (loginRequiredMixin)
+              - PtM (PageTitleMixin)
+              - generic.TemplateView
+    :methods: - get_context_data()
+    """
+    template_name = "projects/feed.html"
+    page_title = "Your feed"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        before = self.request.GET.get('before', '')
+        entries, cursor = feed.read(
+            self.request.user, int(before) if before.isdigit() else None)
+        context['entries'] = entries
+        context['before'] = cursor
+        return context
+
 
 class ApplyView(LrM, TemplateView):
     """Apply view
@@ -259,11 +451,25 @@ class ApplyView(LrM, TemplateView):
         project = get_object_or_404(models.Project, pk=project_pk)
         # noinspection PyUnresolvedReferences
         position = get_object_or_404(models.Position, pk=position_pk)
-        obj, _ = UserApplication.objects.get_or_create(
+        UserApplication.objects.get_or_create(
             applicant=user,
             project=project,
             position=position,
             defaults={'applicant': user, 'project': project, 'position': position})
-        obj.save()
         return HttpResponseRedirect(reverse_lazy('projects:detail',
                                                  kwargs={'pk': project.id}))
+
+
+class SuggestView(View):
+    """Suggest view - typeahead for the search box
+    :url:
+    ^suggest/$
+
+    :inherit: - generic.View
+    :methods: - get()
+    """
+    limit = 8
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse({'suggestions': suggestions.suggest(
+            request.GET.get('q', ''), self.limit)})
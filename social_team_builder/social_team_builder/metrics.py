@@ -0,0 +1,378 @@
+"""Runtime metrics in the Prometheus text format.
+
+Every process adds to its own memory-mapped file in METRICS_DIR (named
+after its pid), so recording takes no lock shared with other processes and
+no system call: a dict lookup and a float written into the mapping. The
+metrics view reads the files of every process, past and present, and sums
+them, so counters and histograms stay correct across worker restarts.
+
+A file is an 8 byte header (bytes used) followed by entries of a 4 byte key
+length, the utf-8 key padded to 8 bytes and a float64 value. Histograms
+store the count of each bucket and are made cumulative on export.
+"""
+import fcntl
+import glob
+import hmac
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache.backends.filebased import FileBasedCache
+from django.db import connection
+from django.http import Http404, HttpResponse
+
+INITIAL_SIZE = 64 * 1024
+HEADER = struct.Struct('<II')
+LENGTH = struct.Struct('<I')
+VALUE = struct.Struct('<d')
+SEPARATOR = '\x1f'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+
+class MmapDict:
+    """Memory-mapped dict - float values of one process, see the module
+    docstring for the layout
+    :methods: - add()
+              - read() - staticmethod, the entries of any file
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.offsets = {}
+        self.file = open(path, 'a+b')
+        size = os.fstat(self.file.fileno()).st_size
+        if size < INITIAL_SIZE:
+            self.file.truncate(INITIAL_SIZE)
+            size = INITIAL_SIZE
+        self.map = mmap.mmap(self.file.fileno(), size)
+        self.used = HEADER.unpack_from(self.map, 0)[0] or HEADER.size
+        for key, offset, _ in self.entries(self.map, self.used):
+            self.offsets[key] = offset
+
+    @staticmethod
+    def entries(data, used):
+        position = HEADER.size
+        while position < used:
+            length = LENGTH.unpack_from(data, position)[0]
+            key_start = position + LENGTH.size
+            key = bytes(data[key_start:key_start + length]).decode()
+            offset = position + padded(LENGTH.size + length)
+            yield key, offset, VALUE.unpack_from(data, offset)[0]
+            position = offset + VALUE.size
+
+    @classmethod
+    def read(cls, path):
+        with open(path, 'rb') as source:
+            data = source.read()
+        if len(data) < HEADER.size:
+            return
+        yield from ((key, value) for key, _, value in
+                    cls.entries(data, HEADER.unpack_from(data, 0)[0]))
+
+    def add(self, key, amount):
+        with self.lock:
+            offset = self.offsets.get(key)
+            if offset is None:
+                offset = self.append(key)
+            VALUE.pack_into(self.map, offset,
+                            VALUE.unpack_from(self.map, offset)[0] + amount)
+
+    def append(self, key):
+        encoded = key.encode()
+        offset = self.used + padded(LENGTH.size + len(encoded))
+        end = offset + VALUE.size
+        if end > len(self.map):
+            size = len(self.map)
+            while size < end:
+                size *= 2
+            self.map.close()
+            self.file.truncate(size)
+            self.map = mmap.mmap(self.file.fileno(), size)
+        LENGTH.pack_into(self.map, self.used, len(encoded))
+        self.map[self.used + LENGTH.size:
+                 self.used + LENGTH.size + len(encoded)] = encoded
+        VALUE.pack_into(self.map, offset, 0.0)
+        self.used = end
+        # the entry is complete before a reader can see it
+        HEADER.pack_into(self.map, 0, self.used, 0)
+        self.offsets[key] = offset
+        return offset
+
+
+def padded(size):
+    return (size + 7) // 8 * 8
+
+
+_store = None
+_store_pid = None
+
+
+def store():
+    """store function - this process' file, a forked worker opens its own"""
+    global _store, _store_pid
+    pid = os.getpid()
+    if _store_pid != pid:
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        _store = MmapDict(os.path.join(settings.METRICS_DIR,
+                                       '{}.db'.format(pid)))
+        _store_pid = pid
+    return _store
+
+
+def label_text(names, values):
+    return ','.join('{}="{}"'.format(name, str(value).replace(
+        '\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in zip(names, values))
+
+
+REGISTRY = {}
+
+
+class Metric:
+    """Metric - base of Counter and Histogram
+    :argument: - name, documentation, labels - label names
+    :methods: - key() - file key of a series, cached
+    """
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.keys = {}
+        REGISTRY[name] = self
+
+    def key(self, suffix, values, names=()):
+        cached = self.keys.get((suffix, values))
+        if cached is None:
+            cached = self.keys[(suffix, values)] = SEPARATOR.join(
+                (self.name, suffix,
+                 label_text(self.labels + names, values)))
+        return cached
+
+
+class Counter(Metric):
+    """Counter
+    :inherit: - Metric
+    :methods: - inc()
+    """
+    kind = 'counter'
+
+    def inc(self, amount=1, *values):
+        if settings.METRICS_ENABLED:
+            store().add(self.key('_total', values), amount)
+
+
+class Histogram(Metric):
+    """Histogram
+    :inherit: - Metric
+    :methods: - observe()
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(),
+                 buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, amount, *values):
+        if not settings.METRICS_ENABLED:
+            return
+        target = store()
+        bucket = bisect_left(self.buckets, amount)
+        target.add(self.key('_bucket', values + (bucket,), ('bucket',)), 1)
+        target.add(self.key('_sum', values), amount)
+        target.add(self.key('_count', values), 1)
+
+    @contextmanager
+    def time(self, *values):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *values)
+
+
+REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'Request latency by url name.',
+    ('view', 'method', 'status'))
+DB_QUERIES = Counter('db_queries', 'Database queries by url name.',
+                     ('view',))
+DB_SECONDS = Counter('db_query_seconds', 'Database query time by url name.',
+                     ('view',))
+CACHE_REQUESTS = Counter('cache_requests', 'Cache lookups by result.',
+                         ('cache', 'result'))
+JOB_SECONDS = Histogram('job_duration_seconds',
+                        'Image and mail job durations.', ('job', 'result'))
+
+
+@contextmanager
+def timed(job):
+    """timed function - records the duration of a job, and whether it
+    raised"""
+    start = time.perf_counter()
+    result = 'error'
+    try:
+        yield
+        result = 'ok'
+    finally:
+        JOB_SECONDS.observe(time.perf_counter() - start, job, result)
+
+
+class MetricsMiddleware:
+    """Metrics middleware - latency and database queries of every request,
+    by resolved url name. Goes first, the other middleware counts too
+    :methods: - __call__()
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+        queries = [0, 0.0]
+
+        def record(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries[0] += 1
+                queries[1] += time.perf_counter() - started
+
+        start = time.perf_counter()
+        with connection.execute_wrapper(record):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else 'unresolved'
+        method = request.method if request.method in METHODS else 'other'
+        REQUEST_SECONDS.observe(elapsed, view, method,
+                                '{}xx'.format(response.status_code // 100))
+        if queries[0]:
+            DB_QUERIES.inc(queries[0], view)
+            DB_SECONDS.inc(queries[1], view)
+        return response
+
+
+class MeteredFileBasedCache(FileBasedCache):
+    """Metered file based cache - counts hits and misses (get_many and
+    get_or_set go through get)
+    :inherit: - FileBasedCache
+    :methods: - get()
+              - incr() - atomic across the processes of the host
+    """
+    missing = object()
+
+    def __init__(self, directory, params):
+        super().__init__(directory, params)
+        self.alias = params.get('OPTIONS', {}).get('ALIAS', 'default')
+
+    def incr(self, key, delta=1, version=None):
+        # FileBasedCache reads and writes back, the index versions
+        # (projects/indexes.py) count on no increment getting lost
+        self._createdir()
+        with open(os.path.join(self._dir, 'incr.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            return super().incr(key, delta, version)
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, self.missing, version)
+        if value is self.missing:
+            CACHE_REQUESTS.inc(1, self.alias, 'miss')
+            return default
+        CACHE_REQUESTS.inc(1, self.alias, 'hit')
+        return value
+
+
+def collect():
+    """collect function - the sum of every process' values by key"""
+    totals = {}
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.db')):
+        try:
+            for key, value in MmapDict.read(path):
+                totals[key] = totals.get(key, 0.0) + value
+        except (OSError, struct.error, UnicodeDecodeError):
+            # a file being created
+            continue
+    return totals
+
+
+def render(totals):
+    """render function - Prometheus text exposition format"""
+    series = {}
+    for key, value in totals.items():
+        name, suffix, labels = key.split(SEPARATOR)
+        series.setdefault(name, []).append((suffix, labels, value))
+    lines = []
+    for name in sorted(series):
+        metric = REGISTRY.get(name)
+        if metric is None:
+            continue
+        lines.append('# HELP {} {}'.format(name, metric.documentation))
+        lines.append('# TYPE {} {}'.format(name, metric.kind))
+        if metric.kind == 'histogram':
+            lines.extend(histogram_lines(metric, series[name]))
+            continue
+        for suffix, labels, value in sorted(series[name]):
+            lines.append('{}{}{{{}}} {}'.format(name, suffix, labels,
+                                                 number(value)))
+    return '\n'.join(lines) + '\n'
+
+
+def histogram_lines(metric, rows):
+    counts, sums = {}, {}
+    for suffix, labels, value in rows:
+        if suffix == '_bucket':
+            labels, _, bucket = labels.rpartition(',')
+            bucket = int(bucket.split('=')[1].strip('"'))
+            counts.setdefault(labels, [0.0] * (len(metric.buckets) + 1))
+            counts[labels][bucket] += value
+        elif suffix == '_sum':
+            sums[labels] = value
+    lines = []
+    for labels in sorted(counts):
+        prefix = labels + ',' if labels else ''
+        cumulative = 0.0
+        bounds = [number(bound) for bound in metric.buckets] + ['+Inf']
+        for bound, count in zip(bounds, counts[labels]):
+            cumulative += count
+            lines.append('{}_bucket{{{}le="{}"}} {}'.format(
+                metric.name, prefix, bound, number(cumulative)))
+        lines.append('{}_sum{{{}}} {}'.format(metric.name, labels,
+                                              number(sums.get(labels, 0))))
+        lines.append('{}_count{{{}}} {}'.format(metric.name, labels,
+                                                number(cumulative)))
+    return lines
+
+
+def number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def allowed(request):
+    """allowed function - the METRICS_TOKEN bearer token. Without a token
+    the METRICS_ALLOWED_IPS with DEBUG only: behind a proxy on the same host
+    every client comes from 127.0.0.1"""
+    token = settings.METRICS_TOKEN
+    if token:
+        return hmac.compare_digest(
+            request.META.get('HTTP_AUTHORIZATION', '').encode(),
+            'Bearer {}'.format(token).encode())
+    return settings.DEBUG and \
+        request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+
+
+def metrics_view(request):
+    """metrics_view function - internal, see allowed()"""
+    if not allowed(request):
+        raise Http404('Not found')
+    return HttpResponse(render(collect()),
+                        content_type='text/plain; version=0.0.4; '
+                                     'charset=utf-8')
@@ -0,0 +1,184 @@
+"""Preforking WSGI server.
+
+The parent imports wsgi.py, which sets Django up and warms it up (see
+startup.py). It then binds the listening socket, closes its database
+connections and forks the workers, which share the warm memory
+copy-on-write. A worker opens its database connections right after the
+fork and serves one request at a time from the shared socket. After
+max_requests requests it exits and the parent forks a replacement. The
+parent refreshes the indexes first, so the replacement starts warm too.
+
+SIGTERM and SIGINT stop the workers after their current request. SIGHUP
+replaces every worker the same way (new settings or code need a restart of
+the parent). Slow clients and TLS are left to the front-end server (nginx),
+requests are plain HTTP/1.0.
+"""
+import logging
+import os
+import signal
+import socket
+import time
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+from django.db import DatabaseError, connections
+
+from .startup import warm_indexes
+
+logger = logging.getLogger(__name__)
+
+BACKLOG = 128
+# a worker exiting sooner is restarted after a pause, not in a loop
+MIN_LIFETIME = 1.0
+
+
+class RequestHandler(WSGIRequestHandler):
+    """Request handler - logs through logging instead of stderr
+    :inherit: - WSGIRequestHandler
+    :methods: - log_message()
+    """
+    def log_message(self, format, *args):
+        logger.info('%s %s', self.address_string(), format % args)
+
+
+class WorkerServer(WSGIServer):
+    """Worker server - serves from the listening socket of the parent
+    :inherit: - WSGIServer
+    :methods: - get_request()
+              - process_request() - counts the requests
+    """
+    timeout = 1
+
+    def __init__(self, listener, application):
+        super().__init__(listener.getsockname()[:2], RequestHandler,
+                         bind_and_activate=False)
+        self.socket.close()
+        self.socket = listener
+        host, port = listener.getsockname()[:2]
+        self.server_name = socket.getfqdn(host)
+        self.server_port = port
+        self.setup_environ()
+        self.set_app(application)
+        self.handled = 0
+
+    def get_request(self):
+        # every worker wakes up for a connection, the others get
+        # BlockingIOError from the non-blocking listener
+        request, address = self.socket.accept()
+        request.setblocking(True)
+        return request, address
+
+    def process_request(self, request, client_address):
+        self.handled += 1
+        super().process_request(request, client_address)
+
+
+def listen(bind):
+    """listen function - listening socket for 'host:port' ('[::1]:port'
+    for IPv6)"""
+    host, _, port = bind.rpartition(':')
+    host = host.strip('[]') or '127.0.0.1'
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    listener = socket.socket(family, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, int(port)))
+    listener.listen(BACKLOG)
+    return listener
+
+
+def work(listener, application, max_requests):
+    """work function - the worker loop, until SIGTERM or max_requests"""
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *args: stopping.append(True))
+    # the parent stops the workers on ^C
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_DFL)
+    for connection in connections.all():
+        connection.ensure_connection()
+    listener.setblocking(False)
+    server = WorkerServer(listener, application)
+    while not stopping and not (max_requests and
+                                server.handled >= max_requests):
+        server.handle_request()
+    connections.close_all()
+
+
+class Arbiter:
+    """Arbiter - forks the workers and replaces the ones exiting
+    :argument: - application - warmed up WSGI application
+               - bind - 'host:port'
+               - workers, max_requests - 0 for no limit
+    :methods: - run()
+              - spawn()
+              - refresh()
+              - stop() - SIGTERM, SIGINT
+              - reload() - SIGHUP
+    """
+    def __init__(self, application, bind, workers, max_requests):
+        self.application = application
+        self.bind = bind
+        self.count = workers
+        self.max_requests = max_requests
+        self.workers = {}
+        self.running = True
+        self.listener = None
+
+    def run(self):
+        self.listener = listen(self.bind)
+        connections.close_all()
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGHUP, self.reload)
+        logger.info('Listening on %s with %d workers', self.bind, self.count)
+        for _ in range(self.count):
+            self.spawn()
+        while self.workers:
+            try:
+                pid, _ = os.wait()
+            except ChildProcessError:
+                break
+            started = self.workers.pop(pid, None)
+            if not self.running or started is None:
+                continue
+            if time.monotonic() - started < MIN_LIFETIME:
+                time.sleep(MIN_LIFETIME)
+            self.refresh()
+            self.spawn()
+        self.listener.close()
+
+    def spawn(self):
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = time.monotonic()
+            return pid
+        status = 0
+        try:
+            work(self.listener, self.application, self.max_requests)
+        except BaseException:
+            logger.exception('Worker %d failed', os.getpid())
+            status = 1
+        finally:
+            os._exit(status)
+
+    def refresh(self):
+        """refresh method - rebuilds the indexes other processes changed
+        since the warm-up, before forking from them again"""
+        try:
+            warm_indexes()
+        except DatabaseError as error:
+            logger.warning('Indexes not refreshed: %s', error)
+        finally:
+            connections.close_all()
+
+    def signal_workers(self):
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                self.workers.pop(pid, None)
+
+    def stop(self, signum=None, frame=None):
+        self.running = False
+        self.signal_workers()
+
+    def reload(self, signum=None, frame=None):
+        self.signal_workers()
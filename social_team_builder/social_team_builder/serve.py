@@ -0,0 +1,197 @@
+"""Static and media file serving.
+
+Static files are served from STATIC_ROOT as built by collectstatic: the
+precompressed variant matching Accept-Encoding is picked and hashed names
+get a far-future Cache-Control. Media files get ETag/Last-Modified
+validation, byte Range support and an optional X-Sendfile/X-Accel-Redirect
+handoff to the front-end server.
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.contrib.staticfiles.views import serve as finders_serve
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .storage import BLOB_NAME
+
+CHUNK_SIZE = 64 * 1024
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.')
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def read_chunks(path, start, length):
+    with open(path, 'rb') as source:
+        source.seek(start)
+        while length > 0:
+            chunk = source.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+def parse_range(header, size):
+    """parse_range function - a single 'bytes=' range
+    :return: - (start, end) inclusive, None to serve the whole file,
+               False when the range can't be satisfied"""
+    match = RANGE.match(header.strip())
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        start, end = max(size - int(last), 0), size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def accepted_encodings(header):
+    """accepted_encodings function - the codings of an Accept-Encoding
+    header and their q-values, a coding without one has q=1
+    :return: - dict coding -> q, '*' stands for the codings not listed"""
+    accepted = {}
+    for item in header.split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value.strip())
+                except ValueError:
+                    quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+def pick_encoding(header, full_path):
+    """pick_encoding function - the precompressed variant with the highest
+    q-value, br before gzip on a tie; q=0 refuses a coding
+    :return: - (encoding, suffix), (None, '') for the file itself"""
+    accepted = accepted_encodings(header)
+    best, picked = 0, (None, '')
+    for encoding, suffix in ENCODINGS:
+        quality = accepted.get(encoding, accepted.get('*', 0))
+        if quality > best and os.path.isfile(full_path + suffix):
+            best, picked = quality, (encoding, suffix)
+    return picked
+
+
+def resolve(document_root, path):
+    try:
+        full_path = safe_join(document_root, path)
+    except (SuspiciousFileOperation, ValueError):
+        raise Http404('"{}" does not exist'.format(path))
+    if not os.path.isfile(full_path):
+        raise Http404('"{}" does not exist'.format(path))
+    return full_path
+
+
+def serve_file(request, full_path, cache_control, encodings=False,
+               sendfile=None):
+    """serve_file function
+    :param: - request
+            - full_path - resolved path of the file
+            - cache_control - Cache-Control header value
+            - encodings - look for precompressed .br/.gz variants
+            - sendfile - 'x-sendfile' or 'x-accel-redirect' handoff"""
+    content_type, _ = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+    encoding, suffix = None, ''
+    if encodings:
+        encoding, suffix = pick_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''), full_path)
+    path = full_path + suffix
+    stat = os.stat(path)
+    etag = quote_etag('{:x}-{:x}{}'.format(int(stat.st_mtime), stat.st_size,
+                                         suffix))
+    last_modified = int(stat.st_mtime)
+
+    response = get_conditional_response(request, etag=etag,
+                                        last_modified=last_modified)
+    if response is None:
+        if sendfile:
+            response = sendfile_response(path)
+        else:
+            response = file_response(request, path, stat.st_size, etag)
+        if response.status_code in (200, 206):
+            response['Content-Type'] = content_type
+            if encoding:
+                response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = cache_control
+    if encodings:
+        patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+def file_response(request, path, size, etag):
+    byte_range = None
+    header = request.META.get('HTTP_RANGE')
+    if header and request.META.get('HTTP_IF_RANGE', etag) == etag:
+        byte_range = parse_range(header, size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = 'bytes */{}'.format(size)
+        return response
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1 if size else 0
+    response = StreamingHttpResponse(
+        read_chunks(path, start, length),
+        status=206 if byte_range else 200)
+    response['Content-Length'] = str(length)
+    response['Accept-Ranges'] = 'bytes'
+    if byte_range:
+        response['Content-Range'] = 'bytes {}-{}/{}'.format(start, end, size)
+    return response
+
+
+def sendfile_response(path):
+    """sendfile_response function - the front-end server reads the file"""
+    response = HttpResponse()
+    if settings.MEDIA_SENDFILE == 'x-accel-redirect':
+        relative = os.path.relpath(path, settings.MEDIA_ROOT)
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + \
+            relative.replace(os.sep, '/')
+    else:
+        response['X-Sendfile'] = path
+    return response
+
+
+def static_view(request, path):
+    """static_view function - STATIC_ROOT with precompressed variants,
+    the finders (app and STATICFILES_DIRS) serve files in DEBUG"""
+    if settings.DEBUG and not settings.STATIC_ROOT_SERVE:
+        return finders_serve(request, path)
+    full_path = resolve(settings.STATIC_ROOT, path)
+    if HASHED_NAME.search(os.path.basename(path)):
+        cache_control = 'public, max-age=31536000, immutable'
+    else:
+        cache_control = settings.STATIC_CACHE_CONTROL
+    return serve_file(request, full_path, cache_control, encodings=True)
+
+
+def media_view(request, path):
+    """media_view function - user uploads from MEDIA_ROOT, content-addressed
+    names (see storage.py) never change and are cached for good"""
+    full_path = resolve(settings.MEDIA_ROOT, path)
+    if BLOB_NAME.search(path):
+        cache_control = 'public, max-age=31536000, immutable'
+    else:
+        cache_control = settings.MEDIA_CACHE_CONTROL
+    return serve_file(request, full_path, cache_control,
+                      sendfile=settings.MEDIA_SENDFILE)
@@ -44,6 +44,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'social_team_builder.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -86,6 +87,19 @@ DATABASES = {
 }
 
 
+# Cache
+# The file based cache is shared by all worker processes, it holds the
+# per-user notification version keys. Hits and misses are counted (see
+# social_team_builder/metrics.py)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'social_team_builder.metrics.MeteredFileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'django_cache'),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
 
@@ -126,12 +140,31 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'assets'),
 ]
+# collectstatic output - hashed names with .gz (and .br) variants
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+STATICFILES_STORAGE = \
+    'social_team_builder.storage.CompressedManifestStaticFilesStorage'
+# Serve STATIC_ROOT even with DEBUG on (the finders are used otherwise)
+STATIC_ROOT_SERVE = False
+# Cache-Control for static files without a hash in the name
+STATIC_CACHE_CONTROL = 'public, max-age=3600'
 
 # Local IP address to run django-debug-toolbar (version==1.9.1) locally
 INTERNAL_IPS = ('127.0.0.1',)
 
-MEDIA_ROOT = os.path.join(BASE_DIR, 'assets')
-MEDIA_URL = '/assets/'
+# User uploads, kept apart from the static assets
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+MEDIA_URL = '/media/'
+# Content-addressed storage (see storage.py) - every saved file is named
+# after its sha256, identical files are stored once
+DEFAULT_FILE_STORAGE = 'social_team_builder.storage.ContentAddressedStorage'
+# Files saved before the content-addressed storage keep their names, clients
+# revalidate them with the ETag (content-addressed names are immutable)
+MEDIA_CACHE_CONTROL = 'public, max-age=0, must-revalidate'
+# None, 'x-sendfile' (Apache/lighttpd) or 'x-accel-redirect' (nginx)
+MEDIA_SENDFILE = None
+# nginx internal location mapped to MEDIA_ROOT for X-Accel-Redirect
+MEDIA_ACCEL_PREFIX = '/protected-media/'
 
 LOGIN_REDIRECT_URL = "projects:project_list"
 
@@ -139,3 +172,94 @@ EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
 AUTH_USER_MODEL = "accounts.User"
+
+# Shared cache lifetime (seconds) of anonymous project and profile pages,
+# see ConditionalGetMixin
+CONDITIONAL_PUBLIC_MAX_AGE = 60
+
+# Notification polling (seconds) - long-poll timeout cap, cache check
+# interval, Server-Sent Events connection length and keep-alive interval
+NOTIFICATIONS_POLL_TIMEOUT = 25
+NOTIFICATIONS_POLL_INTERVAL = 1
+NOTIFICATIONS_SSE_DURATION = 60
+NOTIFICATIONS_SSE_KEEPALIVE = 15
+# The badge asks every NOTIFICATIONS_POLL_EVERY seconds with a request that
+# returns at once. Streams and long-polls hold a worker each, turn them on
+# only behind threaded or async workers (prefork.py serves one request at a
+# time per worker)
+NOTIFICATIONS_PUSH = False
+NOTIFICATIONS_POLL_EVERY = 30
+
+# Background deletion - rows per DELETE statement, pause (seconds) between
+# batches so that requests get the write lock in between, and whether a job
+# starts in a thread right after the soft delete (run_deletions picks up
+# the jobs a restart interrupted)
+DELETION_BATCH_SIZE = 500
+DELETION_PAUSE = 0.01
+DELETION_IN_BACKGROUND = True
+
+# Retention (see accounts/retention.py) - age in days after which decided
+# applications are archived, read notifications purged and never activated
+# accounts deleted, and the batch size and time budget (seconds) per batch
+RETENTION_APPLICATION_DAYS = 365
+RETENTION_NOTIFICATION_DAYS = 90
+RETENTION_UNACTIVATED_DAYS = 14
+RETENTION_BATCH_SIZE = 500
+RETENTION_BATCH_SECONDS = 0.2
+
+# Fuzzy skill and position name matching (see projects/fuzzy.py) - minimum
+# trigram similarity of the names the project filters also match
+NAME_MATCH_THRESHOLD = 0.5
+
+# Related projects panel - neighbours kept per project (compute_neighbours)
+RELATED_PROJECTS = 5
+
+# Project feed (see projects/feed.py) - users one new position may be pushed
+# to, users above which a skill is read on demand instead of pushed, how
+# long (seconds) the list of those skills is cached, whether fan-out runs
+# in a worker thread after the commit and how many fan-outs may wait for it
+# (a committing request waits when they're all taken)
+FEED_FANOUT_LIMIT = 2000
+FEED_HOT_SKILL_USERS = 1000
+FEED_HOT_SKILLS_TIMEOUT = 300
+FEED_IN_BACKGROUND = True
+FEED_QUEUE_SIZE = 100
+FEED_PAGE_SIZE = 20
+
+# Digest emails (see accounts/digest.py) - users per batch, one mail
+# connection each, and the address the links in the emails start with
+DIGEST_BATCH_SIZE = 200
+DIGEST_SITE_URL = 'http://localhost:8000'
+
+# Edited avatars (see accounts/avatars.py) - media directory of the
+# rendered derivatives, the uploaded originals are never rewritten
+AVATAR_CACHE_DIR = 'avatar_cache'
+
+# Uploads are streamed to a temporary file, avatar uploads are skipped past
+# AVATAR_MAX_BYTES (see accounts/uploads.py). Images over AVATAR_MAX_PIXELS
+# are rejected from their header, larger sides are scaled to AVATAR_MAX_SIDE
+FILE_UPLOAD_HANDLERS = ['accounts.uploads.LimitedUploadHandler']
+AVATAR_MAX_BYTES = 5 * 1024 * 1024
+AVATAR_MAX_PIXELS = 40 * 10 ** 6
+AVATAR_MAX_SIDE = 1024
+AVATAR_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+
+# Metrics (see social_team_builder/metrics.py) - every worker process writes
+# to its own memory-mapped file in METRICS_DIR, /metrics sums them. Clear
+# the directory when the server is restarted after a deploy, for the
+# counters to start over. The scraper sends `Authorization: Bearer
+# <METRICS_TOKEN>`; without a token /metrics answers the addresses in
+# METRICS_ALLOWED_IPS with DEBUG on only, behind a proxy (nginx in front of
+# prefork.py) every client has the proxy's address
+METRICS_ENABLED = True
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(BASE_DIR, 'metrics'))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = INTERNAL_IPS
+
+# Worker startup (see social_team_builder/startup.py and prefork.py) -
+# whether wsgi.py loads templates, url confs and indexes before the first
+# request, the workers of `manage.py serve_prefork`, and the requests after
+# which a worker is replaced by a fresh (warm) fork of the parent
+WARM_UP = True
+PREFORK_WORKERS = 4
+PREFORK_MAX_REQUESTS = 5000
@@ -0,0 +1,332 @@
+"""Worker startup: warm-up, readiness and profiling.
+
+warm_up() does up front what the first requests of a worker would otherwise
+pay for. It imports the lazily loaded dependencies, populates the url
+resolvers and compiles every template (the cached loader keeps them when
+DEBUG is off). It also builds the in-memory indexes (projects/indexes.py)
+and fills the content type cache, then closes the database connections
+and freezes the garbage collector's generations (gc.freeze). wsgi.py runs
+it. A preforking server (prefork.py) runs it once in the
+parent, so every worker it forks starts warm. /readyz answers 200 once it
+is done, /healthz as soon as the process serves requests.
+
+profile() starts fresh interpreters with `python -X importtime` (Python
+3.7+) that set Django up, build the WSGI application and serve two requests
+the way a new worker does. Each child marks its phases on stderr, so the
+import tree is split into what django.setup() imports (settings, apps,
+models), what the WSGI handler imports (middleware) and what the first
+request imports (url confs, views, templates and their tag libraries).
+
+The code paths paying for a dependency import it themselves (Pillow in
+accounts/avatars.py, numpy in projects/matching.py, markdown2 in the mark_down
+filters), the tree shows what is left.
+"""
+import gc
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import password_validation
+from django.db import DatabaseError, connection, connections
+from django.forms.renderers import get_default_renderer
+from django.http import HttpResponse
+from django.template import TemplateSyntaxError, engines
+from django.urls import NoReverseMatch, URLResolver, get_resolver, reverse
+
+logger = logging.getLogger(__name__)
+
+PHASES = ('setup', 'wsgi', 'first request', 'second request')
+MARKER = '# phase: '
+CHILD = '''
+import io, json, sys, time
+ready = {}
+def phase(name):
+    sys.stderr.write('# phase: ' + name + '\\n')
+    sys.stderr.flush()
+    ready[name] = time.time()
+phase('setup')
+import django
+django.setup()
+phase('wsgi')
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+statuses = []
+for name in ('first request', 'second request'):
+    phase(name)
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': sys.argv[1],
+        'SCRIPT_NAME': '', 'QUERY_STRING': '', 'SERVER_NAME': sys.argv[2],
+        'SERVER_PORT': '80', 'HTTP_HOST': sys.argv[2],
+        'REMOTE_ADDR': '127.0.0.1', 'wsgi.input': io.BytesIO(),
+        'wsgi.errors': io.StringIO(), 'wsgi.url_scheme': 'http'}
+    response = application(environ, lambda status, headers: statuses.append(
+        status))
+    b''.join(response)
+    response.close()
+ready['done'] = time.time()
+print(json.dumps({'times': ready, 'statuses': statuses}))
+'''
+
+
+class Node:
+    """Import tree node
+    :argument: - name, own and cumulative import time in microseconds
+    """
+    def __init__(self, name, own, cumulative, children=()):
+        self.name = name
+        self.own = own
+        self.cumulative = cumulative
+        self.children = list(children)
+
+
+def parse_importtime(text):
+    """parse_importtime function - `-X importtime` output as import trees
+    by phase. A module is printed after the modules it imported, indented
+    one level deeper
+    :return: - {phase: [root Node]}"""
+    trees = {}
+    phase, pending = None, defaultdict(list)
+    for line in text.splitlines():
+        if line.startswith(MARKER):
+            if phase is not None:
+                trees[phase] = pending[0]
+            phase, pending = line[len(MARKER):], defaultdict(list)
+            continue
+        if not line.startswith('import time:') or '[us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        name = name[1:]
+        level = (len(name) - len(name.lstrip())) // 2
+        pending[level].append(Node(name.strip(), int(own), int(cumulative),
+                                   pending.pop(level + 1, [])))
+    if phase is not None:
+        trees[phase] = pending[0]
+    return trees
+
+
+def run_child(path, host):
+    """run_child function - one cold start
+    :return: - ({'cold start', 'app ready to first request', ... : ms},
+               statuses, import trees)"""
+    environment = dict(os.environ)
+    environment.setdefault('DJANGO_SETTINGS_MODULE',
+                           'social_team_builder.settings')
+    started = time.time()
+    child = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD, path, host],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True, env=environment,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    if child.returncode:
+        raise RuntimeError(child.stderr.strip().splitlines()[-1])
+    result = json.loads(child.stdout.strip().splitlines()[-1])
+    times = result['times']
+    timings = {
+        'interpreter': times['setup'] - started,
+        'setup': times['wsgi'] - times['setup'],
+        'wsgi': times['first request'] - times['wsgi'],
+        'first request': times['second request'] - times['first request'],
+        'second request': times['done'] - times['second request'],
+        'app ready to first response': times['second request'] -
+        times['wsgi'],
+        'cold start': times['second request'] - started,
+    }
+    return ({name: seconds * 1000 for name, seconds in timings.items()},
+            result['statuses'], parse_importtime(child.stderr))
+
+
+def profile(path='/', host='localhost', runs=5):
+    """profile function - `runs` cold starts
+    :return: - (median ms by timing, statuses, import trees of the last
+               run)"""
+    samples = defaultdict(list)
+    statuses, trees = [], {}
+    for _ in range(runs):
+        timings, statuses, trees = run_child(path, host)
+        for name, ms in timings.items():
+            samples[name].append(ms)
+    return ({name: statistics.median(values)
+             for name, values in samples.items()}, statuses, trees)
+
+
+def tree_lines(nodes, min_ms=1.0, depth=3, indent=0):
+    """tree_lines function - the import tree as text, largest first, the
+    imports under min_ms and below depth left out"""
+    lines = []
+    for node in sorted(nodes, key=lambda item: -item.cumulative):
+        if node.cumulative < min_ms * 1000:
+            continue
+        lines.append('{:>9.1f} {:>9.1f}  {}{}'.format(
+            node.cumulative / 1000, node.own / 1000, '  ' * indent,
+            node.name))
+        if indent + 1 < depth:
+            lines.extend(tree_lines(node.children, min_ms, depth,
+                                    indent + 1))
+    return lines
+
+
+ready = threading.Event()
+warming = threading.Lock()
+
+
+def warm_imports():
+    """warm_imports function - the dependencies imported on first use"""
+    import markdown2  # noqa: F401
+    import numpy  # noqa: F401
+    from PIL import Image
+    # the format plugins are imported by the first open()
+    Image.init()
+
+
+def warm_urls(resolver=None):
+    """warm_urls function - populates every resolver, the url confs import
+    the views
+    :return: - number of resolvers"""
+    if resolver is None:
+        # requests reverse through get_resolver(ROOT_URLCONF), code outside
+        # of requests through get_resolver(None), two cached resolvers
+        count = 0
+        for urlconf in (None, settings.ROOT_URLCONF):
+            count += warm_urls(get_resolver(urlconf))
+            warm_namespaces(urlconf)
+        return count
+    # noinspection PyStatementEffect
+    resolver.reverse_dict
+    count = 1
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            count += warm_urls(pattern)
+    return count
+
+
+def warm_namespaces(urlconf):
+    """warm_namespaces function - reverse() builds a resolver for every
+    namespace under a prefix ('accounts:') on its first use, and caches it"""
+    resolver = get_resolver(urlconf)
+    for namespace, (_, included) in resolver.namespace_dict.items():
+        name = next((key for key in included.reverse_dict
+                     if isinstance(key, str)), None)
+        if name is None:
+            continue
+        try:
+            reverse('{}:{}'.format(namespace, name), urlconf=urlconf)
+        except NoReverseMatch:
+            # built already, the name just takes arguments
+            pass
+
+
+def template_names(directories):
+    for directory in directories:
+        for root, _, files in os.walk(directory):
+            for name in files:
+                if name.endswith(('.html', '.txt')):
+                    yield os.path.relpath(os.path.join(root, name),
+                                          directory).replace(os.sep, '/')
+
+
+def warm_templates():
+    """warm_templates function - compiles every template of the template
+    directories and the form widget templates, one failing to compile is
+    logged and skipped
+    :return: - number of templates"""
+    targets = [(engine, '') for engine in engines.all()]
+    renderer = get_default_renderer()
+    if hasattr(renderer, 'engine'):
+        # widgets render through an engine of their own
+        targets.append((renderer.engine, 'django/forms/'))
+    count = 0
+    for engine, prefix in targets:
+        # DIRS holds BASE_DIR too, the templates are under the 'templates'
+        # directories
+        directories = [directory for directory in engine.template_dirs
+                       if os.path.basename(os.path.normpath(
+                           str(directory))) == 'templates']
+        for name in sorted(set(template_names(directories))):
+            if not name.startswith(prefix):
+                continue
+            try:
+                engine.get_template(name)
+                count += 1
+            except TemplateSyntaxError as error:
+                logger.warning('Template %s not warmed: %s', name, error)
+    return count
+
+
+def warm_indexes():
+    """warm_indexes function - builds the in-memory read models and the
+    content type cache"""
+    # noinspection PyUnresolvedReferences
+    from projects.facets import facets
+    # noinspection PyUnresolvedReferences
+    from projects.fuzzy import names
+    # noinspection PyUnresolvedReferences
+    from projects.search import suggestions
+    for index in (suggestions, facets, names):
+        index.ensure_fresh()
+    content_types = apps.get_model('contenttypes', 'ContentType')
+    # noinspection PyUnresolvedReferences
+    content_types.objects.get_for_models(*apps.get_models())
+
+
+def warm_up():
+    """warm_up function - see the module docstring. Logs and returns False
+    when the database can't be read, /readyz tries again
+    :return: - whether the process is ready"""
+    if not warming.acquire(blocking=False):
+        # another thread is warming up
+        return ready.is_set()
+    try:
+        if ready.is_set():
+            return True
+        start = time.perf_counter()
+        warm_imports()
+        resolvers = warm_urls()
+        templates = warm_templates()
+        # the common password list is read by the first signup form
+        password_validation.get_default_password_validators()
+        try:
+            warm_indexes()
+        except DatabaseError as error:
+            logger.warning('Warm-up failed: %s', error)
+            return False
+        finally:
+            connections.close_all()
+        # the warm objects are left out of the collections, which would
+        # otherwise go through them and write to their pages in every fork
+        gc.collect()
+        if hasattr(gc, 'freeze'):
+            gc.freeze()
+        ready.set()
+        logger.info('Warmed up in %.0f ms (%d url resolvers, %d templates)',
+                    (time.perf_counter() - start) * 1000, resolvers,
+                    templates)
+        return True
+    finally:
+        warming.release()
+
+
+def healthz(request):
+    """healthz function - liveness, the process answers"""
+    return HttpResponse('ok', content_type='text/plain')
+
+
+def readyz(request):
+    """readyz function - readiness, warmed up and the database answers"""
+    if not ready.is_set() and not warm_up():
+        return HttpResponse('warming up', content_type='text/plain',
+                            status=503)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except DatabaseError:
+        return HttpResponse('database unavailable',
+                            content_type='text/plain', status=503)
+    return HttpResponse('ready', content_type='text/plain')
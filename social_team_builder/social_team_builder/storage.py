@@ -0,0 +1,225 @@
+"""Static and media files storage.
+
+Static files get manifest-hashed names plus precompressed gzip (and brotli,
+when the brotli package is installed) variants written next to every
+compressible file by collectstatic.
+
+Media files are content-addressed: stored under the sha256 of their
+content, in two levels of sharded directories below the directory they
+were saved to,
+
+    user_avatar/3f/a2/3fa2...e1.jpg
+
+so identical uploads share one file, a name never changes content (the
+media view caches them for good) and files are never overwritten. A file
+is written to a temporary file under MEDIA_ROOT and renamed into place,
+readers never see a partial file.
+
+Nothing is deleted when a row stops referencing a file, other rows may
+share it. collect_garbage() (the collect_blobs command) deletes the files no
+FileField references any more.
+
+The backend only relies on the Storage API of its base class, an object
+store backend can take its place by reimplementing _save() the same way.
+"""
+import gzip
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+from datetime import timedelta
+
+from django.apps import apps
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+try:
+    import brotli
+except ImportError:  # brotli is optional
+    brotli = None
+
+CHUNK_SIZE = 64 * 1024
+BLOB_NAME = re.compile(r'(^|/)([0-9a-f]{2})/([0-9a-f]{2})/\2\3[0-9a-f]{60}'
+                       r'(\.\w+)?$')
+
+
+def gzip_compress(data):
+    # mtime=0 keeps the output, and so its ETag, stable between deploys
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def brotli_compress(data):
+    return brotli.compress(data, quality=11)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Compressed manifest static files storage
+    :inherit: - storage.ManifestStaticFilesStorage
+    :methods: - hashed_name()
+              - post_process()
+              - compress()
+    """
+    compress_extensions = ('.css', '.js', '.svg', '.html', '.txt', '.json',
+                           '.map', '.xml', '.eot', '.ttf')
+    # below this size the compressed variant is rarely worth a disk read
+    compress_min_size = 256
+
+    def hashed_name(self, name, content=None, filename=None):
+        """hashed_name method - references to files that don't exist (the
+        circle css still carries sass @import lines) are left as they are
+        instead of failing collectstatic"""
+        try:
+            return super().hashed_name(name, content, filename)
+        except ValueError:
+            if content is not None:
+                raise
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            for compressed in self.compress(name):
+                yield name, compressed, True
+
+    def encoders(self):
+        encoders = [('.gz', gzip_compress)]
+        if brotli is not None:
+            encoders.append(('.br', brotli_compress))
+        return encoders
+
+    def compress(self, name):
+        """compress method - writes name.gz / name.br when they are smaller
+        :return: - list of written names"""
+        if not name.endswith(self.compress_extensions):
+            return []
+        path = self.path(name)
+        if not os.path.exists(path) or \
+                os.path.getsize(path) < self.compress_min_size:
+            return []
+        with open(path, 'rb') as source:
+            data = source.read()
+        written = []
+        for suffix, encode in self.encoders():
+            encoded = encode(data)
+            if len(encoded) >= len(data):
+                continue
+            with open(path + suffix, 'wb') as target:
+                target.write(encoded)
+            written.append(name + suffix)
+        return written
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Content-addressed storage
+    :inherit: - FileSystemStorage
+    :methods: - get_available_name() - names don't collide
+              - _save()
+              - blobs() - every content-addressed name
+    """
+    temp_dir = '.tmp'
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        directory, base = posixpath.split(name.replace('\\', '/'))
+        extension = os.path.splitext(base)[1].lower()
+        temp_dir = self.path(self.temp_dir)
+        os.makedirs(temp_dir, exist_ok=True)
+        handle, temporary = tempfile.mkstemp(dir=temp_dir)
+        digest = hashlib.sha256()
+        try:
+            with os.fdopen(handle, 'wb') as target:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks(CHUNK_SIZE):
+                    digest.update(chunk)
+                    target.write(chunk)
+                target.flush()
+                os.fsync(target.fileno())
+            hexdigest = digest.hexdigest()
+            name = posixpath.join(directory, hexdigest[:2], hexdigest[2:4],
+                                  hexdigest + extension)
+            path = self.path(name)
+            if os.path.exists(path):
+                # the same content is stored already. It may be unreferenced
+                # and old, the new mtime keeps it from collect_garbage until
+                # the row referencing it commits
+                os.remove(temporary)
+                os.utime(path)
+                return name
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(temporary, self.file_permissions_mode)
+            os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        return name
+
+    def blobs(self, directory=''):
+        """blobs method - names of the content-addressed files"""
+        directories, files = self.listdir(directory)
+        for name in files:
+            name = posixpath.join(directory, name)
+            if BLOB_NAME.search(name):
+                yield name
+        for sub in directories:
+            if not directory and sub == self.temp_dir:
+                continue
+            yield from self.blobs(posixpath.join(directory, sub))
+
+
+def referenced_names():
+    """referenced_names function - every name a FileField holds"""
+    names = set()
+    for model in apps.get_models():
+        # noinspection PyProtectedMember
+        manager = model._base_manager
+        # noinspection PyProtectedMember
+        for field in model._meta.get_fields():
+            if isinstance(field, models.FileField):
+                names.update(manager.exclude(**{field.name: ''}).exclude(
+                    **{field.name + '__isnull': True}).values_list(
+                    field.name, flat=True).distinct())
+    return names
+
+
+def collect_garbage(storage, grace=timedelta(hours=1), dry_run=False):
+    """collect_garbage function - deletes the content-addressed files no
+    FileField references, and abandoned temporary files. Files younger than
+    `grace` stay, their row may not be committed yet
+    :return: - (files deleted, bytes freed)"""
+    before = timezone.now() - grace
+    if not storage.exists(''):
+        return 0, 0
+    # listed before the references are read, a file saved in between is
+    # either referenced or younger than `grace`
+    blobs = list(storage.blobs())
+    referenced = referenced_names()
+    deleted = freed = 0
+    candidates = [name for name in blobs if name not in referenced]
+    if storage.exists(storage.temp_dir):
+        candidates.extend(posixpath.join(storage.temp_dir, name)
+                          for name in storage.listdir(storage.temp_dir)[1])
+    for name in candidates:
+        try:
+            if storage.get_modified_time(name) >= before:
+                continue
+            size = storage.size(name)
+            if not dry_run:
+                storage.delete(name)
+        except FileNotFoundError:
+            continue
+        deleted += 1
+        freed += size
+    return deleted, freed
@@ -0,0 +1,45 @@
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase
+
+from .serve import accepted_encodings, pick_encoding
+
+
+class AcceptEncodingTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'app.js')
+        for suffix in ('', '.br', '.gz'):
+            open(self.path + suffix, 'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def pick(self, header):
+        return pick_encoding(header, self.path)[0]
+
+    def test_q_values(self):
+        self.assertEqual(accepted_encodings('gzip;q=0.5, BR , identity; q=0'),
+                         {'gzip': 0.5, 'br': 1.0, 'identity': 0.0})
+
+    def test_refused_codings(self):
+        self.assertIsNone(self.pick('gzip;q=0'))
+        self.assertIsNone(self.pick('br;q=0, gzip;q=0'))
+        self.assertEqual(self.pick('br;q=0, gzip'), 'gzip')
+        self.assertIsNone(self.pick('*;q=0'))
+        self.assertIsNone(self.pick(''))
+
+    def test_highest_quality_wins(self):
+        self.assertEqual(self.pick('gzip, deflate, br'), 'br')
+        self.assertEqual(self.pick('br;q=0.5, gzip;q=0.8'), 'gzip')
+        self.assertEqual(self.pick('*'), 'br')
+        self.assertEqual(self.pick('br;q=0, *'), 'gzip')
+
+    def test_not_a_substring(self):
+        self.assertIsNone(self.pick('x-gzip-ish'))
+
+    def test_missing_variant(self):
+        os.remove(self.path + '.br')
+        self.assertEqual(self.pick('br, gzip;q=0.1'), 'gzip')
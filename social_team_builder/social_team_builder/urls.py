@@ -13,26 +13,47 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
+from django.apps import apps
 from django.contrib import admin
 from django.conf.urls import url
-from django.conf.urls.static import static
-from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 from django.conf import settings
 from django.urls import include
 
+from notify import views as notify_views
+
+from . import metrics, serve, startup
+# noinspection PyUnresolvedReferences
+from accounts import notifications
+
 
 urlpatterns = [
+    url(r'^metrics$', metrics.metrics_view, name='metrics'),
+    url(r'^healthz$', startup.healthz, name='healthz'),
+    url(r'^readyz$', startup.readyz, name='readyz'),
     url(r"^admin/", admin.site.urls),
     url(r"^accounts/", include("accounts.urls", namespace="accounts")),
     url(r"^accounts/", include("django.contrib.auth.urls")),
+    # ahead of the notify url, see bumps_version()
+    url(r'^notifications/mark-all/$',
+        notifications.bumps_version(notify_views.mark_all)),
     url(r'^notifications/', include('notify.urls', namespace='notifications')),
     url(r"^", include("projects.urls", namespace="projects")),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+]
 
 
-# Setting up urlpatterns for django-debug-toolbar(version==1.9.1)
-if settings.DEBUG:
+# Setting up urlpatterns for django-debug-toolbar(version==1.9.1), only
+# imported when it is in INSTALLED_APPS (its panels take a while to load)
+if settings.DEBUG and apps.is_installed('debug_toolbar'):
     import debug_toolbar
     urlpatterns += url(r'^__debug__/', include(debug_toolbar.urls)),
 
-urlpatterns += staticfiles_urlpatterns()
+# Static and media files - see serve.py, a front-end server can take over
+# both prefixes (or just the media X-Sendfile/X-Accel-Redirect handoff)
+urlpatterns = [
+    url(r'^{}(?P<path>.*)$'.format(re.escape(settings.STATIC_URL.lstrip('/'))),
+        serve.static_view),
+    url(r'^{}(?P<path>.*)$'.format(re.escape(settings.MEDIA_URL.lstrip('/'))),
+        serve.media_view),
+] + urlpatterns
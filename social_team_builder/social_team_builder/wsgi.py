@@ -9,8 +9,18 @@ https://docs.djangoproject.com/en/1.9/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "social_team_builder.settings")
 
 application = get_wsgi_application()
+
+# templates, url confs and indexes are loaded before the first request, see
+# startup.py (prefork.py forks its workers after this)
+from .startup import ready, warm_up  # noqa: E402
+
+if settings.WARM_UP:
+    warm_up()
+else:
+    ready.set()